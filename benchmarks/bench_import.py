@@ -0,0 +1,24 @@
+"""Benchmarks of importing the package.
+
+Short-lived jobs, like lattice linting, spend much of their time in imports.
+These follow the asv conventions of timeraw_* methods: each returns code,
+which is timed in a fresh Python process.
+"""
+
+
+class Import:
+    """Importing pals and building the element models on first use"""
+
+    repeat = 5
+
+    def timeraw_import_pals(self):
+        return "import pals"
+
+    def timeraw_import_kinds(self):
+        return "import pals.kinds"
+
+    def timeraw_first_element(self):
+        return """
+        import pals
+        pals.Drift(name="drift", length=1.0)
+        """
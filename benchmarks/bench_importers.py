@@ -0,0 +1,36 @@
+"""Benchmarks of importing lattice files of other codes."""
+
+import pals.importers
+
+from .bench_lattice import SIZES
+from .lattices import make_elegant_ring, make_madx_sequence
+
+
+class ImportMadx:
+    """Importing MAD-X sequences"""
+
+    params = SIZES
+    param_names = ["n_elements"]
+    repeat = 3
+    timeout = 3600
+
+    def setup(self, n_elements):
+        self.text = make_madx_sequence(n_elements)
+
+    def time_loads(self, n_elements):
+        pals.importers.madx.loads(self.text)
+
+
+class ImportElegant:
+    """Importing Elegant rings of one repeated cell"""
+
+    params = SIZES
+    param_names = ["n_elements"]
+    repeat = 3
+    timeout = 3600
+
+    def setup(self, n_elements):
+        self.text = make_elegant_ring(n_elements)
+
+    def time_loads(self, n_elements):
+        pals.importers.elegant.loads(self.text)
@@ -0,0 +1,235 @@
+"""Benchmarks of constructing, dumping, serializing and parsing lattices.
+
+The benchmarks follow the conventions of airspeed velocity (asv): classes
+with time_* methods (timed) and track_* methods (returning a value, here peak
+memory), parametrized over the lattice size. They can also be run without
+asv, see run.py.
+"""
+
+import copy
+import json
+import os
+import shutil
+import tracemalloc
+
+import toml
+import yaml
+
+import pals
+import pals.io
+
+from .lattices import make_lattice
+
+# Lattice sizes in number of elements
+SIZES = [10**2, 10**3, 10**4, 10**5, 10**6]
+
+
+def peak_memory(function, *args) -> int:
+    """Return the peak of the memory allocated by Python while calling a function."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(function, *args) -> int:
+    """Return the memory allocated by Python for the result of a function."""
+    tracemalloc.start()
+    try:
+        result = function(*args)  # noqa: F841
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def make_interned_lattice(n_elements: int) -> pals.BeamLine:
+    return pals.intern_parameters(make_lattice(n_elements))
+
+
+class Construct:
+    """Construction of lattices from Python objects"""
+
+    params = SIZES
+    param_names = ["n_elements"]
+    timeout = 3600
+
+    def time_construct(self, n_elements):
+        make_lattice(n_elements)
+
+    def time_construct_with_references(self, n_elements):
+        make_lattice(n_elements, references=True)
+
+    def track_peak_memory_construct(self, n_elements):
+        return peak_memory(make_lattice, n_elements)
+
+    track_peak_memory_construct.unit = "bytes"
+
+    def time_intern_parameters(self, n_elements):
+        make_interned_lattice(n_elements)
+
+    def track_memory_lattice(self, n_elements):
+        return retained_memory(make_lattice, n_elements)
+
+    track_memory_lattice.unit = "bytes"
+
+    def track_memory_lattice_interned(self, n_elements):
+        return retained_memory(make_interned_lattice, n_elements)
+
+    track_memory_lattice_interned.unit = "bytes"
+
+
+class Dump:
+    """Dumping lattices to Python data and serializing these to files"""
+
+    params = SIZES
+    param_names = ["n_elements"]
+    timeout = 3600
+
+    def setup(self, n_elements):
+        self.lattice = make_lattice(n_elements)
+        self.shared_lattice = make_lattice(n_elements, references=True)
+        self.data = self.lattice.model_dump()
+
+    def time_model_dump(self, n_elements):
+        self.lattice.model_dump()
+
+    def time_model_dump_with_references(self, n_elements):
+        self.shared_lattice.model_dump()
+
+    def time_yaml(self, n_elements):
+        yaml.dump(self.data, default_flow_style=False)
+
+    def time_json(self, n_elements):
+        json.dumps(self.data, sort_keys=True, indent=2)
+
+    def time_toml(self, n_elements):
+        toml.dumps(self.data)
+
+    def time_json_bytes(self, n_elements):
+        self.lattice.to_json_bytes()
+
+    def track_peak_memory_model_dump(self, n_elements):
+        return peak_memory(self.lattice.model_dump)
+
+    track_peak_memory_model_dump.unit = "bytes"
+
+    def track_peak_memory_json_bytes(self, n_elements):
+        return peak_memory(self.lattice.to_json_bytes)
+
+    track_peak_memory_json_bytes.unit = "bytes"
+
+
+class Parse:
+    """Parsing and validating serialized lattices
+
+    Validation modifies the parsed data in place, so each sample gets freshly
+    parsed data (number = 1, with setup before every sample).
+    """
+
+    params = SIZES
+    param_names = ["n_elements"]
+    number = 1
+    repeat = 3
+    timeout = 3600
+
+    def setup(self, n_elements):
+        self.lattice = make_lattice(n_elements)
+        data = self.lattice.model_dump()
+        self.yaml_text = yaml.dump(data, default_flow_style=False)
+        self.json_text = json.dumps(data, sort_keys=True, indent=2)
+        self.toml_text = toml.dumps(data)
+        self.data = json.loads(self.json_text)
+        self.trusted_data = copy.deepcopy(self.data)
+
+    def time_parse_yaml(self, n_elements):
+        yaml.safe_load(self.yaml_text)
+
+    def time_parse_json(self, n_elements):
+        json.loads(self.json_text)
+
+    def time_parse_toml(self, n_elements):
+        toml.loads(self.toml_text)
+
+    def time_validate_json_bytes(self, n_elements):
+        pals.BeamLine.from_json_bytes(self.json_text)
+
+    def time_validate(self, n_elements):
+        pals.BeamLine(**self.data)
+
+    def time_from_trusted(self, n_elements):
+        pals.BeamLine.from_trusted(self.trusted_data)
+
+    def time_validate_parallel(self, n_elements):
+        pals.BeamLine.validate_parallel(self.data)
+
+    def time_validate_report(self, n_elements):
+        pals.validate(self.data)
+
+    def time_lazy(self, n_elements):
+        pals.BeamLine.lazy(self.data)
+
+    def time_lazy_point_query(self, n_elements):
+        line = pals.BeamLine.lazy(self.data)
+        arc = line.lazy_elements()[-1]
+        cell = arc.lazy_elements()[-1]
+        cell.lazy_elements()[0].MagneticMultipoleP.Kn1
+
+    def time_roundtrip_json(self, n_elements):
+        data = json.loads(json.dumps(self.lattice.model_dump(), sort_keys=True))
+        pals.BeamLine(**data)
+
+    def track_peak_memory_validate(self, n_elements):
+        return peak_memory(lambda: pals.BeamLine(**self.data))
+
+    track_peak_memory_validate.unit = "bytes"
+
+    def track_peak_memory_load_json(self, n_elements):
+        return peak_memory(lambda: pals.BeamLine(**json.loads(self.json_text)))
+
+    track_peak_memory_load_json.unit = "bytes"
+
+
+class Load:
+    """Loading lattice files with the pals.io loaders"""
+
+    params = SIZES
+    param_names = ["n_elements"]
+    number = 1
+    repeat = 3
+    timeout = 3600
+
+    def setup(self, n_elements):
+        lattice = make_lattice(n_elements)
+        self.json_file = f"benchmark_{n_elements}.json"
+        with open(self.json_file, "w") as file:
+            json.dump(lattice.model_dump(), file, sort_keys=True, indent=2)
+        self.columnar_dir = f"benchmark_{n_elements}_columnar"
+        pals.io.write_columnar(lattice, self.columnar_dir)
+
+    def teardown(self, n_elements):
+        os.remove(self.json_file)
+        shutil.rmtree(self.columnar_dir)
+
+    def time_load(self, n_elements):
+        pals.io.load(self.json_file)
+
+    def time_load_streaming(self, n_elements):
+        pals.io.load_streaming(self.json_file)
+
+    def time_read_columnar(self, n_elements):
+        pals.io.read_columnar(self.columnar_dir)
+
+    def time_open_columnar(self, n_elements):
+        pals.io.ColumnarLattice(self.columnar_dir)["length"].sum()
+
+    def track_peak_memory_load(self, n_elements):
+        return peak_memory(pals.io.load, self.json_file)
+
+    track_peak_memory_load.unit = "bytes"
+
+    def track_peak_memory_load_streaming(self, n_elements):
+        return peak_memory(pals.io.load_streaming, self.json_file)
+
+    track_peak_memory_load_streaming.unit = "bytes"
@@ -0,0 +1,161 @@
+"""Synthetic lattices for the benchmarks.
+
+The lattices mimic a storage ring: arcs made of FODO cells with drifts,
+quadrupoles, sector bends and sextupoles, a union of overlapping elements
+per cell, and nested lines at three levels (ring, arcs, cells).
+"""
+
+import warnings
+
+import pals
+
+# Number of elements per cell (the union counts as one element)
+ELEMENTS_PER_CELL = 10
+
+# Number of cells per arc
+CELLS_PER_ARC = 10
+
+
+def make_cell(index: int, shared: dict = None) -> pals.BeamLine:
+    """Return one FODO cell of ELEMENTS_PER_CELL elements.
+
+    Elements are named uniquely per cell. If a dict shared is given, the
+    drifts are instead shared by all cells that use the same dict, so they
+    are written as name references after their first definition.
+    """
+
+    def drift(name, length):
+        if shared is None:
+            return pals.Drift(name=f"{name}_{index}", length=length)
+        if name not in shared:
+            shared[name] = pals.Drift(name=name, length=length)
+        return shared[name]
+
+    def quadrupole(name, k1):
+        return pals.Quadrupole(
+            name=f"{name}_{index}",
+            length=0.5,
+            MagneticMultipoleP=pals.MagneticMultipoleParameters(
+                Kn1=k1, Kn2=0.001 * (index % 7)
+            ),
+            ApertureP=pals.ApertureParameters(x_limits=[-0.03, 0.03]),
+        )
+
+    bend = pals.SBend(
+        name=f"bend_{index}",
+        length=2.0,
+        BendP=pals.BendParameters(g_ref=0.01, e1=0.005, e2=0.005),
+    )
+    sextupole = pals.Sextupole(
+        name=f"sext_{index}",
+        length=0.2,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn2=1.5 + 0.001 * index),
+    )
+    bpm = pals.UnionEle(
+        name=f"bpm_{index}",
+        elements=[
+            pals.Marker(name=f"bpm_marker_{index}"),
+            pals.Drift(name=f"bpm_drift_{index}", length=0.1),
+        ],
+    )
+    return pals.BeamLine(
+        name=f"cell_{index}",
+        line=[
+            quadrupole("qf", 0.3),
+            drift("d1", 1.0),
+            bend,
+            drift("d2", 0.5),
+            sextupole,
+            drift("d3", 0.3),
+            quadrupole("qd", -0.3),
+            drift("d5", 1.0),
+            bpm,
+            drift("d4", 0.2),
+        ],
+    )
+
+
+def make_lattice(n_elements: int, references: bool = False) -> pals.BeamLine:
+    """Return a ring of about n_elements elements, as arcs of FODO cells.
+
+    Args:
+        n_elements: Approximate number of elements, rounded up to whole cells
+        references: Share the drifts between cells, so that the serialized
+            lattice contains name references (which TOML cannot represent)
+    """
+    n_cells = max(1, -(-n_elements // ELEMENTS_PER_CELL))
+    shared = {} if references else None
+    with warnings.catch_warnings():
+        # Sextupoles are marked as under construction
+        warnings.simplefilter("ignore", UserWarning)
+        cells = [make_cell(index, shared) for index in range(n_cells)]
+    arcs = [
+        pals.BeamLine(
+            name=f"arc_{start // CELLS_PER_ARC}",
+            line=cells[start : start + CELLS_PER_ARC],
+        )
+        for start in range(0, n_cells, CELLS_PER_ARC)
+    ]
+    return pals.BeamLine(name="ring", line=arcs)
+
+
+def make_madx_sequence(n_elements: int) -> str:
+    """Return a MAD-X sequence of about n_elements elements, in the style of the LHC.
+
+    Every element has a unique name and is defined from a common parent
+    element, with strengths given by deferred expressions of knobs, and
+    placed at positions relative to the markers of its cell.
+    """
+    cells = max(1, n_elements // ELEMENTS_PER_CELL)
+    cell_length = 50.0
+    statements = [
+        "kqf := 0.009 * scale; kqd := -kqf; ksf := 0.02 * scale; scale = 1.0;",
+        "mb: sbend, l=14.3, angle:=twopi / (2 * ncells);",
+        "mq: quadrupole, l=3.1;",
+        "ms: sextupole, l=0.369;",
+        "mcb: hkicker, l=0.647;",
+        "bpm: monitor;",
+        "mk: marker;",
+        f"ncells = {2 * cells};",
+        f"ring: sequence, l={cells * cell_length};",
+    ]
+    for cell in range(cells):
+        start = cell * cell_length
+        statements += [
+            f"s.cell.{cell}: mk, at={start};",
+            f"mq.a{cell}: mq, k1:=kqf, at=2.0, from=s.cell.{cell};",
+            f"ms.a{cell}: ms, k2:=ksf, at=4.0, from=s.cell.{cell};",
+            f"mcb.a{cell}: mcb, kick:=1e-5 * scale, at=5.0, from=s.cell.{cell};",
+            f"bpm.a{cell}: bpm, at=5.5, from=s.cell.{cell};",
+            f"mb.a{cell}: mb, at=13.5, from=s.cell.{cell};",
+            f"mq.b{cell}: mq, k1:=kqd, at=27.0, from=s.cell.{cell};",
+            f"ms.b{cell}: ms, k2:=-ksf, at=29.0, from=s.cell.{cell};",
+            f"bpm.b{cell}: bpm, at=30.5, from=s.cell.{cell};",
+            f"mb.b{cell}: mb, at=38.5, from=s.cell.{cell};",
+        ]
+    statements += ["endsequence;", "use, sequence=ring;"]
+    return "\n".join(statements)
+
+
+def make_elegant_ring(n_elements: int) -> str:
+    """Return an Elegant ring of about n_elements elements, repeating one cell.
+
+    The cell has ELEMENTS_PER_CELL elements, with strengths given by RPN
+    expressions.
+    """
+    cells = max(1, n_elements // ELEMENTS_PER_CELL)
+    return "\n".join(
+        [
+            "% 1.2 sto kq",
+            'QF: KQUAD, L=0.5, K1="kq"',
+            'QD: KQUAD, L=0.5, K1="kq chs"',
+            'SF: KSEXT, L=0.2, K2="kq 10 *"',
+            'SD: KSEXT, L=0.2, K2="kq -20 *"',
+            'B: CSBEND, L=2.0, ANGLE="pi 100 /"',
+            "D: DRIF, L=0.5",
+            "BPM: MONI",
+            "CELL: LINE=(QF, D, SF, B, BPM, QD, D, SD, B, BPM)",
+            f"RING: LINE=({cells}*CELL)",
+            "USE,RING",
+        ]
+    )
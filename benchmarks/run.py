@@ -0,0 +1,135 @@
+"""Run the benchmarks without asv and compare results between versions.
+
+Usage, from the repository root:
+
+    python -m benchmarks.run --sizes 100 1000 10000 --json results.json
+    python -m benchmarks.run --sizes 100 1000 10000 --compare results.json
+
+Timings are the best of a few repetitions, in seconds. Benchmarks without
+lattice sizes, like the import times, run once per repetition. With --compare, the
+run fails (exit code 1) if any benchmark got slower (or uses more memory)
+than the saved results by more than the given tolerance.
+"""
+
+import argparse
+import inspect
+import json
+import subprocess
+import sys
+import textwrap
+import time
+
+from . import bench_import, bench_importers, bench_lattice
+
+# Prefixes of the benchmark methods
+_PREFIXES = ("time_", "timeraw_", "track_")
+
+
+def benchmark_classes():
+    """Return all benchmark classes, in the order of their definition."""
+    classes = []
+    for module in (bench_import, bench_lattice, bench_importers):
+        classes += sorted(
+            (
+                cls
+                for _, cls in inspect.getmembers(module, inspect.isclass)
+                if cls.__module__ == module.__name__
+                and any(name.startswith(_PREFIXES) for name in dir(cls))
+            ),
+            key=lambda cls: inspect.getsourcelines(cls)[1],
+        )
+    return classes
+
+
+def run_raw(code: str) -> float:
+    """Return the time in seconds of running code in a fresh Python process."""
+    script = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"exec({textwrap.dedent(code)!r})\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.split()[-1])
+
+
+def run_benchmark(cls, method_name: str, size: int, repeat: int):
+    """Return the best time in seconds of a time_* or timeraw_* method, or the value of a track_* method."""
+    if method_name.startswith("timeraw_"):
+        code = getattr(cls(), method_name)()
+        return min(run_raw(code) for _ in range(getattr(cls, "repeat", repeat)))
+    results = []
+    for _ in range(
+        getattr(cls, "repeat", repeat) if method_name.startswith("time_") else 1
+    ):
+        instance = cls()
+        if hasattr(instance, "setup"):
+            instance.setup(size)
+        try:
+            method = getattr(instance, method_name)
+            if method_name.startswith("track_"):
+                return method(size)
+            start = time.perf_counter()
+            method(size)
+            results.append(time.perf_counter() - start)
+        finally:
+            if hasattr(instance, "teardown"):
+                instance.teardown(size)
+    return min(results)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="lattice sizes"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per timing")
+    parser.add_argument("--filter", default="", help="only run matching benchmarks")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed relative slowdown"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for cls in benchmark_classes():
+        for method_name in dir(cls):
+            if not method_name.startswith(_PREFIXES):
+                continue
+            for size in args.sizes if hasattr(cls, "params") else [None]:
+                key = f"{cls.__name__}.{method_name}"
+                if size is not None:
+                    key += f"[{size}]"
+                if args.filter not in key:
+                    continue
+                value = run_benchmark(cls, method_name, size, args.repeat)
+                results[key] = value
+                unit = "bytes" if method_name.startswith("track_") else "s"
+                print(f"{key:<60} {value:>14.6g} {unit}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = [
+            (key, baseline[key], value)
+            for key, value in results.items()
+            if key in baseline and value > baseline[key] * (1 + args.tolerance)
+        ]
+        for key, before, after in regressions:
+            print(
+                f"REGRESSION {key}: {before:.6g} -> {after:.6g} ({after / before:.2f}x)"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,58 @@
 
 Re-export commonly used classes from submodules so callers can use
 simpler import statements like `from pals import Drift`.
+
+The re-exported names and the subpackages are loaded on first access, so
+that `import pals` itself neither imports pydantic nor builds the element
+models.
 """
 
-from .kinds import *  # noqa
-from .parameters import *  # noqa
+import importlib
+from types import ModuleType
+
+# Subpackages and modules whose public names are re-exported, in the order of precedence
+_REEXPORTED = ("kinds", "parameters", "validation")
+
+# All subpackages and modules, which are imported on first access, e.g. pals.io
+_SUBPACKAGES = (
+    "geometry",
+    "importers",
+    "io",
+    "kinds",
+    "lattice",
+    "optics",
+    "parameters",
+    "validation",
+)
+
+
+def _exports() -> dict:
+    """Return the re-exported names, with the subpackage or module that defines them."""
+    exports = {}
+    for subpackage in reversed(_REEXPORTED):
+        module = importlib.import_module(f".{subpackage}", __name__)
+        if hasattr(module, "__all__"):
+            exports.update(dict.fromkeys(module.__all__, module))
+            continue
+        for name, value in vars(module).items():
+            if not name.startswith("_") and not isinstance(value, ModuleType):
+                exports[name] = module
+    return exports
+
+
+def __getattr__(name: str):
+    if name in _SUBPACKAGES:
+        return importlib.import_module(f".{name}", __name__)
+    if name == "__all__":
+        value = list(_exports())
+    else:
+        module = None if name.startswith("__") else _exports().get(name)
+        if module is None:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_exports()) | set(_SUBPACKAGES))
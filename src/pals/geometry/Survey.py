@@ -0,0 +1,194 @@
+"""Floor coordinates (survey) of the reference orbit of a lattice.
+
+Each element transforms the reference frame at its entrance into the frame
+at its exit by a rotation S and a displacement L, given in the entrance
+frame. As 4x4 homogeneous matrices, the frames at all element boundaries are
+the cumulative products of these transformations, which are computed with a
+parallel scan. After the geometry of a single element changed, the frames
+downstream of it are corrected with one batched matrix product.
+
+Conventions follow Bmad: the floor orientation is W = R_y(theta) R_x(-phi)
+R_z(psi), bends with positive g_ref bend towards -x, and patches and floor
+shifts rotate by S = R_y(y_rot) R_x(x_rot) R_z(z_rot).
+"""
+
+import numpy as np
+
+from pals.lattice import SHIFT_COLUMNS, cumulative_product, element_row, get_table
+from pals.parameters import FloorParameters
+
+# FlatLattice columns of the frame transformations
+_FRAME_COLUMNS = ("length", "g_ref", "angle", "tilt_ref") + SHIFT_COLUMNS
+
+
+def _rotations(axis: int, angle):
+    """Return the matrices of right-handed rotations around an axis (0, 1, 2 = x, y, z)."""
+    angle = np.asarray(angle, dtype=np.float64)
+    c, s = np.cos(angle), np.sin(angle)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    R = np.zeros(angle.shape + (3, 3))
+    R[..., axis, axis] = 1.0
+    R[..., i, i] = R[..., j, j] = c
+    R[..., i, j] = -s
+    R[..., j, i] = s
+    return R
+
+
+def floor_orientation(theta, phi, psi):
+    """Return the rotation matrices W of floor orientation angles."""
+    return _rotations(1, theta) @ _rotations(0, -np.asarray(phi)) @ _rotations(2, psi)
+
+
+def frame_transformations(columns: dict):
+    """Return the 4x4 transformations from the entrance to the exit frame of elements.
+
+    Args:
+        columns: Arrays of the FlatLattice columns length, g_ref, angle, tilt_ref
+            and the patch columns x_offset, ..., z_rot, e.g. a FlatLattice.columns()
+    """
+    length, g, angle = columns["length"], columns["g_ref"], columns["angle"]
+    T = np.zeros(np.shape(length) + (4, 4))
+    T[..., 3, 3] = 1.0
+
+    # Straight elements and bends
+    bent = g != 0.0
+    rho = np.divide(1.0, g, out=np.zeros_like(g), where=bent)
+    T[..., :3, :3] = _rotations(1, -angle)
+    T[..., 0, 3] = np.where(bent, rho * (np.cos(angle) - 1.0), 0.0)
+    T[..., 2, 3] = np.where(bent, rho * np.sin(angle), length)
+    tilt = columns["tilt_ref"]
+    tilted = tilt != 0.0
+    if np.any(tilted):
+        R = np.zeros(tilt[tilted].shape + (4, 4))
+        R[..., :3, :3] = _rotations(2, tilt[tilted])
+        R[..., 3, 3] = 1.0
+        T[tilted] = R @ T[tilted] @ R.swapaxes(-1, -2)
+
+    # Patches and floor shifts
+    shifted = np.zeros(np.shape(length), dtype=bool)
+    for key in SHIFT_COLUMNS:
+        shifted |= columns[key] != 0.0
+    if np.any(shifted):
+        rotation = (
+            _rotations(1, columns["y_rot"][shifted])
+            @ _rotations(0, columns["x_rot"][shifted])
+            @ _rotations(2, columns["z_rot"][shifted])
+        )
+        T[shifted, :3, :3] = rotation
+        offsets = [columns[key][shifted] for key in SHIFT_COLUMNS[:3]]
+        T[shifted, :3, 3] = np.stack(offsets, axis=-1)
+    return T
+
+
+class Survey:
+    """Floor coordinates and orientation at all element boundaries of a line
+
+    X, Y and Z are the floor positions and W the orientation matrices (whose
+    columns are the local x, y and z axes in floor coordinates) of the
+    reference frames, with one entry per boundary, starting with the entrance
+    of the line.
+
+    Args:
+        line: A BeamLine (or any line), or its FlatLattice
+        start: Floor position and orientation of the entrance of the line
+    """
+
+    def __init__(self, line, start: FloorParameters = None):
+        self.table = get_table(line)
+        self.start = FloorParameters() if start is None else start
+
+        origin = np.eye(4)
+        origin[:3, :3] = floor_orientation(
+            self.start.theta, self.start.phi, self.start.psi
+        )
+        origin[:3, 3] = (self.start.x, self.start.y, self.start.z)
+        self._origin = origin
+
+        columns = self.table.columns()
+        self.transformations = frame_transformations(columns)
+        self._compose()
+
+    def __len__(self) -> int:
+        """Number of boundaries"""
+        return len(self.frames)
+
+    def _compose(self):
+        """Compose the frames at all boundaries."""
+        self.frames = np.empty((len(self.transformations) + 1, 4, 4))
+        self.frames[0] = self._origin
+        # Frames G_i = G_0 T_0 ... T_i, from the scan of the transposed products
+        products = cumulative_product(self.transformations.swapaxes(-1, -2))
+        self.frames[1:] = self._origin @ products.swapaxes(-1, -2)
+
+    def update(self, index: int):
+        """Recompute the frames after the geometry of the element at an index changed.
+
+        Only the frames downstream of the element are updated, with one batched
+        matrix product. An element instance that occurs several times in the
+        line is only updated at this index; use a new Survey for shared elements.
+        """
+        row, _ = element_row(self.table.elements[index])
+        columns = {key: np.array([row.get(key, 0.0)]) for key in _FRAME_COLUMNS}
+        old = self.transformations[index].copy()
+        new = frame_transformations(columns)[0]
+        self.transformations[index] = new
+        # G_j' = G_i' inv(G_i) G_j for all frames j downstream of the element
+        exit_frame = self.frames[index] @ new
+        correction = exit_frame @ np.linalg.inv(self.frames[index] @ old)
+        self.frames[index + 1 :] = correction @ self.frames[index + 1 :]
+
+    @property
+    def X(self):
+        """Floor X positions in meters (m)"""
+        return self.frames[:, 0, 3]
+
+    @property
+    def Y(self):
+        """Floor Y positions in meters (m)"""
+        return self.frames[:, 1, 3]
+
+    @property
+    def Z(self):
+        """Floor Z positions in meters (m)"""
+        return self.frames[:, 2, 3]
+
+    @property
+    def W(self):
+        """Orientation matrices, of shape (number of boundaries, 3, 3)"""
+        return self.frames[:, :3, :3]
+
+    @property
+    def theta(self):
+        """Azimuth angles in radian"""
+        return np.arctan2(self.W[:, 0, 2], self.W[:, 2, 2])
+
+    @property
+    def phi(self):
+        """Pitch angles in radian"""
+        return np.arctan2(self.W[:, 1, 2], np.hypot(self.W[:, 0, 2], self.W[:, 2, 2]))
+
+    @property
+    def psi(self):
+        """Roll angles in radian"""
+        return np.arctan2(self.W[:, 1, 0], self.W[:, 1, 1])
+
+    def quaternions(self):
+        """Return the orientations as unit quaternions (w, x, y, z)"""
+        W = self.W
+        d0, d1, d2 = W[:, 0, 0], W[:, 1, 1], W[:, 2, 2]
+        squares = (
+            1 + d0 + d1 + d2,
+            1 + d0 - d1 - d2,
+            1 - d0 + d1 - d2,
+            1 - d0 - d1 + d2,
+        )
+        q = np.sqrt(np.maximum(np.stack(squares, axis=-1), 0.0)) / 2
+        q[:, 1] = np.copysign(q[:, 1], W[:, 2, 1] - W[:, 1, 2])
+        q[:, 2] = np.copysign(q[:, 2], W[:, 0, 2] - W[:, 2, 0])
+        q[:, 3] = np.copysign(q[:, 3], W[:, 1, 0] - W[:, 0, 1])
+        return q
+
+
+def survey(line, start: FloorParameters = None) -> Survey:
+    """Return the floor coordinates of a line, see Survey."""
+    return Survey(line, start)
@@ -0,0 +1,7 @@
+"""Floor coordinates and geometry of a lattice.
+
+Re-export commonly used functions from submodules so callers can use
+simpler import statements like `from pals.geometry import survey`.
+"""
+
+from .Survey import Survey, floor_orientation, survey  # noqa: F401
@@ -0,0 +1,7 @@
+"""Importers of lattice files of other codes.
+
+Each importer is a module with a load function, e.g. pals.importers.madx.load,
+which returns a BeamLine.
+"""
+
+from . import elegant, madx  # noqa: F401
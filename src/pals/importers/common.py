@@ -0,0 +1,151 @@
+"""Building BeamLines from the named elements and lines of imported files.
+
+MAD-X and Elegant both define lines like cell: LINE=(qf, d, qd, d), with
+repetitions (3*cell), reflections (-cell) and nested parentheses. The
+importers subclass LineImporter, which builds the PALS element of each name
+once and shares it between all its uses. Repetitions and reflections of
+lines become RepeatedLines, so that e.g. a ring of 5000 cells holds one cell
+instead of 5000 copies.
+"""
+
+import re
+import warnings
+from abc import ABC, abstractmethod
+
+from pals.kinds import BeamLine, RepeatedLine, intern_parameters
+from pals.kinds.utils import paused_gc
+
+_LINE_ITEM = re.compile(r"\s*(-)?\s*(?:(\d+)\s*\*\s*)?(-)?\s*(.+?)\s*", re.S)
+
+
+class StopReading(Exception):
+    """Raised by the statements that end the reading of all files"""
+
+
+def split_items(text: str) -> list:
+    """Split a list of attributes or line items at the commas outside of brackets."""
+    if "(" not in text and "{" not in text:
+        return [item for item in text.split(",") if item.strip()]
+    items = []
+    depth = 0
+    start = 0
+    for position, char in enumerate(text):
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(text[start:position])
+            start = position + 1
+    items.append(text[start:])
+    return [item for item in items if item.strip()]
+
+
+class LineImporter(ABC):
+    """Base class of the importers, which builds each named element once
+
+    Subclasses read the definitions of a file into lines (the bodies of the
+    lines by name) and implement build_definition for all other names.
+    """
+
+    # Name of the code that writes the imported files, for messages
+    code = None
+
+    def __init__(self):
+        self.lines = {}
+        # The line of the USE statement and the last line defined
+        self.used = None
+        self.last = None
+        # PALS elements by name, shared by all uses
+        self.built = {}
+        self.building = set()
+        # Element classes of the code that are imported as Drifts or Markers
+        self.unsupported = set()
+
+    def normalize(self, name: str) -> str:
+        """Return a name as it is stored, e.g. in lower case."""
+        return name
+
+    def is_line(self, name: str) -> bool:
+        """Return whether a name is a line, whose reflections are reversed."""
+        return name in self.lines
+
+    @abstractmethod
+    def build_definition(self, name: str):
+        """Return the PALS element of a name that is not a line."""
+
+    def build(self, name: str = None) -> BeamLine:
+        """Return the BeamLine of a line, by default the used or the last one."""
+        name = self.normalize(name or self.used or self.last or "")
+        if not name:
+            raise ValueError("The file defines no line")
+        if not self.is_line(name):
+            raise ValueError(f"Undefined line {name!r}")
+        return self.element(name)
+
+    def element(self, name: str):
+        """Return the PALS element of a name, built on first use."""
+        element = self.built.get(name)
+        if element is not None:
+            return element
+        if name in self.building:
+            raise ValueError(f"The line {name!r} contains itself")
+        self.building.add(name)
+        try:
+            if name in self.lines:
+                element = self.build_line(name, self.lines[name])
+            else:
+                element = self.build_definition(name)
+        finally:
+            self.building.discard(name)
+        self.built[name] = element
+        return element
+
+    def build_line(self, name: str, body: str) -> BeamLine:
+        """Return the BeamLine of a line, with RepeatedLines for repetitions and reflections."""
+        line = []
+        for index, item in enumerate(split_items(body)):
+            reflected, count, inner_reflected, target = _LINE_ITEM.fullmatch(
+                item
+            ).groups()
+            if target.startswith("(") and target.endswith(")"):
+                # Anonymous lines are named after their position
+                element = self.build_line(f"{name}_{index}", target[1:-1])
+                is_line = True
+            else:
+                target = self.normalize(target)
+                element = self.element(target)
+                is_line = self.is_line(target)
+            count = int(count or 1)
+            reverse = bool(reflected or inner_reflected) and is_line
+            if count > 1 or reverse:
+                element = RepeatedLine(line=element, repeat=count, reverse=reverse)
+            line.append(element)
+        return BeamLine(name=name, line=line)
+
+
+def import_line(importer: LineImporter, read, name: str, intern: bool) -> BeamLine:
+    """Read a file with read(), then build a line of the importer.
+
+    Args:
+        importer: The importer
+        read: Function that reads the file into the importer
+        name: Name of the line, by default the used or the last one
+        intern: Share equal parameter groups between the elements (see
+            pals.intern_parameters)
+    """
+    with paused_gc():
+        try:
+            read()
+        except StopReading:
+            pass
+        line = importer.build(name)
+    if importer.unsupported:
+        warnings.warn(
+            f"Elements of the {importer.code} classes "
+            f"{', '.join(sorted(importer.unsupported))} were imported as Drifts or Markers",
+            UserWarning,
+            # Warn at the call of the load function of the importer
+            stacklevel=3,
+        )
+    return intern_parameters(line) if intern else line
@@ -0,0 +1,446 @@
+"""Import of Elegant lattice (.lte) files.
+
+load(path) reads the element definitions and LINE definitions of an Elegant
+lattice file (and of the files it #includes) and returns the used (or the
+last defined) line as a BeamLine.
+
+- Statements can be continued on the next line with a trailing &, and
+  comments start with !.
+- Values are numbers or quoted RPN expressions like "kq 2 *", which use the
+  RPN variables that are stored by % lines like % 0.3 sto kq. Only string
+  parameters, like FILENAME, have other values.
+- Elements can be defined from an element type (also abbreviated, like DRIF
+  for DRIFT) or from another element, whose parameters they inherit.
+- Lines support repetitions (3*cell), reflections (-cell) and nested
+  parentheses. Repetitions and reflections of lines become RepeatedLines.
+
+Each Elegant element and line becomes one PALS element, which is shared by
+all its uses, so that e.g. a ring of 5000 cells holds one cell. Unquoted
+names are upper case, like in Elegant.
+
+DRIF, QUAD, KQUAD, SEXT, KSEXT, OCTU, KOCT, SBEN, CSBEND, RBEN, RFCA,
+MARK, KICKER, HKICK, VKICK, SOLE and MULT elements (and their variants like
+EDRIFT or CSRCSBEND) are converted to the corresponding kinds. RF phases in
+degrees are converted to radians, but not to another phase convention.
+Monitors, watch points and collimators become Drifts, or Markers if they
+have no length. Elements of other types are imported in the same way, with
+a warning.
+"""
+
+import math
+import operator
+import os
+import re
+
+from pals.kinds.all_elements import validate_element_fields
+
+from .common import LineImporter, StopReading, import_line, split_items
+
+# Element types by their canonical names, with the PALS kind they map onto
+_DRIFT_TYPES = {"DRIF", "EDRIFT", "CSRDRIFT", "LSCDRIFT"}
+_MAGNET_ORDERS = {
+    "QUAD": 1,
+    "KQUAD": 1,
+    "SEXT": 2,
+    "KSEXT": 2,
+    "OCTU": 3,
+    "KOCT": 3,
+}
+_MAGNET_KINDS = {1: "Quadrupole", 2: "Sextupole", 3: "Octupole"}
+_BEND_TYPES = {"SBEN", "CSBEND", "CSRCSBEND", "KSBEND", "NIBEND", "RBEN"}
+_KICKER_TYPES = {"KICKER", "HKICK", "VKICK", "EKICKER", "EHKICK", "EVKICK"}
+_RF_TYPES = {"RFCA", "RFCW"}
+
+# Types of elements without fields, which become Drifts or Markers
+_PASSIVE_TYPES = {
+    "MARK",
+    "MONI",
+    "HMON",
+    "VMON",
+    "WATCH",
+    "ECOL",
+    "RCOL",
+    "MAXAMP",
+    "SCRAPER",
+    "CHARGE",
+    "MALIGN",
+    "CENTER",
+}
+
+_ELEMENT_TYPES = (
+    _DRIFT_TYPES
+    | set(_MAGNET_ORDERS)
+    | _BEND_TYPES
+    | _KICKER_TYPES
+    | _RF_TYPES
+    | {"SOLE", "MULT"}
+    | _PASSIVE_TYPES
+)
+
+# Parameters whose values are strings, like file names, not numbers or RPN expressions
+_STRING_PARAMETERS = {"FILENAME", "INPUTFILE", "INPUT_FILE", "GROUP", "MODE", "TYPE"}
+
+# Constants of RPN expressions
+_RPN_CONSTANTS = {
+    "pi": math.pi,
+    "c_mks": 299792458.0,
+    "e_mks": 1.602176634e-19,
+    "me_mks": 9.1093837015e-31,
+    "mev": 0.51099895000,
+}
+
+# Functions of RPN expressions, by their number of arguments
+_RPN_UNARY = {
+    "sqrt": math.sqrt,
+    "sqr": lambda x: x * x,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "exp": math.exp,
+    "ln": math.log,
+    "abs": abs,
+    "chs": operator.neg,
+    "dtor": math.radians,
+    "rtod": math.degrees,
+}
+_RPN_BINARY = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "pow": math.pow,
+    "atan2": math.atan2,
+}
+
+_NAME = r"\"[^\"]+\"|[A-Z_][\w.$\-]*"
+
+_COMMENT = re.compile(r"(\"[^\"]*\")|!.*")
+_STRING = re.compile(r"\"[^\"]*\"")
+_INCLUDE = re.compile(r"#include\s*:?\s*\"?([^\"]+?)\"?\s*", re.I)
+_LINE = re.compile(rf"({_NAME})\s*:\s*LINE\s*=\s*\((.*)\)", re.S)
+_LABEL = re.compile(rf"({_NAME})\s*:\s*({_NAME})\s*(?:,(.*))?", re.S)
+_COMMAND = re.compile(rf"({_NAME})\s*(?:,(.*))?", re.S)
+_PARAMETER = re.compile(r"\s*([A-Z_]\w*)\s*=\s*(.*?)\s*", re.S)
+
+
+def _upper(statement: str) -> str:
+    """Return a statement in upper case, except for its strings."""
+    if '"' not in statement:
+        return statement.upper()
+    parts = []
+    position = 0
+    for match in _STRING.finditer(statement):
+        parts.append(statement[position : match.start()].upper())
+        parts.append(match.group())
+        position = match.end()
+    parts.append(statement[position:].upper())
+    return "".join(parts)
+
+
+def _element_type(word: str):
+    """Return the canonical name of an element type, which can be abbreviated or extended."""
+    if word in _ELEMENT_TYPES:
+        return word
+    # E.g. DRIFT or QUADRUPOLE
+    prefixes = [name for name in _ELEMENT_TYPES if word.startswith(name)]
+    if prefixes:
+        return max(prefixes, key=len)
+    # E.g. SOL for SOLE
+    matches = [name for name in _ELEMENT_TYPES if name.startswith(word)]
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+class _Element:
+    """An Elegant element: its canonical type and its parameters"""
+
+    __slots__ = ("element_type", "parameters")
+
+    def __init__(self, element_type: str, parameters: dict):
+        self.element_type = element_type
+        self.parameters = parameters
+
+
+class _Parser(LineImporter):
+    """Reads Elegant statements and builds the PALS elements of a line"""
+
+    code = "Elegant"
+
+    def __init__(self):
+        super().__init__()
+        self.elements = {}
+        # Variables of RPN expressions
+        self.variables = {}
+
+    def normalize(self, name: str) -> str:
+        if name.startswith('"'):
+            return name.strip('"')
+        return name.upper()
+
+    # Reading
+
+    def read_file(self, path):
+        with open(path) as file:
+            text = file.read()
+        self.read(text, os.fspath(path), os.path.dirname(os.fspath(path)))
+
+    def read(self, text: str, source: str = "<string>", directory: str = ""):
+        """Read the statements of a text, one per line unless continued by &."""
+        statement = ""
+        start = None
+        for line_number, line in enumerate(text.splitlines(), 1):
+            line = _COMMENT.sub(lambda match: match.group(1) or "", line).rstrip()
+            if start is None:
+                start = line_number
+            if line.endswith("&"):
+                statement += line[:-1] + " "
+                continue
+            statement = (statement + line).strip()
+            if statement:
+                try:
+                    self.statement(statement, directory)
+                except ValueError as error:
+                    raise ValueError(f"{source}:{start}: {error}") from None
+            statement = ""
+            start = None
+
+    def statement(self, statement: str, directory: str):
+        """Read one statement."""
+        if statement.startswith("%"):
+            self.rpn(statement[1:])
+            return
+
+        match = _INCLUDE.fullmatch(statement)
+        if match is not None:
+            self.read_file(os.path.join(directory, match.group(1)))
+            return
+
+        statement = _upper(statement)
+        match = _LINE.fullmatch(statement)
+        if match is not None:
+            name, body = match.groups()
+            name = self.normalize(name)
+            self.lines[name] = body
+            self.last = name
+            return
+
+        match = _LABEL.fullmatch(statement)
+        if match is not None:
+            name, base, text = match.groups()
+            self.define(self.normalize(name), self.normalize(base), text)
+            return
+
+        match = _COMMAND.fullmatch(statement)
+        if match is None:
+            raise ValueError(f"Cannot read the statement {statement!r}")
+        name, text = match.groups()
+        if name == "USE":
+            if not text:
+                raise ValueError("USE needs a line")
+            self.used = self.normalize(text.strip())
+        elif name == "RETURN":
+            raise StopReading
+        else:
+            raise ValueError(f"Unknown statement {name!r}")
+
+    def define(self, name: str, base: str, text: str):
+        """Define an element from an element type or from another element."""
+        parameters = {}
+        for item in split_items(text or ""):
+            match = _PARAMETER.fullmatch(item)
+            if match is None:
+                raise ValueError(f"Invalid parameter {item.strip()!r}")
+            key, value = match.groups()
+            parameters[key] = self.value(key, value)
+        parent = self.elements.get(base)
+        if parent is not None:
+            self.elements[name] = _Element(
+                parent.element_type, {**parent.parameters, **parameters}
+            )
+        else:
+            self.elements[name] = _Element(_element_type(base) or base, parameters)
+
+    def value(self, key: str, text: str):
+        """Return the value of a parameter, evaluating RPN expressions."""
+        quoted = text.startswith('"') and text.endswith('"') and len(text) > 1
+        if quoted:
+            text = text[1:-1]
+        if key in _STRING_PARAMETERS:
+            return text
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        if not quoted:
+            raise ValueError(f"Invalid value {text!r} of {key}")
+        value = self.rpn(text)
+        if value is None:
+            raise ValueError(f"Empty RPN expression of {key}")
+        return value
+
+    def rpn(self, text: str):
+        """Evaluate an RPN expression, returning the value on top of the stack (or None)."""
+        stack = []
+        tokens = iter(text.split())
+        try:
+            for token in tokens:
+                try:
+                    stack.append(float(token))
+                    continue
+                except ValueError:
+                    pass
+                if token in _RPN_BINARY:
+                    right = stack.pop()
+                    stack.append(_RPN_BINARY[token](stack.pop(), right))
+                elif token in _RPN_UNARY:
+                    stack.append(_RPN_UNARY[token](stack.pop()))
+                elif token == "sto":
+                    self.variables[next(tokens)] = stack[-1]
+                elif token == "dup":
+                    stack.append(stack[-1])
+                elif token == "swap":
+                    stack[-2:] = stack[:-3:-1]
+                elif token == "pop":
+                    stack.pop()
+                elif token in self.variables:
+                    stack.append(self.variables[token])
+                elif token in _RPN_CONSTANTS:
+                    stack.append(_RPN_CONSTANTS[token])
+                else:
+                    raise ValueError(f"Unknown name {token!r} in {text!r}")
+        except (IndexError, StopIteration):
+            raise ValueError(f"Invalid RPN expression {text!r}") from None
+        return stack[-1] if stack else None
+
+    # Building
+
+    def build_definition(self, name: str):
+        definition = self.elements.get(name)
+        if definition is None:
+            raise ValueError(f"Undefined element {name!r}")
+        kind, fields = self.convert(definition.element_type, definition.parameters)
+        return validate_element_fields({"kind": kind, "name": name, **fields})
+
+    def convert(self, element_type: str, parameters: dict) -> tuple:
+        """Return the kind and the fields of the PALS element of an Elegant element."""
+        length = parameters.get("L", 0.0)
+        tilt = parameters.get("TILT", 0.0)
+
+        if element_type in _DRIFT_TYPES:
+            return "Drift", {"length": length}
+
+        if element_type in _MAGNET_ORDERS:
+            order = _MAGNET_ORDERS[element_type]
+            params = {f"Kn{order}": parameters.get(f"K{order}", 0.0)}
+            if tilt:
+                params[f"tilt{order}"] = tilt
+            return _MAGNET_KINDS[order], {
+                "length": length,
+                "MagneticMultipoleP": params,
+            }
+
+        if element_type in _BEND_TYPES:
+            angle = parameters.get("ANGLE", 0.0)
+            # Bends of both shapes are given by their arc length
+            bend = {"g_ref": angle / length if length else 0.0, "tilt_ref": tilt}
+            if element_type == "RBEN":
+                # Like for MAD-X, rectangular bends also have their chord length
+                bend["L_chord"] = (
+                    2 * length / angle * math.sin(angle / 2) if angle else length
+                )
+            edges = ("e1_rect", "e2_rect") if element_type == "RBEN" else ("e1", "e2")
+            bend[edges[0]] = parameters.get("E1", 0.0)
+            bend[edges[1]] = parameters.get("E2", 0.0)
+            fields = {"length": length, "BendP": bend}
+            params = {
+                f"Kn{order}": parameters[f"K{order}"]
+                for order in (1, 2)
+                if parameters.get(f"K{order}")
+            }
+            if params:
+                fields["MagneticMultipoleP"] = params
+            return "RBend" if element_type == "RBEN" else "SBend", fields
+
+        if element_type == "MULT":
+            # One normal coefficient of the given order
+            order = int(parameters.get("ORDER", 1))
+            fields = {"length": length}
+            if parameters.get("KNL"):
+                params = {f"Kn{order}L": parameters["KNL"]}
+                if tilt:
+                    params[f"tilt{order}"] = tilt
+                fields["MagneticMultipoleP"] = params
+            return "Multipole", fields
+
+        if element_type in _KICKER_TYPES:
+            hkick = parameters.get(
+                "KICK" if element_type.endswith("HKICK") else "HKICK", 0.0
+            )
+            vkick = parameters.get(
+                "KICK" if element_type.endswith("VKICK") else "VKICK", 0.0
+            )
+            params = {}
+            # A horizontal kick is a negative normal dipole
+            if hkick:
+                params["Kn0L"] = -hkick
+            if vkick:
+                params["Ks0L"] = vkick
+            if params and tilt:
+                params["tilt0"] = tilt
+            fields = {"length": length}
+            if params:
+                fields["MagneticMultipoleP"] = params
+            return "Kicker", fields
+
+        if element_type in _RF_TYPES:
+            rf = {
+                "voltage": parameters.get("VOLT", 0.0),
+                "frequency": parameters.get("FREQ", 0.0),
+                "phase": math.radians(parameters.get("PHASE", 0.0)),
+            }
+            return "RFCavity", {"length": length, "RFP": rf}
+
+        if element_type == "SOLE":
+            return "Solenoid", {
+                "length": length,
+                "SolenoidP": {
+                    "Ksol": parameters.get("KS", 0.0),
+                    "Bsol": parameters.get("B", 0.0),
+                },
+            }
+
+        if element_type not in _PASSIVE_TYPES:
+            self.unsupported.add(element_type)
+        if length:
+            return "Drift", {"length": length}
+        return "Marker", {}
+
+
+def load(path, name: str = None, *, intern: bool = False):
+    """Import a line from an Elegant lattice file.
+
+    Args:
+        path: Path of the lattice file
+        name: Name of the line, by default the one of the USE statement, or
+            else the last one defined
+        intern: Share equal parameter groups between the elements (see
+            pals.intern_parameters)
+
+    Returns:
+        The BeamLine
+    """
+    parser = _Parser()
+    return import_line(parser, lambda: parser.read_file(path), name, intern)
+
+
+def loads(text: str, name: str = None, *, intern: bool = False):
+    """Import a line from the statements of an Elegant lattice file, see load.
+
+    Files in #include statements are relative to the current directory.
+    """
+    parser = _Parser()
+    return import_line(parser, lambda: parser.read(text), name, intern)
@@ -0,0 +1,678 @@
+"""Import of MAD-X lattice files.
+
+load(path) reads the element definitions, variables, LINE and SEQUENCE
+blocks of a MAD-X file (and of the files it CALLs) and returns the used (or
+the last defined) line or sequence as a BeamLine.
+
+- Variables and element attributes can be set with = (evaluated right away)
+  or := (deferred). Deferred expressions are evaluated with the values at the
+  end of the file, like MAD-X does when the sequence is used. Expressions can
+  use the MAD-X constants and functions and attributes like qf->k1.
+- Elements can be defined from a base class or from another element, whose
+  attributes they inherit, and changed later, e.g. by qf, k1=0.3 or
+  qf->k1 = 0.3.
+- Lines support repetitions (3*cell), reflections (-cell) and nested
+  parentheses. Repetitions and reflections of lines become RepeatedLines.
+- Elements in sequences are placed at their at= positions (relative to
+  refer= and from=), with explicit Drifts in between.
+
+Each MAD-X element becomes one PALS element, which is shared by all its uses
+in lines and sequences, and the generated Drifts of equal lengths are shared
+as well. Names are lower case, like in MAD-X.
+
+Drift, quadrupole, sextupole, octupole, sbend, rbend, multipole, kicker
+(hkicker, vkicker, tkicker), rfcavity, solenoid and marker elements are
+converted to the corresponding kinds. Monitors, instruments, collimators and
+placeholders become Drifts, or Markers if they have no length. Elements of
+other classes are imported in the same way, with a warning. Commands that do
+not change the lattice, like BEAM or TWISS, are ignored. Macros, control
+flow (if, while), sequence editing (SEQEDIT) and line arguments are not
+supported, and neither are other unknown commands.
+"""
+
+import math
+import os
+import re
+from functools import lru_cache
+
+from pals.kinds import BeamLine
+from pals.kinds.all_elements import validate_element_fields
+
+from .common import LineImporter, StopReading, import_line, split_items
+
+# Constants of the MAD-X expression language (masses in GeV)
+_CONSTANTS = {
+    "pi": math.pi,
+    "twopi": 2 * math.pi,
+    "degrad": 180 / math.pi,
+    "raddeg": math.pi / 180,
+    "e": math.e,
+    "clight": 299792458.0,
+    "qelect": 1.602176634e-19,
+    "hbar": 6.582119569e-25,
+    "emass": 0.51099895000e-3,
+    "pmass": 0.93827208816,
+    "nmass": 0.93956542052,
+    "mumass": 0.1056583755,
+    "erad": 2.8179403262e-15,
+    "prad": 2.8179403262e-15 * 0.51099895000e-3 / 0.93827208816,
+}
+
+# Functions of the MAD-X expression language
+_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "log": math.log,
+    "log10": math.log10,
+    "exp": math.exp,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "atan2": math.atan2,
+    "sinh": math.sinh,
+    "cosh": math.cosh,
+    "tanh": math.tanh,
+    "sinc": lambda x: math.sin(x) / x if x else 1.0,
+    "abs": abs,
+    "erf": math.erf,
+    "erfc": math.erfc,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "round": round,
+    "frac": lambda x: math.modf(x)[0],
+    "max": max,
+    "min": min,
+    "mod": math.fmod,
+}
+
+# Classes of elements without fields, which become Drifts or Markers
+_PASSIVE_CLASSES = {
+    "marker",
+    "monitor",
+    "hmonitor",
+    "vmonitor",
+    "instrument",
+    "placeholder",
+    "collimator",
+    "ecollimator",
+    "rcollimator",
+}
+
+# Classes of thick multipole magnets, with the order of their main field
+_MAGNET_ORDERS = {"quadrupole": 1, "sextupole": 2, "octupole": 3}
+
+# Kinds of the bend classes
+_BEND_KINDS = {"sbend": "SBend", "rbend": "RBend"}
+
+# Commands that do not change the lattice
+_IGNORED_COMMANDS = {
+    "assign",
+    "beam",
+    "emit",
+    "mark",
+    "option",
+    "print",
+    "resbeam",
+    "select",
+    "set",
+    "show",
+    "survey",
+    "system",
+    "title",
+    "twiss",
+    "value",
+}
+
+# Commands that edit sequences, which are not supported
+_SEQUENCE_EDITING_COMMANDS = {
+    "seqedit",
+    "install",
+    "remove",
+    "move",
+    "replace",
+    "cycle",
+    "reflect",
+    "flatten",
+    "extract",
+    "endedit",
+}
+
+# Attributes whose values are words, not expressions
+_WORD_ATTRIBUTES = {"refer", "from", "refpos", "sequence", "period", "file"}
+
+# Attributes that place elements in sequences
+_PLACEMENT_ATTRIBUTES = ("at", "from")
+
+# Maximum gap between elements of a sequence that is not filled by a Drift [m]
+_POSITION_TOLERANCE = 1e-9
+
+_NAME = r"[a-z_][\w.$]*"
+
+_COMMENT = re.compile(r"(\"[^\"\n]*\"|'[^'\n]*')|/\*.*?\*/|//[^\n]*|![^\n]*", re.S)
+_STRING = re.compile(r"\"[^\"]*\"|'[^']*'")
+_ATTRIBUTE_ASSIGNMENT = re.compile(rf"({_NAME})\s*->\s*(\w+)\s*(:?=)\s*(.+)", re.S)
+_ASSIGNMENT = re.compile(
+    rf"(?:(?:const|real|int|shared)\s+)*({_NAME})\s*(:?=)\s*(.+)", re.S
+)
+_LINE = re.compile(rf"({_NAME})\s*:\s*line\s*:?=\s*\((.*)\)", re.S)
+_LABEL = re.compile(rf"({_NAME})\s*:\s*({_NAME})\s*(?:,(.*))?", re.S)
+_COMMAND = re.compile(rf"({_NAME})\s*(?:,(.*))?", re.S)
+_ATTRIBUTE = re.compile(rf"\s*(-)?\s*({_NAME})\s*(?:(:?=)\s*(.*?))?\s*", re.S)
+_TOKEN = re.compile(
+    rf"""\s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[ed][+-]?\d+)?)
+        |(?P<name>{_NAME})(?:\s*->\s*(?P<attribute>\w+))?
+        |(?P<operator>\*\*|[-+*/^(),])
+    )""",
+    re.X,
+)
+
+
+class _Deferred(str):
+    """An expression that is evaluated on use, assigned with :="""
+
+
+@lru_cache(maxsize=None)
+def _compile(expression: str):
+    """Translate a MAD-X expression into compiled Python code.
+
+    Names become lookups of variables, element attributes or functions, so
+    the code cannot access anything else.
+    """
+    parts = []
+    position = 0
+    end = len(expression.rstrip())
+    while position < end:
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Invalid expression {expression!r}")
+        position = match.end()
+        number, name, attribute, operator = match.group(
+            "number", "name", "attribute", "operator"
+        )
+        if number is not None:
+            parts.append(repr(float(number.replace("d", "e"))))
+        elif attribute is not None:
+            parts.append(f"_attribute({name!r}, {attribute!r})")
+        elif name is not None:
+            if expression[position:].lstrip().startswith("("):
+                if name not in _FUNCTIONS:
+                    raise ValueError(f"Unknown function {name!r} in {expression!r}")
+                parts.append(f"_functions[{name!r}]")
+            else:
+                parts.append(f"_variable({name!r})")
+        else:
+            parts.append("**" if operator == "^" else operator)
+    try:
+        return compile(" ".join(parts), "<madx>", "eval")
+    except SyntaxError:
+        raise ValueError(f"Invalid expression {expression!r}") from None
+
+
+def _lower(statement: str) -> str:
+    """Return a statement in lower case, except for its strings."""
+    if '"' not in statement and "'" not in statement:
+        return statement.lower()
+    parts = []
+    position = 0
+    for match in _STRING.finditer(statement):
+        parts.append(statement[position : match.start()].lower())
+        parts.append(match.group())
+        position = match.end()
+    parts.append(statement[position:].lower())
+    return "".join(parts)
+
+
+class _Element:
+    """A MAD-X element: its base class and its attributes"""
+
+    __slots__ = ("base", "attributes")
+
+    def __init__(self, base: str, attributes: dict):
+        self.base = base
+        self.attributes = attributes
+
+
+class _Sequence:
+    """A MAD-X sequence: its attributes and its placed elements"""
+
+    __slots__ = ("attributes", "placements")
+
+    def __init__(self, attributes: dict):
+        self.attributes = attributes
+        # (element name, at, from) in the order of the file
+        self.placements = []
+
+
+class _Parser(LineImporter):
+    """Reads MAD-X statements and builds the PALS elements of a line or sequence"""
+
+    code = "MAD-X"
+
+    def __init__(self):
+        super().__init__()
+        self.variables = {}
+        self.elements = {}
+        self.sequences = {}
+        # The sequence being read, between SEQUENCE and ENDSEQUENCE
+        self.sequence = None
+        # Values of deferred variables, once all statements are read
+        self.cache = None
+        self.evaluating = set()
+        self.namespace = {
+            "__builtins__": {},
+            "_variable": self.variable,
+            "_attribute": self.attribute,
+            "_functions": _FUNCTIONS,
+        }
+        # Drifts between the elements of sequences, by length
+        self.drifts = {}
+
+    # Reading
+
+    def read_file(self, path):
+        with open(path) as file:
+            text = file.read()
+        directory = os.path.dirname(os.fspath(path))
+        return self.read(text, os.fspath(path), directory)
+
+    def read(self, text: str, source: str = "<string>", directory: str = ""):
+        """Read the statements of a text, returning False after a RETURN statement."""
+        text = _COMMENT.sub(
+            lambda match: match.group(1) or "\n" * match.group().count("\n"), text
+        )
+        line_number = 1
+        for chunk in text.split(";"):
+            statement = chunk.strip()
+            if statement:
+                start = line_number + chunk[: chunk.find(statement[0])].count("\n")
+                try:
+                    if not self.statement(_lower(statement), directory):
+                        return False
+                except ValueError as error:
+                    raise ValueError(f"{source}:{start}: {error}") from None
+            line_number += chunk.count("\n")
+        return True
+
+    def statement(self, statement: str, directory: str) -> bool:
+        """Read one statement, returning False if it ends the current file."""
+        match = _ATTRIBUTE_ASSIGNMENT.fullmatch(statement)
+        if match is not None:
+            name, attribute, operator, text = match.groups()
+            if name not in self.elements:
+                raise ValueError(f"Undefined element {name!r}")
+            self.elements[name].attributes[attribute] = self.value(operator, text)
+            return True
+
+        match = _ASSIGNMENT.fullmatch(statement)
+        if match is not None:
+            name, operator, text = match.groups()
+            self.variables[name] = self.value(operator, text)
+            return True
+
+        match = _LINE.fullmatch(statement)
+        if match is not None:
+            name, body = match.groups()
+            self.lines[name] = body
+            self.last = name
+            return True
+
+        match = _LABEL.fullmatch(statement)
+        if match is not None:
+            label, base, text = match.groups()
+            attributes = self.attributes(text)
+            if base == "sequence":
+                self.sequence = self.sequences[label] = _Sequence(attributes)
+                self.last = label
+            elif base in self.sequences or base in self.lines:
+                self.place(base, attributes)
+            else:
+                self.define(label, base, attributes)
+                self.place(label, attributes)
+            return True
+
+        match = _COMMAND.fullmatch(statement)
+        if match is None:
+            raise ValueError(f"Cannot read the statement {statement!r}")
+        name, text = match.groups()
+        if name in ("if", "elseif", "else", "while", "macro"):
+            raise ValueError(f"{name.upper()} statements are not supported")
+        if name in _SEQUENCE_EDITING_COMMANDS:
+            raise ValueError(f"Sequence editing ({name.upper()}) is not supported")
+        if name == "endsequence":
+            self.sequence = None
+        elif self.sequence is not None:
+            self.place(name, self.attributes(text))
+        elif name in self.elements:
+            self.elements[name].attributes.update(self.attributes(text))
+        elif name == "use":
+            attributes = self.attributes(text)
+            self.used = attributes.get("sequence") or attributes.get("period")
+        elif name == "call":
+            path = self.attributes(text).get("file")
+            if path is None:
+                raise ValueError("CALL needs a file")
+            # A RETURN statement only ends the called file
+            self.read_file(os.path.join(directory, path))
+        elif name == "return":
+            return False
+        elif name in ("stop", "exit", "quit"):
+            raise StopReading
+        elif name not in _IGNORED_COMMANDS:
+            raise ValueError(f"Unknown command {name.upper()}")
+        return True
+
+    def value(self, operator: str, text: str):
+        """Return the value of an assignment, evaluated right away unless it is deferred."""
+        text = text.strip()
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        if text.startswith("{"):
+            if not text.endswith("}"):
+                raise ValueError(f"Invalid array {text!r}")
+            return [self.value(operator, item) for item in split_items(text[1:-1])]
+        if operator == ":=":
+            _compile(text)
+            return _Deferred(text)
+        return self.expression(text)
+
+    def attributes(self, text: str) -> dict:
+        """Return the attributes of a definition or command, e.g. from 'l=1, k1:=kf'"""
+        attributes = {}
+        for item in split_items(text or ""):
+            match = _ATTRIBUTE.fullmatch(item)
+            if match is None:
+                raise ValueError(f"Invalid attribute {item.strip()!r}")
+            negated, key, operator, text = match.groups()
+            if operator is None:
+                # Flags like thick or -thick
+                attributes[key] = not negated
+            elif key in _WORD_ATTRIBUTES:
+                attributes[key] = text.strip("\"'")
+            else:
+                attributes[key] = self.value(operator, text)
+        return attributes
+
+    def define(self, name: str, base: str, attributes: dict):
+        """Define an element from a base class or from another element."""
+        attributes = {
+            key: value
+            for key, value in attributes.items()
+            if key not in _PLACEMENT_ATTRIBUTES
+        }
+        parent = self.elements.get(base)
+        if parent is not None:
+            self.elements[name] = _Element(
+                parent.base, {**parent.attributes, **attributes}
+            )
+        else:
+            self.elements[name] = _Element(base, attributes)
+
+    def place(self, name: str, attributes: dict):
+        """Place an element in the sequence being read."""
+        if self.sequence is None:
+            return
+        self.sequence.placements.append(
+            (name, attributes.get("at", 0.0), attributes.get("from"))
+        )
+
+    # Evaluation
+
+    def expression(self, text: str) -> float:
+        """Return the value of an expression."""
+        return eval(_compile(text), self.namespace)
+
+    def evaluate(self, value):
+        """Return the value of an attribute or variable, evaluating deferred expressions."""
+        if type(value) is _Deferred:
+            return self.expression(value)
+        if type(value) is list:
+            return [self.evaluate(item) for item in value]
+        return value
+
+    def variable(self, name: str) -> float:
+        if self.cache is not None and name in self.cache:
+            return self.cache[name]
+        value = self.variables.get(name)
+        if value is None:
+            # Undefined variables are 0, like in MAD-X
+            return _CONSTANTS.get(name, 0.0)
+        if type(value) is _Deferred:
+            if name in self.evaluating:
+                raise ValueError(f"The expression of {name!r} refers to itself")
+            self.evaluating.add(name)
+            try:
+                value = self.evaluate(value)
+            finally:
+                self.evaluating.discard(name)
+        if self.cache is not None:
+            self.cache[name] = value
+        return value
+
+    def attribute(self, name: str, attribute: str) -> float:
+        source = self.elements.get(name) or self.sequences.get(name)
+        if source is None:
+            raise ValueError(f"Undefined element {name!r}")
+        return self.evaluate(source.attributes.get(attribute, 0.0))
+
+    # Building
+
+    def normalize(self, name: str) -> str:
+        return name.lower()
+
+    def is_line(self, name: str) -> bool:
+        return name in self.lines or name in self.sequences
+
+    def build(self, name: str = None) -> BeamLine:
+        # All statements are read, so deferred values do not change anymore
+        self.cache = {}
+        return super().build(name)
+
+    def build_definition(self, name: str):
+        if name in self.sequences:
+            return self.build_sequence(name)
+        if name not in self.elements:
+            raise ValueError(f"Undefined element {name!r}")
+        return self.build_element(name)
+
+    def build_element(self, name: str):
+        definition = self.elements[name]
+        attributes = {
+            key: self.evaluate(value) for key, value in definition.attributes.items()
+        }
+        kind, fields = self.convert(definition.base, attributes)
+        return validate_element_fields({"kind": kind, "name": name, **fields})
+
+    def convert(self, base: str, attributes: dict) -> tuple:
+        """Return the kind and the fields of the PALS element of a MAD-X element."""
+        length = attributes.get("l", 0.0)
+        tilt = attributes.get("tilt", 0.0)
+
+        if base == "drift":
+            return "Drift", {"length": length}
+
+        if base in _MAGNET_ORDERS:
+            order = _MAGNET_ORDERS[base]
+            params = {f"Kn{order}": attributes.get(f"k{order}", 0.0)}
+            if attributes.get(f"k{order}s"):
+                params[f"Ks{order}"] = attributes[f"k{order}s"]
+            if tilt:
+                params[f"tilt{order}"] = tilt
+            return base.capitalize(), {"length": length, "MagneticMultipoleP": params}
+
+        if base in _BEND_KINDS:
+            angle = attributes.get("angle", 0.0)
+            bend = {}
+            if base == "rbend":
+                # The length of rectangular bends is their chord
+                bend["L_chord"] = length
+                if angle:
+                    length = length * angle / (2 * math.sin(angle / 2))
+                bend["e1_rect"] = attributes.get("e1", 0.0)
+                bend["e2_rect"] = attributes.get("e2", 0.0)
+            else:
+                bend["e1"] = attributes.get("e1", 0.0)
+                bend["e2"] = attributes.get("e2", 0.0)
+            bend["g_ref"] = angle / length if length else 0.0
+            bend["tilt_ref"] = tilt
+            fields = {"length": length, "BendP": bend}
+            params = {
+                f"Kn{order}": attributes[f"k{order}"]
+                for order in (1, 2)
+                if attributes.get(f"k{order}")
+            }
+            if params:
+                fields["MagneticMultipoleP"] = params
+            return _BEND_KINDS[base], fields
+
+        if base == "multipole":
+            params = {}
+            for prefix, key in (("Kn", "knl"), ("Ks", "ksl")):
+                for order, value in enumerate(attributes.get(key) or ()):
+                    if value:
+                        params[f"{prefix}{order}L"] = value
+                        if tilt:
+                            params[f"tilt{order}"] = tilt
+            fields = {"length": 0.0}
+            if params:
+                fields["MagneticMultipoleP"] = params
+            return "Multipole", fields
+
+        if base in ("kicker", "hkicker", "vkicker", "tkicker"):
+            hkick = attributes.get("kick" if base == "hkicker" else "hkick", 0.0)
+            vkick = attributes.get("kick" if base == "vkicker" else "vkick", 0.0)
+            params = {}
+            # A horizontal kick is a negative normal dipole
+            if hkick:
+                params["Kn0L"] = -hkick
+            if vkick:
+                params["Ks0L"] = vkick
+            if params and tilt:
+                params["tilt0"] = tilt
+            fields = {"length": length}
+            if params:
+                fields["MagneticMultipoleP"] = params
+            return "Kicker", fields
+
+        if base == "rfcavity":
+            # Voltages in MV, frequencies in MHz and phases in units of 2 pi
+            rf = {
+                "voltage": attributes.get("volt", 0.0) * 1e6,
+                "frequency": attributes.get("freq", 0.0) * 1e6,
+                "phase": attributes.get("lag", 0.0) * 2 * math.pi,
+                "harmon": int(attributes.get("harmon", 0)),
+            }
+            return "RFCavity", {"length": length, "RFP": rf}
+
+        if base == "solenoid":
+            return "Solenoid", {
+                "length": length,
+                "SolenoidP": {"Ksol": attributes.get("ks", 0.0)},
+            }
+
+        if base not in _PASSIVE_CLASSES:
+            self.unsupported.add(base)
+        if length:
+            return "Drift", {"length": length}
+        return "Marker", {}
+
+    def build_sequence(self, name: str) -> BeamLine:
+        """Return the BeamLine of a sequence, with Drifts between its placed elements."""
+        sequence = self.sequences[name]
+        length = self.evaluate(sequence.attributes.get("l", 0.0))
+        refer = sequence.attributes.get("refer", "centre")
+        # The positions of the (reference points of the) elements, by name
+        positions = {}
+        placed = []
+        for element_name, at, origin in sequence.placements:
+            position = self.evaluate(at)
+            if origin is not None:
+                position += self.origin(origin, positions, length)
+            positions.setdefault(element_name, position)
+            placed.append((position, element_name))
+
+        entries = []
+        for position, element_name in placed:
+            element = self.element(element_name)
+            if element_name in self.sequences:
+                element_length = self.evaluate(
+                    self.sequences[element_name].attributes.get("l", 0.0)
+                )
+            else:
+                element_length = getattr(element, "length", 0.0)
+            if refer in ("centre", "center"):
+                position -= element_length / 2
+            elif refer == "exit":
+                position -= element_length
+            entries.append((position, element_length, element))
+        entries.sort(key=lambda entry: entry[0])
+
+        line = []
+        end = 0.0
+        for position, element_length, element in entries:
+            gap = position - end
+            if gap < -_POSITION_TOLERANCE:
+                raise ValueError(
+                    f"Element {element.name!r} overlaps the previous element in "
+                    f"sequence {name!r} by {-gap} m"
+                )
+            if gap > _POSITION_TOLERANCE:
+                line.append(self.drift(gap))
+            line.append(element)
+            end = max(end, position + element_length)
+        if length - end > _POSITION_TOLERANCE:
+            line.append(self.drift(length - end))
+        return BeamLine(name=name, line=line)
+
+    def origin(self, name: str, positions: dict, length: float) -> float:
+        """Return the position of the origin of a from= attribute."""
+        if name == "#s":
+            return 0.0
+        if name == "#e":
+            return length
+        if name not in positions:
+            raise ValueError(f"from={name} refers to an element not placed before")
+        return positions[name]
+
+    def drift(self, length: float):
+        """Return a Drift of a length, shared by all gaps of (almost) the same length."""
+        key = round(length, 9)
+        drift = self.drifts.get(key)
+        if drift is None:
+            name = f"drift_{len(self.drifts)}"
+            while name in self.elements or name in self.built:
+                name += "_"
+            drift = self.drifts[key] = validate_element_fields(
+                {"kind": "Drift", "name": name, "length": length}
+            )
+        return drift
+
+
+def load(path, name: str = None, *, intern: bool = False) -> BeamLine:
+    """Import a line or sequence from a MAD-X file.
+
+    Args:
+        path: Path of the MAD-X file
+        name: Name of the line or sequence, by default the one of the last
+            USE statement, or else the last one defined
+        intern: Share equal parameter groups between the elements (see
+            pals.intern_parameters)
+
+    Returns:
+        The BeamLine
+    """
+    parser = _Parser()
+    return import_line(parser, lambda: parser.read_file(path), name, intern)
+
+
+def loads(text: str, name: str = None, *, intern: bool = False) -> BeamLine:
+    """Import a line or sequence from MAD-X statements, see load.
+
+    Files in CALL statements are relative to the current directory.
+    """
+    parser = _Parser()
+    return import_line(parser, lambda: parser.read(text), name, intern)
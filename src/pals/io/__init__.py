@@ -0,0 +1,23 @@
+"""Reading and writing PALS files.
+
+Re-export commonly used functions from submodules so callers can use
+simpler import statements like `from pals.io import load_streaming`.
+"""
+
+from .streaming import (  # noqa: F401
+    StreamWriter,
+    dump_streaming,
+    iter_elements,
+    load_streaming,
+)
+from .cache import clear_cache  # noqa: F401
+from .columnar import ColumnarLattice, read_columnar, write_columnar  # noqa: F401
+from .files import (  # noqa: F401
+    dump,
+    dumps,
+    has_valid_checksum,
+    load,
+    load_data,
+    write_checksum,
+    write_json,
+)
@@ -0,0 +1,159 @@
+"""On-disk cache of validated BeamLines, keyed on the content of their files.
+
+Loading the same lattice files over and over again spends most of its time
+in parsing and validation. With load(path, cache=True), the validated
+BeamLine is pickled into a cache directory, under a key made of the SHA-256
+of the file content, its format, the package version and a fingerprint of
+the element schema. Later loads of a file with the same content unpickle it
+instead, skipping both parsing and validation.
+
+The cache directory is PALS_CACHE_DIR, by default pals in the user's cache
+directory. Its total size is bounded by PALS_CACHE_SIZE (in bytes, 1 GiB by
+default): the least recently used entries are evicted first.
+
+Cached entries are unpickled, so the cache directory must only be writable
+by trusted users, just like the Python packages themselves.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from importlib import metadata
+
+from pals.kinds.utils import paused_gc
+
+# Default maximum total size of the cache in bytes
+DEFAULT_CACHE_SIZE = 1 << 30
+
+# Extension of the cache entries
+_ENTRY_SUFFIX = ".pickle"
+
+
+def get_cache_dir() -> str:
+    """Return the cache directory, from PALS_CACHE_DIR or in the user's cache directory."""
+    path = os.environ.get("PALS_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "pals")
+
+
+def get_cache_size() -> int:
+    """Return the maximum total size of the cache in bytes, from PALS_CACHE_SIZE."""
+    size = os.environ.get("PALS_CACHE_SIZE")
+    return DEFAULT_CACHE_SIZE if not size else int(size)
+
+
+def schema_fingerprint() -> str:
+    """Return a fingerprint of the package version and the schema of all elements.
+
+    Cache entries written by other versions, or with other element models,
+    do not match it and are not used.
+    """
+    from pals.kinds.all_elements import get_element_type_adapter
+
+    # The adapter changes when element kinds are registered
+    return _schema_fingerprint(get_element_type_adapter())
+
+
+@lru_cache(maxsize=None)
+def _schema_fingerprint(adapter) -> str:
+    try:
+        version = metadata.version("pals_schema")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    schema = json.dumps(adapter.json_schema(), sort_keys=True)
+    return hashlib.sha256(f"{version}\n{schema}".encode()).hexdigest()
+
+
+def cache_key(content: bytes, fmt: str) -> str:
+    """Return the cache key of the content of a file."""
+    digest = hashlib.sha256(content)
+    digest.update(f"\n{fmt}\n{schema_fingerprint()}".encode())
+    return digest.hexdigest()
+
+
+def _entry_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, key + _ENTRY_SUFFIX)
+
+
+def get_cached(key: str, cache_dir: str = None):
+    """Return the cached BeamLine of a cache key, or None if it is not cached."""
+    path = _entry_path(key, cache_dir or get_cache_dir())
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return None
+    # Mark the entry as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    # Unpickling creates many objects, like the validation
+    try:
+        with paused_gc():
+            return pickle.loads(content)
+    except Exception:
+        # Corrupted or outdated entries are ignored and replaced later
+        return None
+
+
+def put_cached(key: str, line, cache_dir: str = None, max_size: int = None):
+    """Store a BeamLine in the cache and evict the least recently used entries if needed."""
+    cache_dir = cache_dir or get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    content = pickle.dumps(line, protocol=pickle.HIGHEST_PROTOCOL)
+    # Write atomically, so concurrent jobs never read partial entries
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, _entry_path(key, cache_dir))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    evict(cache_dir, get_cache_size() if max_size is None else max_size)
+
+
+def _entries(cache_dir: str) -> list:
+    """Return the (last use, size, path) of all cache entries."""
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    with os.scandir(cache_dir) as scan:
+        for entry in scan:
+            if not entry.name.endswith(_ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def evict(cache_dir: str = None, max_size: int = None):
+    """Remove the least recently used cache entries until the cache fits into max_size bytes."""
+    cache_dir = cache_dir or get_cache_dir()
+    max_size = get_cache_size() if max_size is None else max_size
+    entries = sorted(_entries(cache_dir))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def clear_cache(cache_dir: str = None):
+    """Remove all cache entries."""
+    evict(cache_dir, 0)
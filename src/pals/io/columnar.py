@@ -0,0 +1,297 @@
+"""Binary, columnar storage of lattices in a directory of NumPy .npy files.
+
+Each element definition of a lattice is one row of typed columns: the kind,
+name, length, the (sparse) multipole coefficients and the list entries of
+lines, unions and repetitions, which refer to rows by index so that shared
+elements are stored once. All remaining properties of a row, like other
+parameter groups, are stored as JSON text. Variable-length columns (names,
+JSON text, list entries) are stored flat with an offsets column, as in Arrow.
+
+The columns are opened with memory mapping: opening a lattice reads only its
+small metadata file, and the pages of a column are read when it is accessed.
+"""
+
+import json
+import math
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from pals.kinds import BeamLine
+from pals.kinds.mixin.all_element_mixin import is_repetition
+
+# Name and version of the format, stored in the metadata file
+FORMAT = "pals-columnar"
+VERSION = 1
+
+# Metadata file in the lattice directory
+_META_FILE = "meta.json"
+
+# Parameter groups whose float coefficients are stored in the sparse columns
+_MULTIPOLE_GROUPS = ("MagneticMultipoleP", "ElectricMultipoleP")
+
+# Fields that hold the list entries of a row
+_LIST_FIELDS = ("line", "elements")
+
+
+def _offsets(lengths) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _pack_strings(strings) -> tuple:
+    """Return the UTF-8 bytes of strings and their offsets."""
+    encoded = [string.encode() for string in strings]
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, _offsets([len(item) for item in encoded])
+
+
+def _unpack_strings(data, offsets) -> list:
+    """Return the strings of packed UTF-8 bytes and their offsets."""
+    blob = data.tobytes()
+    bounds = offsets.tolist()
+    return [blob[start:stop].decode() for start, stop in zip(bounds, bounds[1:])]
+
+
+class _ColumnBuilder:
+    """Collect the rows of the columns while walking the dumped lattice."""
+
+    def __init__(self):
+        self.kinds = {}
+        self.groups = {name: index for index, name in enumerate(_MULTIPOLE_GROUPS)}
+        self.keys = {}
+        self.kind = []
+        self.name = []
+        self.length = []
+        self.params = []
+        self.children = []
+        self.multipole_row = []
+        self.multipole_group = []
+        self.multipole_key = []
+        self.multipole_value = []
+        # Row of the latest definition of each name, for name references
+        self.registry = {}
+
+    def add(self, item) -> int:
+        """Add the rows of a dumped list entry and return the row of the entry."""
+        if isinstance(item, str):
+            if item not in self.registry:
+                raise ValueError(f"Reference to undefined element {item!r}")
+            return self.registry[item]
+
+        if is_repetition(item):
+            name = None
+            fields = {"kind": "RepeatedLine", **item}
+        else:
+            ((name, fields),) = item.items()
+            fields = dict(fields)
+
+        row = len(self.kind)
+        self.kind.append(self.kinds.setdefault(fields.pop("kind"), len(self.kinds)))
+        self.name.append("" if name is None else name)
+        self.length.append(fields.pop("length", np.nan))
+        # Reserve the row before adding the list entries
+        self.params.append(None)
+        self.children.append(None)
+
+        for group in _MULTIPOLE_GROUPS:
+            coefficients = fields.get(group)
+            if coefficients is None:
+                continue
+            remaining = {}
+            for key, value in coefficients.items():
+                if type(value) is not float:
+                    remaining[key] = value
+                    continue
+                self.multipole_row.append(row)
+                self.multipole_group.append(self.groups[group])
+                self.multipole_key.append(self.keys.setdefault(key, len(self.keys)))
+                self.multipole_value.append(value)
+            if remaining:
+                fields[group] = remaining
+            else:
+                del fields[group]
+
+        entries = []
+        for field in _LIST_FIELDS:
+            if field in fields:
+                value = fields.pop(field)
+                entries = [
+                    self.add(entry)
+                    for entry in (value if isinstance(value, list) else [value])
+                ]
+        self.children[row] = entries
+        self.params[row] = json.dumps(fields) if fields else ""
+
+        # Repetitions are anonymous and cannot be referenced
+        if name is not None:
+            self.registry[name] = row
+        return row
+
+    def columns(self) -> dict:
+        """Return the columns as NumPy arrays, by name."""
+        names, name_offsets = _pack_strings(self.name)
+        params, params_offsets = _pack_strings(self.params)
+        return {
+            "kind": np.array(self.kind, dtype=np.int32),
+            "name": names,
+            "name_offsets": name_offsets,
+            "length": np.array(self.length, dtype=np.float64),
+            "params": params,
+            "params_offsets": params_offsets,
+            "children": np.array(
+                [child for entries in self.children for child in entries],
+                dtype=np.int64,
+            ),
+            "children_offsets": _offsets([len(entries) for entries in self.children]),
+            "multipole_row": np.array(self.multipole_row, dtype=np.int64),
+            "multipole_group": np.array(self.multipole_group, dtype=np.int8),
+            "multipole_key": np.array(self.multipole_key, dtype=np.int32),
+            "multipole_value": np.array(self.multipole_value, dtype=np.float64),
+        }
+
+
+def write_columnar(line: BeamLine, path):
+    """Write a BeamLine to a directory of columnar .npy files.
+
+    Args:
+        line: The BeamLine
+        path: Path of the directory, which is created if needed
+    """
+    builder = _ColumnBuilder()
+    builder.add(line.model_dump())
+    columns = builder.columns()
+    os.makedirs(path, exist_ok=True)
+    for name, column in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), column, allow_pickle=False)
+    meta = {
+        "format": FORMAT,
+        "version": VERSION,
+        "rows": len(builder.kind),
+        "columns": list(columns),
+        "kinds": list(builder.kinds),
+        "multipole_groups": list(_MULTIPOLE_GROUPS),
+        "multipole_keys": list(builder.keys),
+    }
+    with open(os.path.join(path, _META_FILE), "w") as file:
+        json.dump(meta, file, indent=2)
+
+
+class ColumnarLattice(Mapping):
+    """The memory-mapped columns of a lattice written by write_columnar
+
+    Columns are loaded on first access, as read-only memory-mapped arrays,
+    e.g. lattice["length"]. Row 0 is the BeamLine itself.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _META_FILE)) as file:
+            self.meta = json.load(file)
+        if self.meta.get("format") != FORMAT or self.meta.get("version") != VERSION:
+            raise ValueError(
+                f"Unsupported columnar lattice format {self.meta.get('format')!r} "
+                f"(version {self.meta.get('version')!r}) in {path!r}"
+            )
+        self._columns = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            if name not in self.meta["columns"]:
+                raise KeyError(name)
+            self._columns[name] = np.load(
+                os.path.join(self.path, f"{name}.npy"),
+                mmap_mode="r",
+                allow_pickle=False,
+            )
+        return self._columns[name]
+
+    def __iter__(self):
+        return iter(self.meta["columns"])
+
+    def __len__(self) -> int:
+        return len(self.meta["columns"])
+
+    @property
+    def n_rows(self) -> int:
+        """Number of rows, i.e. of element definitions"""
+        return self.meta["rows"]
+
+    def kinds(self) -> np.ndarray:
+        """Return the element kinds of all rows"""
+        return np.asarray(self.meta["kinds"], dtype=object)[self["kind"]]
+
+    def names(self) -> list:
+        """Return the element names of all rows (empty for repetitions)"""
+        return _unpack_strings(self["name"], self["name_offsets"])
+
+    def to_data(self) -> dict:
+        """Return the lattice as plain Python data, in the layout of BeamLine.model_dump"""
+        kinds = self.meta["kinds"]
+        groups = self.meta["multipole_groups"]
+        keys = self.meta["multipole_keys"]
+        kind = self["kind"].tolist()
+        names = self.names()
+        length = self["length"].tolist()
+        params = _unpack_strings(self["params"], self["params_offsets"])
+        children = self["children"].tolist()
+        children_offsets = self["children_offsets"].tolist()
+
+        # The multipole coefficients are sorted by row
+        multipole_row = self["multipole_row"]
+        multipole_offsets = np.searchsorted(
+            multipole_row, np.arange(self.n_rows + 1)
+        ).tolist()
+        multipole_group = self["multipole_group"].tolist()
+        multipole_key = self["multipole_key"].tolist()
+        multipole_value = self["multipole_value"].tolist()
+
+        written = set()
+
+        def entry(row: int):
+            if row in written:
+                return names[row]
+            fields = json.loads(params[row]) if params[row] else {}
+            for index in range(multipole_offsets[row], multipole_offsets[row + 1]):
+                group = fields.setdefault(groups[multipole_group[index]], {})
+                group[keys[multipole_key[index]]] = multipole_value[index]
+            if not math.isnan(length[row]):
+                fields["length"] = length[row]
+            entries = [
+                entry(child)
+                for child in children[children_offsets[row] : children_offsets[row + 1]]
+            ]
+            row_kind = kinds[kind[row]]
+            if row_kind == "RepeatedLine":
+                return {"repeat": fields["repeat"], "line": entries[0], **fields}
+            written.add(row)
+            data = {"kind": row_kind, **fields}
+            if row_kind == "UnionEle":
+                data["elements"] = entries
+            elif row_kind == "BeamLine":
+                data["line"] = entries
+            return {names[row]: data}
+
+        return entry(0)
+
+    def to_beamline(self, trusted: bool = False) -> BeamLine:
+        """Return the BeamLine, validated unless trusted is set (see BeamLine.from_trusted)"""
+        data = self.to_data()
+        if trusted:
+            return BeamLine.from_trusted(data)
+        return BeamLine(**data)
+
+
+def read_columnar(path, trusted: bool = False) -> BeamLine:
+    """Read a BeamLine from a directory written by write_columnar.
+
+    Args:
+        path: Path of the directory
+        trusted: Construct the elements without validation (see BeamLine.from_trusted)
+
+    Returns:
+        The BeamLine
+    """
+    return ColumnarLattice(path).to_beamline(trusted)
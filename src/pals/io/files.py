@@ -0,0 +1,189 @@
+"""Loading and writing of whole BeamLine files, with an optional fast path for trusted files.
+
+Files that were written by PALS can be marked as trusted with a checksum
+sidecar file (see write_checksum). When loading with trusted=True, files whose
+content still matches their checksum are constructed without validation.
+"""
+
+import hashlib
+import json
+import os
+
+import yaml
+
+from pals.kinds import BeamLine, intern_parameters
+from pals.kinds.mixin.all_element_mixin import dump_element_json
+
+from .cache import cache_key, get_cached, put_cached
+from .streaming import _get_format
+
+# Extension of the checksum sidecar files
+CHECKSUM_SUFFIX = ".sha256"
+
+
+def checksum_path(path) -> str:
+    """Return the path of the checksum sidecar file of a file."""
+    return os.fspath(path) + CHECKSUM_SUFFIX
+
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def write_checksum(path) -> str:
+    """Write the checksum sidecar file of a file, marking its content as trusted.
+
+    The sidecar uses the format of sha256sum, so it can also be checked with
+    `sha256sum -c`.
+
+    Returns:
+        The hex digest of the SHA-256 checksum
+    """
+    with open(path, "rb") as file:
+        digest = _sha256(file.read())
+    with open(checksum_path(path), "w") as file:
+        file.write(f"{digest}  {os.path.basename(os.fspath(path))}\n")
+    return digest
+
+
+def has_valid_checksum(path, content: bytes = None) -> bool:
+    """Return whether a file has a checksum sidecar file that matches its content."""
+    try:
+        with open(checksum_path(path)) as file:
+            expected = file.read().split(maxsplit=1)
+    except FileNotFoundError:
+        return False
+    if not expected:
+        return False
+    if content is None:
+        with open(path, "rb") as file:
+            content = file.read()
+    return _sha256(content) == expected[0].lower()
+
+
+def parse(content: bytes, fmt: str):
+    """Parse the content of a YAML or JSON file into plain Python data."""
+    if fmt == "json":
+        return json.loads(content)
+    return yaml.safe_load(content)
+
+
+def load_data(path, fmt: str = None):
+    """Read a YAML or JSON file into plain Python data, without validating it.
+
+    Args:
+        path: Path of the file
+        fmt: File format, "yaml" or "json", by default from the file extension
+    """
+    fmt = _get_format(path, fmt)
+    with open(path, "rb") as file:
+        return parse(file.read(), fmt)
+
+
+def dumps(element, fmt: str = "yaml") -> str:
+    """Serialize an element (usually a BeamLine) to a YAML or JSON string.
+
+    The output is the same as yaml.dump(element.model_dump(),
+    default_flow_style=False) or json.dumps(element.model_dump(),
+    sort_keys=True, indent=2), respectively.
+    """
+    fmt = _get_format("", fmt)
+    data = element.model_dump()
+    if fmt == "json":
+        return json.dumps(data, sort_keys=True, indent=2)
+    return yaml.dump(data, default_flow_style=False)
+
+
+def dump(element, path, fmt: str = None, *, checksum: bool = False):
+    """Write an element (usually a BeamLine) to a YAML or JSON file.
+
+    Args:
+        element: The element to write
+        path: Path of the file
+        fmt: File format, "yaml" or "json", by default from the file extension
+        checksum: Also write the checksum sidecar file (see write_checksum), so
+            that the file can be loaded with trusted=True
+    """
+    content = dumps(element, _get_format(path, fmt))
+    with open(path, "w") as file:
+        file.write(content)
+    if checksum:
+        write_checksum(path)
+
+
+def write_json(element, fp, *, backend: str = None):
+    """Write an element (usually a BeamLine) as compact JSON, serialized straight to bytes.
+
+    Args:
+        element: The element to write
+        fp: Path of the file, or a file object opened in binary mode
+        backend: "pydantic" (default) or "orjson", see BeamLine.to_json_bytes
+    """
+    content = dump_element_json(element, backend)
+    if hasattr(fp, "write"):
+        fp.write(content)
+    else:
+        with open(fp, "wb") as file:
+            file.write(content)
+
+
+def load(
+    path,
+    fmt: str = None,
+    *,
+    trusted: bool = False,
+    cache: bool = False,
+    intern: bool = False,
+    lazy: bool = False,
+    workers: int = None,
+) -> BeamLine:
+    """Load a BeamLine from a YAML or JSON file.
+
+    Args:
+        path: Path of the file
+        fmt: File format, "yaml" or "json", by default from the file extension
+        trusted: Skip the validation if the file has a matching checksum
+            sidecar file (see write_checksum). Otherwise, or if the file has
+            been changed since, the file is validated as usual.
+        cache: Use the on-disk cache of validated BeamLines (see
+            pals.io.cache): files whose content has been loaded before are
+            neither parsed nor validated again. BeamLines that were
+            constructed without validation (see trusted) are not stored in
+            the cache.
+        intern: Share equal parameter groups between the elements (see
+            pals.intern_parameters), which saves memory for periodic lattices.
+        lazy: Validate the elements on first access through
+            BeamLine.lazy_elements (see BeamLine.lazy), which is much faster
+            if only a few elements are used. Lazy BeamLines are not stored in
+            the cache, and lazy cannot be combined with trusted, intern or
+            workers.
+        workers: Validate in this many worker processes (see
+            BeamLine.validate_parallel), or in the calling process if not set.
+
+    Returns:
+        The BeamLine
+    """
+    if lazy and (trusted or intern or (workers is not None and workers > 1)):
+        raise ValueError("lazy cannot be combined with trusted, intern or workers")
+    fmt = _get_format(path, fmt)
+    with open(path, "rb") as file:
+        content = file.read()
+    if cache:
+        key = cache_key(content, fmt)
+        line = get_cached(key)
+        if line is not None:
+            return intern_parameters(line) if intern else line
+    data = parse(content, fmt)
+    if lazy:
+        return BeamLine.lazy(data)
+    if trusted and has_valid_checksum(path, content):
+        # The cache only holds validated BeamLines
+        line = BeamLine.from_trusted(data)
+        return intern_parameters(line) if intern else line
+    if workers is not None and workers > 1:
+        line = BeamLine.validate_parallel(data, workers)
+    else:
+        line = BeamLine(**data)
+    if cache:
+        put_cached(key, line)
+    return intern_parameters(line) if intern else line
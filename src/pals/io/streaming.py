@@ -0,0 +1,425 @@
+"""Streaming, event-driven loading and writing of large BeamLine files.
+
+Instead of parsing the whole YAML/JSON file into a dict tree and validating it
+afterwards, the files are walked with an event parser and each entry of the
+top-level ``line`` is validated as soon as it has been read. Peak memory thus
+scales with the largest single element and not with the whole lattice.
+
+Likewise, StreamWriter writes the entries of the top-level ``line`` one at a
+time, without dumping the whole lattice into a dict tree first.
+"""
+
+import json
+import os
+import weakref
+
+import yaml
+from yaml.events import (
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamStartEvent,
+)
+
+from pydantic import ValidationError
+
+from pals.kinds.mixin.all_element_mixin import (
+    dump_list_entry,
+    prefix_error_locations,
+    validate_element,
+)
+
+# Number of characters read from a JSON file at once
+_JSON_CHUNK_SIZE = 1 << 16
+
+# Number of characters buffered before they are written to a file
+_WRITE_CHUNK_SIZE = 1 << 16
+
+# Indentation of the entries of the top-level line in the written files
+_YAML_INDENT = "  "
+_JSON_INDENT = "      "
+
+
+def _get_format(path, fmt: str = None) -> str:
+    """Return the file format, either as given or from the file extension."""
+    if fmt is None:
+        fmt = os.path.splitext(os.fspath(path))[1].lstrip(".")
+    fmt = fmt.lower()
+    if fmt == "yml":
+        fmt = "yaml"
+    if fmt not in ("yaml", "json"):
+        raise ValueError(
+            f"Unsupported file format {fmt!r}, expected one of 'yaml' or 'json'"
+        )
+    return fmt
+
+
+class _YAMLEvents:
+    """Walk a YAML file with the PyYAML event parser."""
+
+    def __init__(self, file):
+        self._loader = yaml.SafeLoader(file)
+
+    def close(self):
+        self._loader.dispose()
+
+    def expect(self, event_type):
+        event = self._loader.get_event()
+        if not isinstance(event, event_type):
+            raise ValueError(
+                f"Expected {event_type.__name__} but got {type(event).__name__} "
+                f"at {event.start_mark}"
+            )
+
+    def start(self):
+        self.expect(StreamStartEvent)
+        self.expect(DocumentStartEvent)
+
+    def begin_mapping(self):
+        self.expect(MappingStartEvent)
+
+    def end_mapping(self) -> bool:
+        if self._loader.check_event(MappingEndEvent):
+            self._loader.get_event()
+            return True
+        return False
+
+    def begin_list(self):
+        self.expect(SequenceStartEvent)
+
+    def end_list(self) -> bool:
+        if self._loader.check_event(SequenceEndEvent):
+            self._loader.get_event()
+            return True
+        return False
+
+    def key(self):
+        return self.value()
+
+    def value(self):
+        # Compose and construct only the next node, not the whole document
+        node = self._loader.compose_node(None, None)
+        return self._loader.construct_document(node)
+
+
+class _JSONEvents:
+    """Walk a JSON file, decoding one value at a time from a bounded buffer."""
+
+    def __init__(self, file):
+        self._file = file
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def close(self):
+        pass
+
+    def _fill(self) -> bool:
+        """Read more data, dropping the consumed part of the buffer."""
+        if self._eof:
+            return False
+        # Grow the read size with the pending data to keep decoding retries linear
+        chunk = self._file.read(max(_JSON_CHUNK_SIZE, len(self._buf) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf) or not self._fill():
+                break
+        return self._buf[self._pos : self._pos + 1]
+
+    def expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but got {found!r} in JSON file")
+        self._pos += 1
+
+    def start(self):
+        pass
+
+    def begin_mapping(self):
+        self.expect("{")
+
+    def end_mapping(self) -> bool:
+        return self._end("}")
+
+    def begin_list(self):
+        self.expect("[")
+
+    def end_list(self) -> bool:
+        return self._end("]")
+
+    def _end(self, char: str) -> bool:
+        found = self._peek()
+        if found == char:
+            self._pos += 1
+            return True
+        if found == ",":
+            self._pos += 1
+        return False
+
+    def key(self):
+        key = self.value()
+        self.expect(":")
+        return key
+
+    def value(self):
+        self._peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer might continue in the next chunk
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+class _LineReader:
+    """Read the one-key BeamLine structure {name: {..., line: [...]}} from a file.
+
+    The BeamLine's name and all properties other than its element list are
+    collected while iterating over the elements.
+    """
+
+    def __init__(self, path, fmt: str = None):
+        self.path = path
+        self.fmt = _get_format(path, fmt)
+        self.name = None
+        self.properties = {}
+
+    def elements(self):
+        """Yield the validated elements of the line, one at a time."""
+        # Elements defined so far, for resolving name references
+        registry = {}
+        with open(self.path, "r") as file:
+            events = _YAMLEvents(file) if self.fmt == "yaml" else _JSONEvents(file)
+            try:
+                events.start()
+                events.begin_mapping()
+                self.name = events.key()
+                events.begin_mapping()
+                while not events.end_mapping():
+                    key = events.key()
+                    if key != "line":
+                        self.properties[key] = events.value()
+                        continue
+                    events.begin_list()
+                    index = 0
+                    while not events.end_list():
+                        try:
+                            element = validate_element(events.value(), registry)
+                        except ValidationError as error:
+                            raise prefix_error_locations(
+                                error, ("line", index)
+                            ) from None
+                        yield element
+                        index += 1
+            finally:
+                events.close()
+
+
+def iter_elements(path, fmt: str = None):
+    """Iterate over the elements of a BeamLine file, validating them one at a time.
+
+    Args:
+        path: Path to a YAML or JSON file that contains a single BeamLine
+        fmt: File format ("yaml" or "json"), deduced from the file extension by default
+
+    Yields:
+        The elements of the BeamLine's line, as BaseElement instances
+    """
+    yield from _LineReader(path, fmt).elements()
+
+
+def load_streaming(path, fmt: str = None):
+    """Load a BeamLine file, validating its elements while they are read.
+
+    Args:
+        path: Path to a YAML or JSON file that contains a single BeamLine
+        fmt: File format ("yaml" or "json"), deduced from the file extension by default
+
+    Returns:
+        The BeamLine, materialized after all of its elements have been read
+    """
+    from pals.kinds import BeamLine
+
+    reader = _LineReader(path, fmt)
+    line = list(reader.elements())
+    return BeamLine(name=reader.name, line=line, **reader.properties)
+
+
+class StreamWriter:
+    """Write a BeamLine to a YAML or JSON file incrementally, one element at a time
+
+    The elements of the top-level line are serialized as they are written and
+    the text is written to the file in chunks of about chunk_size characters,
+    so the whole lattice never has to be held in memory. The file content is
+    the same as that of pals.io.dump for the equivalent BeamLine.
+
+    Repeated elements are written as name references as long as the element
+    instance written first is still alive; elements that were garbage
+    collected in between are written in full again.
+
+    If the with block raises an exception, the document is not finished: a
+    file that was opened from its path is deleted, and a file object is left
+    without the end of the document, so that it cannot be read as a valid
+    (but truncated) lattice.
+
+    Example:
+
+        with StreamWriter("ring.yaml", "ring") as writer:
+            for element in generate_elements():
+                writer.write(element)
+    """
+
+    def __init__(
+        self,
+        file,
+        name: str,
+        fmt: str = None,
+        *,
+        chunk_size: int = _WRITE_CHUNK_SIZE,
+        **properties,
+    ):
+        """Start writing a BeamLine file
+
+        Args:
+            file: Path of the file, or a file object opened in text mode
+            name: Name of the BeamLine
+            fmt: File format ("yaml" or "json"), deduced from the file extension by default
+            chunk_size: Number of characters buffered before they are written
+            **properties: Other properties of the BeamLine, e.g. its parameter groups
+        """
+        if hasattr(file, "write"):
+            self.fmt = _get_format("", fmt)
+            self.file = file
+            self._path = None
+        else:
+            self.fmt = _get_format(file, fmt)
+            self.file = open(file, "w")
+            self._path = file
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+        # Elements written so far, by name, for writing name references
+        self._dumped = weakref.WeakValueDictionary()
+        try:
+            self._write_header(name, properties)
+        except BaseException:
+            self.abort()
+            raise
+
+    def _write_header(self, name: str, properties: dict):
+        """Write the document of the BeamLine up to its elements."""
+        from pals.kinds import BeamLine
+
+        # Split the document of the BeamLine without elements at its empty
+        # element list, which is the last property in the (sorted) output
+        data = BeamLine(name=name, line=[], **properties).model_dump()
+        if self.fmt == "json":
+            empty, start, stop = '"line": []', '"line": [\n', "\n    ]"
+            text = json.dumps(data, sort_keys=True, indent=2)
+        else:
+            empty, start, stop = "line: []\n", "line:\n", ""
+            text = yaml.dump(data, default_flow_style=False)
+        index = text.rindex(empty)
+        self._empty = text[index:]
+        self._start = start
+        self._end = stop + text[index + len(empty) :]
+        self._write(text[:index])
+
+    def write(self, element):
+        """Write one element (or name reference, or repetition) of the line"""
+        data = dump_list_entry(element, self._dumped, exclude_none=True)
+        if self.fmt == "json":
+            text = json.dumps(data, sort_keys=True, indent=2)
+            text = _JSON_INDENT + text.replace("\n", "\n" + _JSON_INDENT)
+            self._write(",\n" + text if self.count else self._start + text)
+        else:
+            # Wrap long lines as they would be wrapped at the final indentation
+            text = yaml.dump(
+                [data], default_flow_style=False, width=80 - len(_YAML_INDENT)
+            )
+            text = _YAML_INDENT + text[:-1].replace("\n", "\n" + _YAML_INDENT) + "\n"
+            self._write(text if self.count else self._start + text)
+        self.count += 1
+
+    def write_elements(self, elements):
+        """Write all elements of an iterable, e.g. a generator"""
+        for element in elements:
+            self.write(element)
+
+    def close(self):
+        """Finish the document and flush it to the file"""
+        if self.file is None:
+            return
+        self._write(self._end if self.count else self._empty)
+        self._flush()
+        if self._path is not None:
+            self.file.close()
+        self.file = None
+
+    def abort(self):
+        """Stop writing without finishing the document, deleting a file opened from its path"""
+        if self.file is None:
+            return
+        self._buffer = []
+        self._buffered = 0
+        if self._path is not None:
+            self.file.close()
+            os.remove(self._path)
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        self.file.write("".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+
+def dump_streaming(line, path, fmt: str = None, **kwargs):
+    """Write a BeamLine file with a StreamWriter, one element of its line at a time.
+
+    Args:
+        line: The BeamLine
+        path: Path of the file, or a file object opened in text mode
+        fmt: File format ("yaml" or "json"), deduced from the file extension by default
+        **kwargs: Further arguments of StreamWriter, like chunk_size
+    """
+    properties = {
+        key: value
+        for key, value in line
+        if key not in ("kind", "name", "line") and value is not None
+    }
+    with StreamWriter(path, line.name, fmt, **kwargs, **properties) as writer:
+        writer.write_elements(line.line)
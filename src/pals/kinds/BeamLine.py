@@ -1,17 +1,21 @@
-from pydantic import model_validator
-from typing import List, Literal
+from pydantic import PrivateAttr, model_validator
+from typing import List, Literal, Optional
 
 from .all_elements import get_all_elements_as_annotation
 from .mixin import BaseElement
+from .mixin.lazy import LazyElementsMixin
 
 
-class BeamLine(BaseElement):
+class BeamLine(LazyElementsMixin, BaseElement):
     """A line of elements and/or other lines"""
 
     kind: Literal["BeamLine"] = "BeamLine"
 
     line: List[get_all_elements_as_annotation()]
 
+    # The entries of a lazy line (see lazy) until validate_all
+    _lazy_elements: Optional[object] = PrivateAttr(default=None)
+
     @model_validator(mode="before")
     @classmethod
     def unpack_json_structure(cls, data):
@@ -20,8 +24,121 @@ class BeamLine(BaseElement):
 
         return unpack_element_list_structure(data, "line", "line")
 
-    def model_dump(self, *args, **kwargs):
-        """Custom model dump for BeamLine to handle element list formatting"""
-        from pals.kinds.mixin.all_element_mixin import dump_element_list
+    @staticmethod
+    def _line_entry(data) -> dict:
+        """Return the one-key dict {name: {"kind": "BeamLine", ...}} of a BeamLine
+
+        The data are a one-key dict {name: {...}} or a dict of the fields with a name.
+        """
+        if isinstance(data, dict) and "name" in data:
+            data = {
+                data["name"]: {
+                    key: value for key, value in data.items() if key != "name"
+                }
+            }
+        if not isinstance(data, dict) or len(data) != 1:
+            raise ValueError(
+                "A lattice must be a dict with exactly one key (the name of its line)"
+            )
+        ((name, fields),) = data.items()
+        if isinstance(fields, dict):
+            fields = {"kind": "BeamLine", **fields}
+        return {name: fields}
+
+    @classmethod
+    def from_trusted(cls, data: dict) -> "BeamLine":
+        """Construct a BeamLine from trusted data, e.g. a file written by PALS, without validation
+
+        This is much faster than BeamLine(**data), but performs no checks at all.
+        """
+        from pals.kinds.mixin.trusted import construct_line
+
+        return construct_line(cls._line_entry(data))
+
+    @classmethod
+    def lazy(cls, data: dict) -> "BeamLine":
+        """Construct a BeamLine whose elements are validated on first access
+
+        Only name references are resolved up front, so this is much faster than
+        BeamLine(**data) for large lines of which only a few elements are used.
+        The elements are accessed through lazy_elements(). Any other use of the
+        line field, e.g. serialization or comparison, validates all of them first.
+        """
+        from pals.kinds.mixin.lazy import lazy_line
+
+        return lazy_line(cls._line_entry(data))
+
+    @classmethod
+    def validate_parallel(cls, data: dict, workers: int = None) -> "BeamLine":
+        """Validate a BeamLine in a pool of worker processes, by default one per CPU
+
+        The result is the same as of BeamLine(**data). This pays off for large
+        lattices on machines with many cores.
+        """
+        from pals.kinds.mixin.parallel import validate_parallel
+
+        return validate_parallel(cls._line_entry(data), workers)
+
+    def lazy_elements(self):
+        """Return the elements of a lazy BeamLine (see lazy), validated on first access
+
+        Unlike the line field, this does not validate all elements of a lazy
+        BeamLine. For other BeamLines, this returns the line field.
+        """
+        from pals.kinds.mixin.lazy import lazy_elements
+
+        return lazy_elements(self)
+
+    def validate_all(self) -> "BeamLine":
+        """Validate all elements of a lazy BeamLine (see lazy) and put them into its line field"""
+        from pals.kinds.mixin.lazy import validate_all
+
+        return validate_all(self)
+
+    @classmethod
+    def from_json_bytes(cls, data) -> "BeamLine":
+        """Validate a BeamLine from a JSON document (bytes or str), parsed by pydantic-core"""
+        return cls.model_validate_json(data)
+
+    def to_json_bytes(self, backend: str = None) -> bytes:
+        """Serialize to a compact JSON document, without building the intermediate dict tree
+
+        The optional backend "orjson" encodes the model_dump output with orjson instead.
+        """
+        from pals.kinds.mixin.all_element_mixin import dump_element_json
+
+        return dump_element_json(self, backend)
+
+    def expand(self):
+        """Return a lazy, flattened view of all elements in the line"""
+        from pals.lattice import ExpandedLine
+
+        return ExpandedLine(self)
+
+    @property
+    def s_positions(self):
+        """Positions of all element boundaries of the expanded line in meters (m)
+
+        This is a cached prefix sum over the element lengths, starting at 0.
+        """
+        from pals.lattice import get_position_index
+
+        return get_position_index(self).positions
+
+    def element_at(self, s: float):
+        """Return the element at a position s in meters (m), using a binary search"""
+        from pals.lattice import get_position_index
+
+        return get_position_index(self).element_at(s)
+
+    def slice(self, s0: float, s1: float) -> list:
+        """Return all elements between the positions s0 and s1 in meters (m)"""
+        from pals.lattice import get_position_index
+
+        return get_position_index(self).slice(s0, s1)
+
+    def to_table(self):
+        """Return a flattened, array-backed view of all elements in the line"""
+        from pals.lattice import FlatLattice
 
-        return dump_element_list(self, "line", *args, **kwargs)
+        return FlatLattice(self)
@@ -0,0 +1,42 @@
+from annotated_types import Ge
+from pydantic import model_validator
+from typing import Annotated, Literal
+
+from .all_elements import get_all_elements_as_annotation
+from .mixin import BaseElement
+
+
+class RepeatedLine(BaseElement):
+    """A line (or element) repeated a number of times, optionally reversed
+
+    In a line, a repetition is written as e.g. {"repeat": 200, "line": "fodo_cell"}
+    or {"reverse": true, "line": "fodo_cell"}, where "line" is the name of an
+    element defined earlier or an inline element definition.
+    The repetition is stored compactly and only expanded lazily, see expand().
+    """
+
+    # Discriminator field
+    kind: Literal["RepeatedLine"] = "RepeatedLine"
+
+    # The repeated line or element, shared by all repetitions
+    line: get_all_elements_as_annotation()
+
+    # Number of repetitions
+    repeat: Annotated[int, Ge(1)] = 1
+
+    # Whether the order of the elements in the line is reversed
+    reverse: bool = False
+
+    @model_validator(mode="before")
+    @classmethod
+    def unpack_json_structure(cls, data):
+        """Deserialize the JSON/YAML/...-like dict for the repeated line"""
+        from pals.kinds.mixin.all_element_mixin import unpack_repetition
+
+        return unpack_repetition(data)
+
+    def expand(self):
+        """Return a lazy, flattened view of all elements in the repetition"""
+        from pals.lattice import ExpandedLine
+
+        return ExpandedLine(self)
@@ -1,11 +1,12 @@
-from pydantic import model_validator  # noqa
-from typing import List, Literal
+from pydantic import PrivateAttr, model_validator  # noqa
+from typing import List, Literal, Optional
 
 from .all_elements import get_all_elements_as_annotation
 from .mixin import BaseElement
+from .mixin.lazy import LazyElementsMixin
 
 
-class UnionEle(BaseElement):
+class UnionEle(LazyElementsMixin, BaseElement):
     """Union element for overlapping elements"""
 
     # Discriminator field
@@ -14,6 +15,9 @@ class UnionEle(BaseElement):
     # Elements in the union - uses the same union type as BeamLine
     elements: List[get_all_elements_as_annotation()] = []
 
+    # The entries of a lazy union (see BeamLine.lazy) until validate_all
+    _lazy_elements: Optional[object] = PrivateAttr(default=None)
+
     @model_validator(mode="before")
     @classmethod
     def unpack_json_structure(cls, data):
@@ -22,8 +26,8 @@ class UnionEle(BaseElement):
 
         return unpack_element_list_structure(data, "elements", "union")
 
-    def model_dump(self, *args, **kwargs):
-        """Custom model dump for UnionEle to handle element list formatting"""
-        from pals.kinds.mixin.all_element_mixin import dump_element_list
+    def lazy_elements(self):
+        """Return the elements of a lazy union (see BeamLine.lazy), validated on first access"""
+        from pals.kinds.mixin.lazy import lazy_elements
 
-        return dump_element_list(self, "elements", *args, **kwargs)
+        return lazy_elements(self)
@@ -27,6 +27,7 @@ from .Octupole import Octupole  # noqa: F401
 from .Patch import Patch  # noqa: F401
 from .Quadrupole import Quadrupole  # noqa: F401
 from .RBend import RBend  # noqa: F401
+from .RepeatedLine import RepeatedLine  # noqa: F401
 from .RFCavity import RFCavity  # noqa: F401
 from .SBend import SBend  # noqa: F401
 from .Sextupole import Sextupole  # noqa: F401
@@ -35,7 +36,5 @@ from .Taylor import Taylor  # noqa: F401
 from .UnionEle import UnionEle  # noqa: F401
 from .Wiggler import Wiggler  # noqa: F401
 
-
-# Rebuild pydantic models that depend on other classes
-UnionEle.model_rebuild()
-BeamLine.model_rebuild()
+from .all_elements import register_kind, unregister_kind  # noqa: F401
+from .mixin.interning import intern_parameters, shared_group  # noqa: F401
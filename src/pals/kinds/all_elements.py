@@ -1,12 +1,22 @@
-"""Helper module to define the union of all allowed element types.
+"""Registry of the element kinds that are allowed in element lists.
 
-This module creates a helper function that returns the element union type,
-avoiding duplication between BeamLine.line and UnionEle.elements.
+Element lists, like BeamLine.line and UnionEle.elements, accept elements of
+all registered kinds. Their entries are validated by looking up the class of
+their "kind" in the registry, instead of through a discriminated union of
+all element types: the element models do not embed such a union, so their
+schemas are built once, and new kinds can be registered with register_kind
+without rebuilding any models.
 """
 
+from contextvars import ContextVar
+from functools import lru_cache
 from typing import Annotated, Union
 
-from pydantic import Field
+from pydantic import Field, TypeAdapter, ValidationError
+from pydantic_core import core_schema
+
+from .mixin import BaseElement
+from .mixin.all_element_mixin import prefix_error_locations
 
 from .ACKicker import ACKicker
 from .BeamBeam import BeamBeam
@@ -45,6 +55,7 @@ def get_all_element_types(extra_types: tuple = None):
     element_types = (
         "BeamLine",  # Forward reference to handle circular import
         "UnionEle",  # Forward reference to handle circular import
+        "RepeatedLine",  # Forward reference to handle circular import
         ACKicker,
         BeamBeam,
         BeginningEle,
@@ -82,6 +93,175 @@ def get_all_element_types(extra_types: tuple = None):
 
 
 def get_all_elements_as_annotation(extra_types: tuple = None):
-    """Return the Union type of all allowed elements with their name as the discriminator field."""
-    types = get_all_element_types(extra_types)
-    return Annotated[Union[types], Field(discriminator="kind")]
+    """Return the annotation of fields that hold an element of any registered kind.
+
+    Element types in extra_types are registered (see register_kind).
+    """
+    for cls in extra_types or ():
+        register_kind(cls)
+    return AnyElement
+
+
+@lru_cache(maxsize=None)
+def get_resolved_element_types() -> tuple:
+    """Return all element types, with the forward references resolved to their classes."""
+    from .BeamLine import BeamLine
+    from .RepeatedLine import RepeatedLine
+    from .UnionEle import UnionEle
+
+    return (BeamLine, UnionEle, RepeatedLine) + get_all_element_types()[3:]
+
+
+# Element classes by the value of their kind discriminator, see register_kind
+_element_classes = {}
+
+
+def _get_kind(cls) -> str:
+    """Return the value of the kind discriminator of an element class."""
+    return cls.model_fields["kind"].default
+
+
+def get_element_classes() -> dict:
+    """Return all registered element types by the value of their kind discriminator."""
+    if not _element_classes:
+        for cls in get_resolved_element_types():
+            _element_classes[_get_kind(cls)] = cls
+    return _element_classes
+
+
+def register_kind(cls):
+    """Register an element type, so that element lists accept elements of its kind.
+
+    This can also be used as a class decorator. Registering a type again is
+    a no-op, while registering another type with the same kind is an error.
+
+    Returns:
+        The element type
+    """
+    if not (isinstance(cls, type) and issubclass(cls, BaseElement)):
+        raise TypeError(f"Element kinds must subclass BaseElement, but we got {cls!r}")
+    kind = _get_kind(cls)
+    if not isinstance(kind, str) or kind == "BaseElement":
+        raise ValueError(f"Element type {cls.__name__} needs its own kind")
+    classes = get_element_classes()
+    if classes.setdefault(kind, cls) is not cls:
+        raise ValueError(
+            f"Element kind {kind!r} is already registered for {classes[kind].__name__}"
+        )
+    get_element_type_adapter.cache_clear()
+    return cls
+
+
+def unregister_kind(cls):
+    """Remove an element type that was registered with register_kind.
+
+    Built-in element types cannot be removed. Removing a type that is not
+    registered is a no-op.
+    """
+    if cls in get_resolved_element_types():
+        raise ValueError(f"Built-in element type {cls.__name__} cannot be removed")
+    classes = get_element_classes()
+    kind = _get_kind(cls)
+    if classes.get(kind) is cls:
+        del classes[kind]
+        get_element_type_adapter.cache_clear()
+
+
+def _kind_error(value) -> ValidationError:
+    """Return the validation error of an element without a registered kind."""
+    kind = (
+        value.get("kind") if isinstance(value, dict) else getattr(value, "kind", None)
+    )
+    if kind is None:
+        line_error = {
+            "type": "union_tag_not_found",
+            "loc": (),
+            "input": value,
+            "ctx": {"discriminator": "'kind'"},
+        }
+    else:
+        line_error = {
+            "type": "union_tag_invalid",
+            "loc": (),
+            "input": value,
+            "ctx": {
+                "discriminator": "'kind'",
+                "tag": str(kind),
+                "expected_tags": ", ".join(
+                    f"'{kind}'" for kind in get_element_classes()
+                ),
+            },
+        }
+    return ValidationError.from_exception_data("Element", [line_error])
+
+
+def validate_element_fields(fields: dict) -> BaseElement:
+    """Validate the properties of an element (including its name) by the class of its kind."""
+    cls = (
+        get_element_classes().get(fields.get("kind"))
+        if isinstance(fields, dict)
+        else None
+    )
+    if cls is None:
+        raise _kind_error(fields)
+    try:
+        return cls.__pydantic_validator__.validate_python(fields)
+    except ValidationError as error:
+        raise prefix_error_locations(error, (fields["kind"],)) from None
+
+
+def _validate_any_element(value) -> BaseElement:
+    if isinstance(value, BaseElement):
+        cls = get_element_classes().get(value.kind)
+        if cls is None or not isinstance(value, cls):
+            raise _kind_error(value)
+        return value
+    return validate_element_fields(value)
+
+
+class AnyElement:
+    """Annotation of fields that hold an element of any registered kind"""
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_plain_validator_function(_validate_any_element)
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        # The JSON schema is the discriminated union of all registered kinds.
+        # Nested element fields refer to the definitions of the outermost one.
+        if _generating_json_schema.get():
+            return handler(_element_references_schema())
+        token = _generating_json_schema.set(True)
+        try:
+            return handler(get_element_type_adapter().core_schema)
+        finally:
+            _generating_json_schema.reset(token)
+
+
+# Whether the JSON schema of an element field is being generated
+_generating_json_schema = ContextVar("pals_generating_json_schema", default=False)
+
+
+def _element_references_schema():
+    """Return a core schema of the discriminated union of references to all registered kinds."""
+    choices = {}
+    for kind, cls in get_element_classes().items():
+        schema = cls.__pydantic_core_schema__
+        if schema["type"] == "definitions":
+            schema = schema["schema"]
+        choices[kind] = core_schema.definition_reference_schema(
+            schema.get("ref") or schema["schema_ref"]
+        )
+    return core_schema.tagged_union_schema(choices, "kind")
+
+
+@lru_cache(maxsize=None)
+def get_element_type_adapter():
+    """Return a cached TypeAdapter of the discriminated union of all registered kinds.
+
+    This is used for the JSON schema of the elements, while validation
+    dispatches directly on the kind.
+    """
+    types = tuple(get_element_classes().values())
+    return TypeAdapter(Annotated[Union[types], Field(discriminator="kind")])
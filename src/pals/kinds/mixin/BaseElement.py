@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+import weakref
+
+from pydantic import BaseModel, model_validator
 from typing import Literal, Optional
 
 from pals.parameters import (
@@ -11,6 +13,36 @@ from pals.parameters import (
     TrackingParameters,
 )
 
+from .interning import bind_shared_groups
+
+# Fields whose assignment changes the lengths or the order of elements in a lattice
+_GEOMETRY_FIELDS = frozenset(("length", "line", "elements", "repeat", "reverse"))
+
+# Caches that depend on the geometry of an element, like position indices, by id
+# of the element. They are invalidated when a geometry field of the element is assigned.
+_geometry_watchers = {}
+
+
+def watch_geometry(elements, watcher):
+    """Call watcher.invalidate() when a geometry field of one of the elements is assigned.
+
+    The watcher is referenced weakly, and stops watching when it is garbage collected.
+    """
+    keys = [id(element) for element in elements]
+    ref = weakref.ref(watcher)
+    for key in keys:
+        _geometry_watchers.setdefault(key, {})[id(watcher)] = ref
+    weakref.finalize(watcher, _unwatch_geometry, keys, id(watcher))
+
+
+def _unwatch_geometry(keys, watcher_id):
+    for key in keys:
+        watchers = _geometry_watchers.get(key)
+        if watchers is not None:
+            watchers.pop(watcher_id, None)
+            if not watchers:
+                del _geometry_watchers[key]
+
 
 class BaseElement(BaseModel, validate_assignment=True):
     """A custom base element defining common properties"""
@@ -30,16 +62,32 @@ class BaseElement(BaseModel, validate_assignment=True):
     ReferenceChangeP: Optional[ReferenceChangeParameters] = None
     TrackingP: Optional[TrackingParameters] = None
 
+    def __setattr__(self, name, value):
+        """Assign (and validate) a field, invalidating the caches of its geometry"""
+        super().__setattr__(name, value)
+        if name in _GEOMETRY_FIELDS:
+            watchers = _geometry_watchers.get(id(self))
+            if watchers:
+                for ref in list(watchers.values()):
+                    watcher = ref()
+                    if watcher is not None:
+                        watcher.invalidate()
+
+    @model_validator(mode="after")
+    def _bind_shared_groups(self):
+        """Let shared parameter groups taken from other elements copy on write for this one"""
+        bind_shared_groups(self)
+        return self
+
+    def __copy__(self):
+        copied = super().__copy__()
+        bind_shared_groups(copied)
+        return copied
+
     def model_dump(self, *args, **kwargs):
         """This makes sure the element name property is moved out and up to a one-key dictionary"""
+        from pals.kinds.mixin.all_element_mixin import dump_element
+
         # Exclude None values from serialization
         kwargs.setdefault("exclude_none", True)
-        elem_dict = super().model_dump(*args, **kwargs)
-        name = elem_dict.pop("name", None)
-        if name is None:
-            raise ValueError("Element missing 'name' attribute")
-        # Return a dict {name: properties} rather than a single-item list
-        # This makes the serialized form a plain dict so it can be passed to
-        # constructors using keyword expansion (e.g., Model(**data))
-        data = {name: elem_dict}
-        return data
+        return dump_element(self, *args, **kwargs)
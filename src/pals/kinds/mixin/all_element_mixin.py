@@ -2,9 +2,28 @@
 
 This provides common YAML/JSON/... unpacking and model dumping logic for
 BeamLine and UnionEle classes.
+
+Elements in a list can also be plain name strings that refer to an element
+defined earlier in the same lattice. All nested element lists of a lattice
+share one element registry, and references resolve to the very same (shared)
+element instance instead of a copy. When dumping, elements that have already
+been written are emitted as such name references again.
 """
 
+import io
+from contextvars import ContextVar
+
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_json
+
 from . import BaseElement
+from ..utils import paused_gc
+
+# Elements defined so far in the lattice being validated, by name
+_element_registry = ContextVar("pals_element_registry", default=None)
+
+# Fields that hold the element lists of containers, by kind
+ELEMENT_LIST_FIELDS = {"BeamLine": "line", "UnionEle": "elements"}
 
 
 def unpack_element_list_structure(
@@ -39,68 +58,286 @@ def unpack_element_list_structure(
     if not isinstance(data[field_name], list):
         raise TypeError(f"'{field_name}' must be a list")
 
-    new_list = []
+    # Nested element lists share the registry of the outermost list
+    registry = _element_registry.get()
+    if registry is None:
+        registry = {}
+
     # Loop over all elements in the list
-    for item in data[field_name]:
-        # An element can be a string that refers to another element
-        if isinstance(item, str):
-            raise RuntimeError("Reference/alias elements not yet implemented")
-        # An element can be a dict
-        elif isinstance(item, dict):
-            if not (len(item) == 1):
-                raise ValueError(
-                    f"Each element must be a dict with exactly one key (the element's name), "
-                    f"but we got {item!r}"
-                )
-            name, fields = list(item.items())[0]
-            if not isinstance(fields, dict):
-                raise TypeError(
-                    f"Value for element key {name!r} must be a dict (the element's properties), "
-                    f"but we got {fields!r}"
-                )
-            fields["name"] = name
-            new_list.append(fields)
-        # An element can be an instance of an existing model
-        else:
-            # Try to check if it's a BaseElement instance
-            if isinstance(item, BaseElement):
-                # Nothing to do, keep the element as is
-                new_list.append(item)
-                continue
+    new_list = []
+    for index, item in enumerate(data[field_name]):
+        try:
+            new_list.append(validate_element(item, registry))
+        except ValidationError as error:
+            raise prefix_error_locations(error, (field_name, index)) from None
+
+    data[field_name] = new_list
+    return data
+
+
+def validate_element(item, registry: dict):
+    """Validate a single list entry of an element list into an element instance.
+
+    Args:
+        item: A one-key dict {name: properties}, an existing element instance,
+              the name of an element defined earlier in the lattice, or a
+              repetition dict like {"repeat": 10, "line": "cell"}
+        registry: The lattice's element registry, by name, which is updated with
+                  newly defined elements
+
+    Returns:
+        The element instance, shared with earlier entries for name references
+    """
+    from pals.kinds.all_elements import validate_element_fields
+    from pals.kinds.RepeatedLine import RepeatedLine
+
+    # An element can be a string that refers to another element
+    if isinstance(item, str):
+        if item not in registry:
+            raise ValueError(f"Reference to undefined element {item!r}")
+        return registry[item]
+
+    # An element can be a repetition of another element
+    if is_repetition(item):
+        fields = {"kind": "RepeatedLine", **item}
+    else:
+        fields = unpack_element(item)
+
+    if isinstance(fields, BaseElement):
+        element = fields
+    else:
+        # Nested element lists are validated with the same registry
+        token = _element_registry.set(registry)
+        try:
+            element = validate_element_fields(fields)
+        finally:
+            _element_registry.reset(token)
+
+    # Repetitions are anonymous and cannot be referenced
+    if not isinstance(element, RepeatedLine):
+        registry[element.name] = element
+    return element
+
+
+def is_repetition(item) -> bool:
+    """Return whether a list entry is a repetition dict like {"repeat": 10, "line": "cell"}."""
+    return isinstance(item, dict) and len(item) > 1 and "line" in item
+
+
+def unpack_repetition(data):
+    """Deserialize the JSON/YAML/...-like dict for repetitions of a line.
+
+    Args:
+        data: The input data dictionary
+
+    Returns:
+        Modified data dictionary with the repeated line resolved to an element instance
+    """
+    if not isinstance(data, dict) or "line" not in data:
+        return data
+
+    # The repeated line is resolved with the registry of the enclosing lattice
+    registry = _element_registry.get()
+    if registry is None:
+        registry = {}
+
+    data = dict(data)
+    try:
+        data["line"] = validate_element(data["line"], registry)
+    except ValidationError as error:
+        raise prefix_error_locations(error, ("line",)) from None
+    # A repetition is named after the repeated line by default
+    data.setdefault("name", data["line"].name)
+    return data
+
+
+def prefix_error_locations(error: ValidationError, prefix: tuple) -> ValidationError:
+    """Return a copy of a validation error with all error locations prefixed."""
+    line_errors = []
+    for details in error.errors():
+        line_error = {
+            "type": details["type"],
+            "loc": prefix + details["loc"],
+            "input": details["input"],
+        }
+        if "ctx" in details:
+            line_error["ctx"] = details["ctx"]
+        line_errors.append(line_error)
+    return ValidationError.from_exception_data(error.title, line_errors)
+
 
+def unpack_element(item):
+    """Deserialize a single JSON/YAML/...-like element definition of an element list.
+
+    Args:
+        item: A one-key dict {name: properties} or an existing element instance
+
+    Returns:
+        The element's properties dict (including its name) or the element instance as is
+    """
+    # An element can be a dict
+    if isinstance(item, dict):
+        if not (len(item) == 1):
+            raise ValueError(
+                f"Each element must be a dict with exactly one key (the element's name), "
+                f"but we got {item!r}"
+            )
+        name, fields = list(item.items())[0]
+        if not isinstance(fields, dict):
             raise TypeError(
-                f"Value must be a reference string or a dict, but we got {item!r}"
+                f"Value for element key {name!r} must be a dict (the element's properties), "
+                f"but we got {fields!r}"
             )
+        fields["name"] = name
+        return fields
+    # An element can be an instance of an existing model
+    elif isinstance(item, BaseElement):
+        # Nothing to do, keep the element as is
+        return item
 
-    data[field_name] = new_list
-    return data
+    raise TypeError(f"Value must be a reference string or a dict, but we got {item!r}")
 
 
-def dump_element_list(self, field_name: str, *args, **kwargs) -> dict:
-    """Serialize to JSON/YAML/... via a custom pydantic model dump for element lists.
+def dump_element(elem, *args, **kwargs):
+    """Serialize an element, and all elements it contains, to JSON/YAML/...-like data.
 
-    This makes sure the element name property is moved out and up to a one-key dictionary.
+    The element tree is serialized in a single traversal: pydantic dumps the
+    fields of each element except its element list, which is filled in with
+    the serialized elements. The first occurrence of an element is written as
+    its one-key dict {name: properties}, while later occurrences of the same
+    instance are written as name references. Repetitions are written as e.g.
+    {"repeat": 10, "line": "cell"}.
+
+    The garbage collector is paused meanwhile (see paused_gc).
 
     Args:
-        self: The model instance
-        field_name: Name of the field containing the element list (e.g., "line" or "elements")
+        elem: The element instance
         *args: Positional arguments for model_dump
         **kwargs: Keyword arguments for model_dump
 
     Returns:
-        Serialized data dictionary
+        The element's one-key dict, or the repetition dict
     """
-    # Use base element dump first and return a dict {key: value}, where 'key'
-    # is the name of the container and 'value' is a dict with all other properties
-    data = super(type(self), self).model_dump(*args, **kwargs)
+    with paused_gc():
+        return dump_list_entry(elem, {}, *args, **kwargs)
 
-    # Reformat field as a list of element dicts
-    new_list = []
-    element_list = getattr(self, field_name)
-    for elem in element_list:
-        # Use a custom dump for each element, which now returns a dict
-        elem_dict = elem.model_dump(**kwargs)
-        new_list.append(elem_dict)
 
-    data[self.name][field_name] = new_list
-    return data
+def dump_list_entry(elem, dumped: dict, *args, **kwargs):
+    """Serialize a single entry of an element list.
+
+    Args:
+        elem: The element instance
+        dumped: The elements already written, by name, which is updated with
+                the newly written elements
+        *args: Positional arguments for model_dump
+        **kwargs: Keyword arguments for model_dump
+
+    Returns:
+        The element's one-key dict, its name, or the repetition dict
+    """
+    kind = elem.kind
+
+    # Repetitions are anonymous and always written in full
+    if kind == "RepeatedLine":
+        data = {
+            "repeat": elem.repeat,
+            "line": dump_list_entry(elem.line, dumped, *args, **kwargs),
+        }
+        if elem.reverse:
+            data["reverse"] = True
+        return data
+
+    if dumped.get(elem.name) is elem:
+        return elem.name
+    dumped[elem.name] = elem
+
+    list_field = ELEMENT_LIST_FIELDS.get(kind)
+    if list_field is None:
+        data = BaseModel.model_dump(elem, *args, **kwargs)
+    else:
+        exclude = kwargs.get("exclude")
+        if exclude is None:
+            exclude = {list_field}
+        elif isinstance(exclude, dict):
+            exclude = {**exclude, list_field: True}
+        else:
+            exclude = {*exclude, list_field}
+        data = BaseModel.model_dump(elem, *args, **{**kwargs, "exclude": exclude})
+        data[list_field] = [
+            dump_list_entry(item, dumped, *args, **kwargs)
+            for item in getattr(elem, list_field)
+        ]
+
+    name = data.pop("name", None)
+    if name is None:
+        raise ValueError("Element missing 'name' attribute")
+    # Return a dict {name: properties} rather than a single-item list
+    # This makes the serialized form a plain dict so it can be passed to
+    # constructors using keyword expansion (e.g., Model(**data))
+    return {name: data}
+
+
+def dump_element_json(elem, backend: str = None) -> bytes:
+    """Serialize an element, and all elements it contains, straight to compact JSON bytes.
+
+    The layout is the same as that of dump_element. With the default backend
+    "pydantic", pydantic-core serializes the fields of each element directly
+    to JSON and the fragments are joined, without building the intermediate
+    dict tree of the whole lattice. The "orjson" backend (if installed)
+    encodes the dumped dict tree with orjson instead.
+
+    Args:
+        elem: The element instance
+        backend: "pydantic" (default) or "orjson"
+
+    Returns:
+        The UTF-8 encoded JSON document
+    """
+    if backend is None or backend == "pydantic":
+        buffer = io.BytesIO()
+        _dump_element_json(elem, {}, buffer.write)
+        return buffer.getvalue()
+    if backend == "orjson":
+        import orjson
+
+        return orjson.dumps(dump_element(elem, exclude_none=True))
+    raise ValueError(
+        f"Unsupported JSON backend {backend!r}, expected one of 'pydantic' or 'orjson'"
+    )
+
+
+def _dump_element_json(elem, dumped: dict, write):
+    """Write the JSON fragments of an element, given the elements already written by name."""
+    kind = elem.kind
+
+    # Repetitions are anonymous and always written in full
+    if kind == "RepeatedLine":
+        write(b'{"repeat":%d,"line":' % elem.repeat)
+        _dump_element_json(elem.line, dumped, write)
+        write(b',"reverse":true}' if elem.reverse else b"}")
+        return
+
+    name = to_json(elem.name)
+    if dumped.get(elem.name) is elem:
+        write(name)
+        return
+    dumped[elem.name] = elem
+
+    list_field = ELEMENT_LIST_FIELDS.get(kind)
+    exclude = {"name"} if list_field is None else {"name", list_field}
+    fields = elem.__pydantic_serializer__.to_json(
+        elem, exclude=exclude, exclude_none=True
+    )
+    write(b"{" + name + b":")
+    if list_field is None:
+        write(fields)
+    else:
+        # The fields include at least the kind, so the element list is
+        # inserted before the closing brace
+        write(fields[:-1] + b',"' + list_field.encode() + b'":[')
+        for index, item in enumerate(getattr(elem, list_field)):
+            if index:
+                write(b",")
+            _dump_element_json(item, dumped, write)
+        write(b"]}")
+    write(b"}")
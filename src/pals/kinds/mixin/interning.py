@@ -0,0 +1,253 @@
+"""Sharing of equal parameter groups between elements.
+
+Periodic lattices repeat the same parameter groups, like apertures or bend
+parameters, in thousands of elements. intern_parameters replaces equal
+parameter groups of the elements of a line by one shared instance each.
+
+Parameter groups stay mutable, also when they are shared: an element reads
+a shared group through a light handle, and the first assignment through it,
+e.g. element.ApertureP.thickness = 0.01, gives the element a private copy of
+the group before writing (copy-on-write). Other elements keep the shared
+group. The shared instances themselves cannot be changed.
+"""
+
+from functools import lru_cache
+from typing import ClassVar
+
+
+class _FrozenList(list):
+    """Immutable list, e.g. the limits of a shared aperture group"""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(
+            "Shared parameter groups cannot be changed in place, "
+            "assign the field through an element instead"
+        )
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return list(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _freeze(value):
+    return _FrozenList(value) if isinstance(value, list) else value
+
+
+def _thaw(value):
+    return list(value) if isinstance(value, _FrozenList) else value
+
+
+class SharedGroup:
+    """Mixin of the handles of shared parameter groups
+
+    A handle shares the data of the shared group. _owner and _field are the
+    element and the field that the handle was read from (None for the shared
+    group itself), and _shared is the shared group (None once the handle was
+    written to: _owner is the private copy of the element then).
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value):
+        """Assign a field, copying the shared group for the element first"""
+        owner = self._owner
+        if self._shared is None:
+            setattr(owner, name, value)
+            return
+        if owner is None:
+            raise TypeError(
+                f"Shared {type(self).__name__} groups cannot be changed, "
+                "assign the field through an element instead"
+            )
+        group = _private_copy(self)
+        setattr(group, name, value)
+        setattr(owner, self._field, group)
+        # Later writes through this handle go to the private copy
+        _share_data(self, group)
+        object.__setattr__(self, "_owner", group)
+        object.__setattr__(self, "_shared", None)
+
+    def __delattr__(self, name: str):
+        raise TypeError(f"Cannot delete {name} of a shared parameter group")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, self._group_class):
+            return NotImplemented
+        return dict(self) == dict(other)
+
+    __hash__ = None
+
+    def __copy__(self):
+        return _private_copy(self)
+
+    def __deepcopy__(self, memo=None):
+        return _private_copy(self).__deepcopy__(memo)
+
+    def __reduce_ex__(self, protocol):
+        return _new_group, (self._group_class,), _private_copy(self).__getstate__()
+
+
+@lru_cache(maxsize=None)
+def _shared_class(cls) -> type:
+    """Return the class of the shared groups (and their handles) of a group class."""
+    return type(
+        cls.__name__,
+        (SharedGroup, cls),
+        {
+            "__module__": cls.__module__,
+            "__qualname__": cls.__qualname__,
+            "__slots__": ("_owner", "_field", "_shared"),
+            "__annotations__": {"_group_class": ClassVar[type]},
+            "_group_class": cls,
+        },
+    )
+
+
+def _share_data(target, group):
+    """Make target use the data of group (not a copy)."""
+    for name in (
+        "__dict__",
+        "__pydantic_fields_set__",
+        "__pydantic_extra__",
+        "__pydantic_private__",
+    ):
+        object.__setattr__(target, name, getattr(group, name))
+
+
+def _new_group(cls):
+    """Return an uninitialized (unshared) parameter group, e.g. to unpickle."""
+    return cls.__new__(cls)
+
+
+def _private_copy(handle):
+    """Return a mutable, unshared copy of a shared group (or handle)."""
+    group = _new_group(handle._group_class)
+    extra = handle.__pydantic_extra__
+    private = handle.__pydantic_private__
+    object.__setattr__(
+        group, "__dict__", {key: _thaw(value) for key, value in handle.__dict__.items()}
+    )
+    object.__setattr__(
+        group, "__pydantic_fields_set__", set(handle.__pydantic_fields_set__)
+    )
+    object.__setattr__(
+        group, "__pydantic_extra__", None if extra is None else dict(extra)
+    )
+    object.__setattr__(
+        group, "__pydantic_private__", None if private is None else dict(private)
+    )
+    return group
+
+
+def _handle(shared, owner, field: str):
+    """Return a handle of a shared group for a field of an element."""
+    cls = type(shared)
+    handle = cls.__new__(cls)
+    _share_data(handle, shared)
+    object.__setattr__(handle, "_owner", owner)
+    object.__setattr__(handle, "_field", field)
+    object.__setattr__(handle, "_shared", shared)
+    return handle
+
+
+def _share(group):
+    """Return a new shared (immutable) group equal to a parameter group."""
+    if isinstance(group, SharedGroup):
+        group = _private_copy(group)
+    cls = _shared_class(type(group))
+    shared = cls.__new__(cls)
+    _share_data(shared, group)
+    object.__setattr__(
+        shared,
+        "__dict__",
+        {key: _freeze(value) for key, value in group.__dict__.items()},
+    )
+    object.__setattr__(shared, "_owner", None)
+    object.__setattr__(shared, "_field", None)
+    object.__setattr__(shared, "_shared", shared)
+    return shared
+
+
+def shared_group(group):
+    """Return the shared instance behind a parameter group of an element.
+
+    Returns None if the group is not shared, e.g. because intern_parameters
+    was not called or because the group was written to since.
+    """
+    return group._shared if isinstance(group, SharedGroup) else None
+
+
+def bind_shared_groups(elem):
+    """Rebind the handles of shared groups that were assigned to another element."""
+    values = elem.__dict__
+    for name, value in values.items():
+        if isinstance(value, SharedGroup) and value._owner is not elem:
+            if value._shared is None:
+                # A handle that was written to is the private group of its element
+                values[name] = value._owner
+            else:
+                values[name] = _handle(value._shared, elem, name)
+
+
+@lru_cache(maxsize=None)
+def _group_fields(cls) -> tuple:
+    """Return the names of the parameter group fields of an element class."""
+    from .trusted import _model_fields
+
+    return tuple(_model_fields(cls))
+
+
+def _group_key(group) -> tuple:
+    """Return a key that is equal for equal parameter groups."""
+    cls = group._group_class if isinstance(group, SharedGroup) else type(group)
+    return cls, group.model_dump_json()
+
+
+def intern_parameters(line, pool: dict = None):
+    """Share equal parameter groups between all elements of a line.
+
+    Args:
+        line: The BeamLine (or any element), whose elements are changed in place
+        pool: Shared groups by key, to share groups between several lines
+
+    Returns:
+        The line
+    """
+    from .all_element_mixin import ELEMENT_LIST_FIELDS
+
+    pool = {} if pool is None else pool
+    seen = set()
+    stack = [line]
+    while stack:
+        elem = stack.pop()
+        if id(elem) in seen:
+            continue
+        seen.add(id(elem))
+        values = elem.__dict__
+        for name in _group_fields(type(elem)):
+            group = values.get(name)
+            if group is not None:
+                key = _group_key(group)
+                shared = pool.get(key)
+                if shared is None:
+                    shared = pool[key] = _share(group)
+                # Assigning would validate, and so copy, the handle
+                values[name] = _handle(shared, elem, name)
+        if elem.kind == "RepeatedLine":
+            stack.append(values["line"])
+        else:
+            list_field = ELEMENT_LIST_FIELDS.get(elem.kind)
+            if list_field is not None:
+                # The elements of lazy lines are validated first
+                stack.extend(getattr(elem, list_field))
+    return line
@@ -0,0 +1,358 @@
+"""Lazy validation of element lists, for lattices of which only a few elements are used.
+
+BeamLine.lazy(data) does not validate the elements of the line. Instead, the
+raw element definitions are held by a separate view, BeamLine.lazy_elements(),
+and each entry is validated into its typed model when it is accessed through
+the view for the first time, e.g. by line.lazy_elements()[10] or by iterating
+over it. Nested lines and unions are lazy as well.
+
+The element list fields (e.g. line.line) are only set once they are used:
+reading them, e.g. for serialization, comparisons or positions, as well as
+assigning other fields, copying and pickling validate all remaining entries
+first, like BeamLine.validate_all() does (see LazyElementsMixin).
+
+Name references are resolved when the line is created, by a quick scan of
+the raw data, so that all references to an element still share the same
+instance. Undefined references and malformed entries raise a ValidationError
+then, other invalid entries when they are accessed.
+"""
+
+from pydantic import ValidationError
+
+from . import BaseElement
+from .all_element_mixin import (
+    ELEMENT_LIST_FIELDS,
+    is_repetition,
+    prefix_error_locations,
+)
+
+
+class _LazyEntry:
+    """A raw element definition, validated on first use"""
+
+    __slots__ = ("kind", "name", "fields", "entries", "element")
+
+    def __init__(self, kind, name, fields, entries=None, element=None):
+        self.kind = kind
+        self.name = name
+        self.fields = fields
+        # The nested entries of lines and unions, or the repeated entry
+        self.entries = entries
+        self.element = element
+
+    def validate(self) -> BaseElement:
+        """Return the element, validated on the first call."""
+        if self.element is None:
+            self.element = self._validate()
+        return self.element
+
+    def _validate(self) -> BaseElement:
+        from pals.kinds.all_elements import validate_element_fields
+
+        if self.kind == "RepeatedLine":
+            try:
+                line = self.entries.validate()
+            except ValidationError as error:
+                raise prefix_error_locations(error, ("line",)) from None
+            return validate_element_fields(
+                {"kind": "RepeatedLine", **self.fields, "line": line}
+            )
+        fields = {**self.fields, "name": self.name}
+        list_field = ELEMENT_LIST_FIELDS.get(self.kind)
+        if list_field is None:
+            return validate_element_fields(fields)
+        # Validate the container without its entries, which stay lazy
+        fields[list_field] = []
+        element = validate_element_fields(fields)
+        element._lazy_elements = LazyElements(self.entries, list_field)
+        # The element list is set on first use (see LazyElementsMixin)
+        del element.__dict__[list_field]
+        return element
+
+
+class LazyElementsMixin:
+    """Mixin of the lines and unions whose element list can be lazy
+
+    The element list field of a lazy line or union is not set until it is
+    used. Reading it, assigning other fields, comparing, copying, pickling
+    and serializing the element validate all remaining entries first.
+    """
+
+    __slots__ = ()
+
+    def _is_lazy(self) -> bool:
+        private = self.__pydantic_private__
+        return private is not None and private.get("_lazy_elements") is not None
+
+    def _validate_lazy(self):
+        if self._is_lazy():
+            validate_all(self)
+
+    def __getattr__(self, name: str):
+        # Only called for names that are not set, like the element list of a lazy line
+        if name in _LIST_FIELDS and self._is_lazy():
+            validate_all(self)
+            return self.__dict__[name]
+        return super().__getattr__(name)
+
+    def __setattr__(self, name: str, value):
+        if not name.startswith("_") and self._is_lazy():
+            if name == ELEMENT_LIST_FIELDS[self.kind]:
+                # The assigned elements replace the lazy entries
+                self._lazy_elements = None
+            else:
+                validate_all(self)
+        super().__setattr__(name, value)
+
+    def __eq__(self, other) -> bool:
+        self._validate_lazy()
+        if isinstance(other, LazyElementsMixin):
+            other._validate_lazy()
+        return super().__eq__(other)
+
+    def __iter__(self):
+        self._validate_lazy()
+        return super().__iter__()
+
+    def __copy__(self):
+        self._validate_lazy()
+        return super().__copy__()
+
+    def __deepcopy__(self, memo=None):
+        self._validate_lazy()
+        return super().__deepcopy__(memo)
+
+    def __getstate__(self):
+        self._validate_lazy()
+        return super().__getstate__()
+
+    def model_dump_json(self, *args, **kwargs) -> str:
+        self._validate_lazy()
+        return super().model_dump_json(*args, **kwargs)
+
+
+# The names of the element list fields
+_LIST_FIELDS = frozenset(ELEMENT_LIST_FIELDS.values())
+
+
+class LazyElements:
+    """A read-only view of the elements of a lazy line or union, validated on first access
+
+    The view is separate from the element list field, which is only set on
+    its first use (see LazyElementsMixin).
+    """
+
+    __slots__ = ("entries", "field")
+
+    def __init__(self, entries: list, field: str = "line"):
+        self.entries = entries
+        self.field = field
+
+    def _validate_entry(self, index: int):
+        item = self.entries[index]
+        if type(item) is not _LazyEntry:
+            return item
+        try:
+            element = item.validate()
+        except ValidationError as error:
+            position = index if index >= 0 else index + len(self.entries)
+            raise prefix_error_locations(error, (self.field, position)) from None
+        self.entries[index] = element
+        return element
+
+    def is_validated(self) -> bool:
+        """Return whether all entries have been validated"""
+        return not any(type(item) is _LazyEntry for item in self.entries)
+
+    def validate_all(self) -> list:
+        """Validate all remaining entries, returning the list of the elements"""
+        return [self._validate_entry(index) for index in range(len(self.entries))]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [
+                self._validate_entry(position)
+                for position in range(*index.indices(len(self.entries)))
+            ]
+        return self._validate_entry(index)
+
+    def __iter__(self):
+        for index in range(len(self.entries)):
+            yield self._validate_entry(index)
+
+    def __repr__(self) -> str:
+        validated = sum(type(item) is not _LazyEntry for item in self.entries)
+        return (
+            f"<{type(self).__name__} of {len(self.entries)} entries, "
+            f"{validated} validated>"
+        )
+
+
+def _child_path(path: tuple, kind: str, *loc) -> tuple:
+    """Return the error location of a nested entry, like in the serial validation."""
+    return path + ((kind,) if path else ()) + loc
+
+
+class _ScanError(Exception):
+    """An invalid entry or reference, with the location and input of its serial validation error"""
+
+    def __init__(self, error: Exception, loc: tuple, input):
+        super().__init__(error)
+        self.error = error
+        self.loc = loc
+        self.input = input
+
+
+def _scan_child(item, registry: dict, path: tuple, kind: str, input, *loc):
+    """Scan an entry of a line, union or repetition at path.
+
+    Like in the serial validation, the errors of the entry itself, e.g. an
+    undefined reference, are reported at the location of its container.
+    """
+    try:
+        return _scan(item, registry, _child_path(path, kind, *loc))
+    except (ValueError, TypeError) as error:
+        raise _ScanError(error, _child_path(path, kind), input) from None
+
+
+def _scan(item, registry: dict, path: tuple = ()) -> _LazyEntry:
+    """Return the lazy entry of a raw list entry, resolving name references.
+
+    The registry of the definitions by name is updated in the order of the
+    validation, so that references resolve like in the validated path.
+    """
+    if isinstance(item, str):
+        if item not in registry:
+            raise ValueError(f"Reference to undefined element {item!r}")
+        return registry[item]
+
+    if isinstance(item, BaseElement):
+        entry = registry[item.name] = _LazyEntry(item.kind, item.name, {}, None, item)
+        return entry
+
+    if is_repetition(item):
+        fields = dict(item)
+        # Repetitions are anonymous and cannot be referenced
+        return _LazyEntry(
+            "RepeatedLine",
+            None,
+            fields,
+            _scan_child(
+                fields.pop("line"), registry, path, "RepeatedLine", item, "line"
+            ),
+        )
+
+    if not isinstance(item, dict) or len(item) != 1:
+        raise ValueError(
+            f"Each element must be a dict with exactly one key (the element's name), "
+            f"but we got {item!r}"
+        )
+    ((name, fields),) = item.items()
+    if not isinstance(fields, dict):
+        raise TypeError(
+            f"Value for element key {name!r} must be a dict (the element's properties), "
+            f"but we got {fields!r}"
+        )
+    kind = fields.get("kind")
+    entries = None
+    list_field = ELEMENT_LIST_FIELDS.get(kind)
+    if list_field is not None:
+        input = {**fields, "name": name}
+        fields = dict(fields)
+        items = fields.pop(list_field, [])
+        if not isinstance(items, list):
+            raise _ScanError(
+                TypeError(f"'{list_field}' must be a list"),
+                _child_path(path, kind),
+                input,
+            )
+        entries = [
+            _scan_child(child, registry, path, kind, input, list_field, index)
+            for index, child in enumerate(items)
+        ]
+    # Containers are defined after their entries
+    entry = registry[name] = _LazyEntry(kind, name, fields, entries)
+    return entry
+
+
+def scan(data: dict) -> _LazyEntry:
+    """Return the lazy entry of a BeamLine (or any element) from its one-key dict {name: properties}.
+
+    Raises:
+        ValidationError: For invalid entries and undefined references, with
+            the location of the error of the serial validation
+    """
+    try:
+        return _scan(data, {})
+    except (ValueError, TypeError) as error:
+        raise _scan_error(data, _ScanError(error, (), data)) from None
+    except _ScanError as error:
+        raise _scan_error(data, error) from None
+
+
+def _scan_error(data, error: _ScanError) -> ValidationError:
+    ((_, fields),) = data.items()
+    return ValidationError.from_exception_data(
+        fields.get("kind", "Element"),
+        [
+            {
+                "type": "value_error",
+                "loc": error.loc,
+                "input": error.input,
+                "ctx": {"error": error.error},
+            }
+        ],
+    )
+
+
+def lazy_line(data: dict):
+    """Return a BeamLine (or any element) from its one-key dict {name: properties}, with lazy element lists."""
+    return scan(data).validate()
+
+
+def lazy_elements(element):
+    """Return the elements of a line or union, validated on first access if it is lazy.
+
+    Returns:
+        The LazyElements view of a lazy line or union whose entries have not
+        been put into its element list by validate_all yet, or else the
+        element list itself
+    """
+    view = element._lazy_elements
+    if view is None:
+        return getattr(element, ELEMENT_LIST_FIELDS[element.kind])
+    return view
+
+
+def validate_all(element):
+    """Validate all lazy entries of the element lists of an element, recursively.
+
+    The validated elements are put into the element list fields, which are
+    not set until then.
+
+    Returns:
+        The element
+    """
+    seen = set()
+    stack = [element]
+    while stack:
+        elem = stack.pop()
+        if id(elem) in seen:
+            continue
+        seen.add(id(elem))
+        if elem.kind == "RepeatedLine":
+            stack.append(elem.line)
+            continue
+        list_field = ELEMENT_LIST_FIELDS.get(elem.kind)
+        if list_field is None:
+            continue
+        view = elem._lazy_elements
+        if view is not None:
+            # Assigning would validate the validated elements again
+            elem.__dict__[list_field] = view.validate_all()
+            elem._lazy_elements = None
+        stack.extend(elem.__dict__[list_field])
+    return element
@@ -0,0 +1,177 @@
+"""Validation of large lattices in a pool of worker processes.
+
+The raw data is first scanned as for lazy validation (see lazy.py), which
+resolves the name references. The unique definitions of plain elements,
+which make up almost all of a lattice, are then validated in chunks by the
+workers and sent back pickled. The other fields of lines, unions and
+repetitions are validated in the calling process, and they are assembled
+from these elements there, so that references still share the same element
+instance.
+
+Validation errors are raised as in the serial path: the definitions are
+checked in the order of the serial validation, and the first invalid one
+is reported with the location of its definition. Undefined references and
+malformed entries are found by the scan, before any element is validated.
+
+Element kinds registered with register_kind are registered in the workers
+as well, so their classes must be importable (defined at module level).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pydantic import ValidationError
+
+from ..utils import paused_gc
+from .all_element_mixin import ELEMENT_LIST_FIELDS, prefix_error_locations
+from .lazy import _child_path, scan
+
+# Minimum number of elements per chunk, which amortizes the pickling overhead
+MIN_CHUNK_SIZE = 500
+
+# Number of chunks per worker, which balances the load between the workers
+CHUNKS_PER_WORKER = 4
+
+
+def _register_kinds(classes: tuple):
+    """Register the element kinds of the calling process in a worker."""
+    from pals.kinds.all_elements import register_kind
+
+    for cls in classes:
+        register_kind(cls)
+
+
+def _validate_chunk(chunk: list) -> list:
+    """Validate the properties of elements, returning the elements or their validation errors."""
+    from pals.kinds.all_elements import validate_element_fields
+
+    results = []
+    with paused_gc():
+        for fields in chunk:
+            try:
+                results.append(validate_element_fields(fields))
+            except ValidationError as error:
+                results.append(error)
+    return results
+
+
+def _collect_definitions(root) -> list:
+    """Return the unvalidated definitions, in the order of the serial validation, with their locations.
+
+    Each definition is a (step, entry, path) tuple. Lines and unions have a
+    "fields" step before their entries, which validates their other fields,
+    and an "assemble" step after them. Repetitions have a "repeat" step after
+    their repeated entry, as the serial validation validates their line first.
+    Plain elements have an "element" step.
+    """
+    definitions = []
+    seen = set()
+    stack = [("visit", root, ())]
+    while stack:
+        step, entry, path = stack.pop()
+        if step != "visit":
+            definitions.append((step, entry, path))
+            continue
+        if id(entry) in seen or entry.element is not None:
+            continue
+        seen.add(id(entry))
+        if entry.kind == "RepeatedLine":
+            stack.append(("repeat", entry, path))
+            stack.append(
+                ("visit", entry.entries, _child_path(path, entry.kind, "line"))
+            )
+            continue
+        list_field = ELEMENT_LIST_FIELDS.get(entry.kind)
+        if list_field is None:
+            definitions.append(("element", entry, path))
+            continue
+        definitions.append(("fields", entry, path))
+        stack.append(("assemble", entry, path))
+        stack.extend(
+            ("visit", child, _child_path(path, entry.kind, list_field, index))
+            for index, child in reversed(list(enumerate(entry.entries)))
+        )
+    return definitions
+
+
+def _validate_step(step: str, entry, result):
+    """Validate the fields of a line, union or repetition, or assemble a line or union from its entries."""
+    from pals.kinds.all_elements import validate_element_fields
+
+    if step == "element":
+        return result
+    if step == "repeat":
+        return validate_element_fields(
+            {"kind": "RepeatedLine", **entry.fields, "line": entry.entries.element}
+        )
+    list_field = ELEMENT_LIST_FIELDS[entry.kind]
+    if step == "fields":
+        return validate_element_fields(
+            {**entry.fields, "name": entry.name, list_field: []}
+        )
+    # The entries are validated already, only the other fields are copied
+    element = entry.element
+    return type(element).model_construct(
+        element.model_fields_set | {list_field},
+        **{
+            **element.__dict__,
+            list_field: [child.element for child in entry.entries],
+        },
+    )
+
+
+def validate_parallel(data: dict, workers: int = None):
+    """Validate a BeamLine (or any element) from its one-key dict {name: properties} in worker processes.
+
+    Args:
+        data: The one-key dict of the line
+        workers: Number of worker processes, by default the number of CPUs
+
+    Returns:
+        The element, equal to the one of the serial validation
+    """
+    from pals.kinds.all_elements import get_element_classes, get_resolved_element_types
+
+    workers = workers or os.cpu_count() or 1
+    with paused_gc():
+        root = scan(data)
+        definitions = _collect_definitions(root)
+        items = [
+            {**entry.fields, "name": entry.name}
+            for step, entry, _ in definitions
+            if step == "element"
+        ]
+        if workers > 1 and len(items) >= 2 * MIN_CHUNK_SIZE:
+            chunk_size = max(
+                MIN_CHUNK_SIZE, -(-len(items) // (workers * CHUNKS_PER_WORKER))
+            )
+            chunks = [
+                items[start : start + chunk_size]
+                for start in range(0, len(items), chunk_size)
+            ]
+            builtin = get_resolved_element_types()
+            registered = tuple(
+                cls for cls in get_element_classes().values() if cls not in builtin
+            )
+            with ProcessPoolExecutor(
+                min(workers, len(chunks)),
+                initializer=_register_kinds,
+                initargs=(registered,),
+            ) as executor:
+                results = [
+                    result
+                    for chunk_results in executor.map(_validate_chunk, chunks)
+                    for result in chunk_results
+                ]
+        else:
+            results = _validate_chunk(items)
+        results = iter(results)
+        for step, entry, path in definitions:
+            try:
+                result = next(results) if step == "element" else None
+                if isinstance(result, ValidationError):
+                    raise result
+                entry.element = _validate_step(step, entry, result)
+            except ValidationError as error:
+                raise prefix_error_locations(error, path) from None
+        return root.element
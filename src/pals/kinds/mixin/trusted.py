@@ -0,0 +1,157 @@
+"""Construction of elements from trusted data, without validation.
+
+Data that was written by PALS itself (or validated before) does not need to
+be validated again. The elements are built with pydantic's model_construct
+and model_copy instead, recursively: the kind discriminator selects the
+element class and nested parameter groups are constructed as their typed
+models. Element name references and repetitions are resolved as in the
+validated path.
+
+No checks at all are done on trusted data, so invalid data results in
+invalid elements. Use it only for files that have been validated before.
+"""
+
+from functools import lru_cache
+from typing import get_args
+
+from pydantic import BaseModel
+
+from . import BaseElement
+from ..utils import paused_gc
+from .all_element_mixin import ELEMENT_LIST_FIELDS, is_repetition
+
+
+def _model_fields(cls) -> dict:
+    """Return the fields of a model that hold a (non-element) model, with their types.
+
+    These are pydantic models, or other types that can be constructed with
+    model_construct.
+    """
+    fields = {}
+    for name, info in cls.model_fields.items():
+        types = get_args(info.annotation) or (info.annotation,)
+        models = [
+            t
+            for t in types
+            if isinstance(t, type)
+            and hasattr(t, "model_construct")
+            and not issubclass(t, BaseElement)
+        ]
+        if len(models) == 1:
+            fields[name] = models[0]
+    return fields
+
+
+class _Constructor:
+    """model_construct of one model class, which also constructs its nested parameter groups
+
+    New instances are copies (model_copy) of an instance with the default
+    values, updated with the given values, which is much faster than
+    model_construct for models with many optional fields. Models with default
+    factories, mutable defaults or aliases use model_construct instead.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.nested = {
+            name: _get_constructor(model) for name, model in _model_fields(cls).items()
+        }
+        self.names = frozenset(cls.model_fields)
+        self.extra = cls.model_config.get("extra") == "allow"
+        self.template = None
+        if not any(
+            info.default_factory is not None
+            or isinstance(info.default, (list, dict, set, BaseModel))
+            or info.alias is not None
+            or info.validation_alias is not None
+            for info in cls.model_fields.values()
+        ):
+            self.template = cls.model_construct()
+
+    def __call__(self, values: dict):
+        for name, construct in self.nested.items():
+            value = values.get(name)
+            if type(value) is dict:
+                values = {**values, name: construct(value)}
+        if self.template is None:
+            return self.cls.model_construct(**values)
+        if not self.extra and not self.names.issuperset(values):
+            values = {key: value for key, value in values.items() if key in self.names}
+        return self.template.model_copy(update=values)
+
+
+@lru_cache(maxsize=None)
+def _get_constructor(cls):
+    # Models with their own model_construct, like the multipole parameter groups
+    if (
+        not issubclass(cls, BaseModel)
+        or cls.model_construct.__func__ is not BaseModel.model_construct.__func__
+    ):
+        return lambda values: cls.model_construct(**values)
+    return _Constructor(cls)
+
+
+def construct_model(cls, fields: dict):
+    """Construct a model and its nested parameter groups from trusted data."""
+    return _get_constructor(cls)(fields)
+
+
+def _get_element_constructor(kind: str):
+    """Return the constructor of the registered element type of a kind, or None."""
+    from pals.kinds.all_elements import get_element_classes
+
+    cls = get_element_classes().get(kind)
+    return None if cls is None else _get_constructor(cls)
+
+
+def construct_element(item, registry: dict):
+    """Construct a single list entry of an element list from trusted data.
+
+    Args:
+        item: A one-key dict {name: properties}, an existing element instance,
+              the name of an element defined earlier in the lattice, or a
+              repetition dict like {"repeat": 10, "line": "cell"}
+        registry: The lattice's element registry, by name, which is updated with
+                  newly defined elements
+
+    Returns:
+        The element instance, shared with earlier entries for name references
+    """
+    if type(item) is str:
+        if item not in registry:
+            raise ValueError(f"Reference to undefined element {item!r}")
+        return registry[item]
+
+    if isinstance(item, BaseElement):
+        registry[item.name] = item
+        return item
+
+    if is_repetition(item):
+        fields = dict(item)
+        fields["line"] = construct_element(fields["line"], registry)
+        fields.setdefault("name", fields["line"].name)
+        # Repetitions are anonymous and cannot be referenced
+        return _get_element_constructor("RepeatedLine")(fields)
+
+    ((name, fields),) = item.items()
+    kind = fields.get("kind")
+    construct = _get_element_constructor(kind)
+    if construct is None:
+        raise ValueError(f"Unknown element kind {kind!r} of element {name!r}")
+    fields = {**fields, "name": name}
+    list_field = ELEMENT_LIST_FIELDS.get(kind)
+    if list_field is not None:
+        fields[list_field] = [
+            construct_element(elem, registry) for elem in fields.get(list_field, [])
+        ]
+    element = registry[name] = construct(fields)
+    return element
+
+
+def construct_line(data: dict):
+    """Construct a BeamLine (or any element) from its trusted one-key dict {name: properties}.
+
+    The garbage collector is paused meanwhile (see paused_gc).
+    """
+    with paused_gc():
+        return construct_element(data, {})
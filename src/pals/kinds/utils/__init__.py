@@ -1 +1,2 @@
-from .warnings import under_construction  # noqa: F401
+from .gc_pause import paused_gc  # noqa: F401
+from .warnings import is_under_construction, under_construction  # noqa: F401
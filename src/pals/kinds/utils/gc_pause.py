@@ -0,0 +1,35 @@
+"""Pausing the garbage collector while large lattices are built or dumped."""
+
+import gc
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+# Number of active pauses, and whether the collector was enabled before the first
+_depth = 0
+_was_enabled = False
+
+
+@contextmanager
+def paused_gc():
+    """Pause the cyclic garbage collector within a with block.
+
+    Creating many new container objects (dicts, lists, models) otherwise
+    triggers full collections, which dominate the time of building or dumping
+    large lattices. The collector is paused for the whole process, including
+    other threads, until the last of all nested or concurrent pauses ends.
+    """
+    global _depth, _was_enabled
+
+    with _lock:
+        if _depth == 0:
+            _was_enabled = gc.isenabled()
+            gc.disable()
+        _depth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _depth -= 1
+            if _depth == 0 and _was_enabled:
+                gc.enable()
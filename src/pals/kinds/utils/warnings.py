@@ -40,6 +40,8 @@ def under_construction(element_name: str = None):
 
         # Replace __init__ method
         cls.__init__ = new_init
+        # Mark the class, e.g. for validation reports
+        cls._under_construction = True
 
         # Add warning to class docstring if not already present
         if (
@@ -61,3 +63,8 @@ Please refer to the PALS documentation for the current status and any limitation
         return cls
 
     return decorator
+
+
+def is_under_construction(cls: type) -> bool:
+    """Return whether an element class is marked as under construction."""
+    return cls.__dict__.get("_under_construction", False)
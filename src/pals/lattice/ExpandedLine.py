@@ -0,0 +1,230 @@
+"""Lazy, flattened view of the elements in a (nested) line.
+
+Lines can contain other lines and compact repetitions of lines. The expanded
+view presents all of their elements as one flat sequence without materializing
+it: lengths, indexing and s-position lookups are computed arithmetically from
+per-line prefix sums, with binary searches through the nesting levels.
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+
+from pals.kinds import BeamLine, RepeatedLine, UnionEle
+from pals.kinds.mixin import ThickElement
+
+
+def element_length(element) -> float:
+    """Return the length of an element along the reference orbit in meters (m).
+
+    Lines and repetitions sum up the lengths of their elements, the elements
+    of a union overlap, and elements without a length are of zero length.
+    """
+    if isinstance(element, ThickElement):
+        return element.length
+    if isinstance(element, BeamLine):
+        return sum(element_length(elem) for elem in element.line)
+    if isinstance(element, RepeatedLine):
+        return element.repeat * element_length(element.line)
+    if isinstance(element, UnionEle):
+        return max((element_length(elem) for elem in element.elements), default=0.0)
+    return 0.0
+
+
+def is_expandable(element) -> bool:
+    """Return whether an element is a line or repetition that is expanded"""
+    return isinstance(element, (BeamLine, RepeatedLine))
+
+
+class _LineTable:
+    """Prefix sums of the element counts and lengths over the entries of one line."""
+
+    def __init__(self, element, tables):
+        self.element = element
+        if isinstance(element, RepeatedLine):
+            inner = tables.get(element.line)
+            self.count = element.repeat * inner.count
+            self.length = element.repeat * inner.length
+            return
+        # Start index and start position of each entry, plus the totals
+        self.starts = [0]
+        self.positions = [0.0]
+        for elem in element.line:
+            table = tables.get(elem)
+            self.starts.append(self.starts[-1] + table.count)
+            self.positions.append(self.positions[-1] + table.length)
+        self.count = self.starts[-1]
+        self.length = self.positions[-1]
+
+
+class _LeafTable:
+    """Count and length of an element that is not expanded any further."""
+
+    def __init__(self, element):
+        self.element = element
+        self.count = 1
+        self.length = element_length(element)
+
+
+class _Tables:
+    """Tables of all lines in a lattice, computed once per (shared) line instance."""
+
+    def __init__(self):
+        # The table keeps a reference to its element, so ids are not reused
+        self._tables = {}
+
+    def get(self, element):
+        table = self._tables.get(id(element))
+        if table is None:
+            if is_expandable(element):
+                table = _LineTable(element, self)
+            else:
+                table = _LeafTable(element)
+            self._tables[id(element)] = table
+        return table
+
+
+class ExpandedLine(Sequence):
+    """Lazy, flattened sequence of the elements in a line
+
+    Nested lines and repetitions are expanded into their elements, while
+    unions of overlapping elements count as a single element.
+    """
+
+    def __init__(self, line, tables: _Tables = None):
+        self.line = line
+        self._tables = _Tables() if tables is None else tables
+
+    @property
+    def length(self) -> float:
+        """Total length of the line in meters (m)"""
+        return self._tables.get(self.line).length
+
+    def __len__(self) -> int:
+        return self._tables.get(self.line).count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("ExpandedLine index out of range")
+        return self._locate(self.line, index, False)[0]
+
+    def __iter__(self):
+        return self._iterate(self.line, False)
+
+    def __reversed__(self):
+        return self._iterate(self.line, True)
+
+    def _iterate(self, element, reverse: bool):
+        if isinstance(element, RepeatedLine):
+            for _ in range(element.repeat):
+                yield from self._iterate(element.line, reverse != element.reverse)
+        elif isinstance(element, BeamLine):
+            entries = reversed(element.line) if reverse else element.line
+            for elem in entries:
+                yield from self._iterate(elem, reverse)
+        else:
+            yield element
+
+    def _locate(self, element, index: int, reverse: bool):
+        """Return the element at an index of a (reversed) line and its start position."""
+        table = self._tables.get(element)
+        if not is_expandable(element):
+            return element, 0.0
+        # Work in the line's original order
+        if reverse:
+            index = table.count - 1 - index
+        if isinstance(element, RepeatedLine):
+            inner = self._tables.get(element.line)
+            repetition, index = divmod(index, inner.count)
+            child, child_reverse = element.line, element.reverse
+            offset = repetition * inner.length
+        else:
+            entry = bisect_right(table.starts, index) - 1
+            index -= table.starts[entry]
+            child, child_reverse = element.line[entry], False
+            offset = table.positions[entry]
+        leaf, position = self._locate(child, index, child_reverse)
+        position += offset
+        if reverse:
+            position = table.length - position - self._tables.get(leaf).length
+        return leaf, position
+
+    def _index_at(self, element, s: float, reverse: bool, upstream: bool) -> int:
+        """Return the index of the element at position s of a (reversed) line.
+
+        At the boundary between two elements, the upstream one is returned if
+        upstream is set, otherwise the downstream one.
+        """
+        table = self._tables.get(element)
+        if not is_expandable(element):
+            return 0
+        # Work in the line's original order
+        if reverse:
+            s = table.length - s
+            upstream = not upstream
+        if isinstance(element, RepeatedLine):
+            inner = self._tables.get(element.line)
+            repetition = 0
+            if inner.length > 0:
+                repetition = (
+                    math.ceil(s / inner.length) - 1
+                    if upstream
+                    else int(s // inner.length)
+                )
+            repetition = min(max(repetition, 0), element.repeat - 1)
+            index = repetition * inner.count + self._index_at(
+                element.line,
+                s - repetition * inner.length,
+                element.reverse,
+                upstream,
+            )
+        else:
+            entries = len(element.line)
+            if upstream:
+                entry = bisect_left(table.positions, s, 1, entries + 1) - 1
+            else:
+                entry = bisect_right(table.positions, s, 0, entries) - 1
+            entry = min(max(entry, 0), entries - 1)
+            # Skip entries without elements, e.g. empty lines
+            step = -1 if upstream else 1
+            while table.starts[entry + 1] == table.starts[entry]:
+                if not 0 <= entry + step < entries:
+                    step = -step
+                entry += step
+            index = table.starts[entry] + self._index_at(
+                element.line[entry], s - table.positions[entry], False, upstream
+            )
+        if reverse:
+            index = table.count - 1 - index
+        return index
+
+    def s_position(self, index: int) -> float:
+        """Return the position of the entrance of the element at an index in meters (m)"""
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("ExpandedLine index out of range")
+        return self._locate(self.line, index, False)[1]
+
+    def index_at(self, s: float) -> int:
+        """Return the index of the element at a position s in meters (m)
+
+        At the boundary between two elements, the downstream element is returned.
+        """
+        if len(self) == 0:
+            raise IndexError("ExpandedLine is empty")
+        if not 0.0 <= s <= self.length:
+            raise ValueError(
+                f"Position {s} is outside of the line of length {self.length}"
+            )
+        return self._index_at(self.line, s, False, False)
+
+    def element_at(self, s: float):
+        """Return the element at a position s in meters (m)"""
+        return self[self.index_at(s)]
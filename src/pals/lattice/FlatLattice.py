@@ -0,0 +1,254 @@
+"""Flattened, array-backed view of a lattice (struct-of-arrays).
+
+The nested tree of lines, repetitions and elements is flattened once into
+contiguous NumPy columns, so that downstream codes can process large
+lattices with vectorized operations instead of per-element attribute access.
+"""
+
+import numpy as np
+
+from pals.kinds import RepeatedLine
+
+from .ExpandedLine import element_length, is_expandable
+
+# Columns of the offsets and rotations of patches and floor shifts
+SHIFT_COLUMNS = ("x_offset", "y_offset", "z_offset", "x_rot", "y_rot", "z_rot")
+
+# Length-integrated magnetic multipole columns
+_MULTIPOLE_COLUMNS = ("BnL", "BsL", "KnL", "KsL")
+
+
+def element_row(element):
+    """Return the scalar FlatLattice column values and the multipole coefficients of an element.
+
+    The multipole coefficients are length-integrated, as {(column, order): value}.
+    """
+    length = element_length(element)
+    row = {"length": length}
+
+    bend = getattr(element, "BendP", None)
+    if bend is not None:
+        row["g_ref"] = bend.g_ref
+        row["angle"] = bend.g_ref * length
+        row["e1"] = bend.e1
+        row["e2"] = bend.e2
+        row["e1_rect"] = bend.e1_rect
+        row["e2_rect"] = bend.e2_rect
+        row["tilt_ref"] = bend.tilt_ref
+
+    solenoid = getattr(element, "SolenoidP", None)
+    if solenoid is not None:
+        row["Ksol"] = solenoid.Ksol
+        row["Bsol"] = solenoid.Bsol
+
+    # Patches and floor shifts, both as a transformation of the reference frame
+    shift = getattr(element, "PatchP", None) or getattr(element, "FloorShiftP", None)
+    if shift is not None:
+        for key in SHIFT_COLUMNS:
+            row[key] = getattr(shift, key)
+
+    aperture = element.ApertureP
+    if aperture is not None:
+        for prefix, limits in (("x", aperture.x_limits), ("y", aperture.y_limits)):
+            if limits[0] is not None:
+                row[f"{prefix}_min"] = limits[0]
+            if limits[1] is not None:
+                row[f"{prefix}_max"] = limits[1]
+
+    # Multipole coefficients as {(column, order): value}
+    multipoles = {}
+    magnetic = getattr(element, "MagneticMultipoleP", None)
+    if magnetic is not None:
+        for component, order, integrated, value in magnetic.terms():
+            if component == "tilt":
+                multipoles["tilt", order] = value
+                continue
+            # Store length-integrated values only
+            if not integrated:
+                value = value * length
+            column = component + "L"
+            multipoles[column, order] = multipoles.get((column, order), 0.0) + value
+
+    return row, multipoles
+
+
+def get_table(line) -> "FlatLattice":
+    """Return the FlatLattice of a line, or the argument if it already is one."""
+    if isinstance(line, FlatLattice):
+        return line
+    return line.to_table()
+
+
+def flatten_line(line, evaluate):
+    """Flatten a nested line into the indices of its distinct element instances.
+
+    Args:
+        line: The line to flatten
+        evaluate: Function that is called once per distinct element instance
+
+    Returns:
+        The distinct element index of each element of the expanded line (as an
+        array), the results of evaluate, and the distinct elements (as an array)
+    """
+    indices = {}
+    values = []
+    elements = []
+    # Flattened distinct element indices of each (line, reversed)
+    flattened = {}
+
+    def add_element(element) -> int:
+        index = indices.get(id(element))
+        if index is None:
+            index = indices[id(element)] = len(values)
+            values.append(evaluate(element))
+            elements.append(element)
+        return index
+
+    def flatten(element, reverse: bool):
+        key = (id(element), reverse)
+        result = flattened.get(key)
+        if result is not None:
+            return result
+
+        if isinstance(element, RepeatedLine):
+            inner = flatten(element.line, reverse != element.reverse)
+            result = np.tile(inner, element.repeat)
+        else:
+            # Collect runs of single elements and flattened lines
+            parts = []
+            run = []
+            entries = reversed(element.line) if reverse else element.line
+            for elem in entries:
+                if is_expandable(elem):
+                    if run:
+                        parts.append(np.array(run, dtype=np.int64))
+                        run = []
+                    parts.append(flatten(elem, reverse))
+                else:
+                    run.append(add_element(elem))
+            if run:
+                parts.append(np.array(run, dtype=np.int64))
+            result = np.concatenate(parts) if parts else np.zeros(0, np.int64)
+
+        flattened[key] = result
+        return result
+
+    row_index = flatten(line, False)
+    # Avoid NumPy probing the elements for the array interface
+    elements = np.fromiter(elements, dtype=object, count=len(elements))
+    return row_index, values, elements
+
+
+class FlatLattice:
+    """Flattened, struct-of-arrays view of all elements in a line
+
+    Each element of the expanded line (see ExpandedLine) is one row. Columns:
+
+    - kind: index into kind_names of the element's kind
+    - name_index: index into names of the element's name
+    - length: length in meters (m)
+    - s: position of the element's entrance in meters (m)
+    - g_ref, angle, e1, e2, e1_rect, e2_rect, tilt_ref: bend parameters (0 if not a bend)
+    - Ksol, Bsol: solenoid strength and field (0 if not a solenoid)
+    - x_offset, y_offset, z_offset, x_rot, y_rot, z_rot: reference frame
+      transformation of patches and floor shifts (0 otherwise)
+    - x_min, x_max, y_min, y_max: aperture limits in meters (m), infinite if unset
+    - BnL, BsL, KnL, KsL, tilt: magnetic multipole coefficients, length-integrated,
+      as 2D arrays of shape (number of elements, number of orders)
+    - elements: back-references to the elements themselves
+
+    Shared elements, e.g. in repetitions of a line, are evaluated only once.
+    """
+
+    # Scalar float columns and their values for elements that do not set them
+    _SCALAR_COLUMNS = {
+        "length": 0.0,
+        "g_ref": 0.0,
+        "angle": 0.0,
+        "e1": 0.0,
+        "e2": 0.0,
+        "e1_rect": 0.0,
+        "e2_rect": 0.0,
+        "tilt_ref": 0.0,
+        "Ksol": 0.0,
+        "Bsol": 0.0,
+        **{column: 0.0 for column in SHIFT_COLUMNS},
+        "x_min": -np.inf,
+        "x_max": np.inf,
+        "y_min": -np.inf,
+        "y_max": np.inf,
+    }
+
+    def __init__(self, line):
+        self.line = line
+
+        kind_codes = {}
+        name_codes = {}
+
+        def evaluate(element):
+            kind = kind_codes.setdefault(element.kind, len(kind_codes))
+            name = name_codes.setdefault(element.name, len(name_codes))
+            return (kind, name) + element_row(element)
+
+        row_index, distinct, distinct_elements = flatten_line(line, evaluate)
+
+        self.kind_names = np.array(list(kind_codes), dtype=str)
+        self.names = np.array(list(name_codes), dtype=str)
+
+        # Per distinct element columns, gathered into per row columns
+        codes = np.array([values[:2] for values in distinct], dtype=np.int32)
+        codes = codes.reshape(-1, 2)[row_index]
+        self.kind = codes[:, 0]
+        self.name_index = codes[:, 1]
+
+        for column, default in self._SCALAR_COLUMNS.items():
+            values = np.array(
+                [row.get(column, default) for _, _, row, _ in distinct],
+                dtype=np.float64,
+            )
+            setattr(self, column, values[row_index])
+
+        n_orders = 1 + max(
+            (order for *_, multipoles in distinct for _, order in multipoles),
+            default=0,
+        )
+        for column in _MULTIPOLE_COLUMNS + ("tilt",):
+            values = np.zeros((len(distinct), n_orders))
+            for index, (*_, multipoles) in enumerate(distinct):
+                for (name, order), value in multipoles.items():
+                    if name == column:
+                        values[index, order] = value
+            setattr(self, column, values[row_index])
+
+        self.s = np.concatenate(([0.0], np.cumsum(self.length)))[:-1]
+        self.elements = distinct_elements[row_index]
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    @property
+    def s_end(self):
+        """Position of the elements' exits in meters (m)"""
+        return self.s + self.length
+
+    @property
+    def n_orders(self) -> int:
+        """Number of multipole orders stored in the multipole columns"""
+        return self.KnL.shape[1]
+
+    def kind_mask(self, kind: str):
+        """Return a boolean mask of all elements of a kind, e.g. "Quadrupole" """
+        matches = np.flatnonzero(self.kind_names == kind)
+        if len(matches) == 0:
+            return np.zeros(len(self), dtype=bool)
+        return self.kind == matches[0]
+
+    def element_names(self):
+        """Return the names of all elements, as an array of strings"""
+        return self.names[self.name_index]
+
+    def columns(self) -> dict:
+        """Return all columns, by name"""
+        names = ("kind", "name_index", "s") + tuple(self._SCALAR_COLUMNS)
+        names += _MULTIPOLE_COLUMNS + ("tilt", "elements")
+        return {name: getattr(self, name) for name in names}
@@ -0,0 +1,115 @@
+"""Cached index of the s-positions of all elements in a line.
+
+The index is a prefix sum over the lengths of the expanded line, and keeps
+the per-line tables of an ExpandedLine for the binary searches of elements at
+a position s. Indices are cached per line and rebuilt automatically after the
+length of one of its elements (or the contents of one of its lines) has been
+assigned.
+"""
+
+import weakref
+
+import numpy as np
+
+from pals.kinds import BeamLine, RepeatedLine, UnionEle
+from pals.kinds.mixin.BaseElement import watch_geometry
+
+from .ExpandedLine import ExpandedLine, element_length
+from .FlatLattice import flatten_line
+
+# Cached position indices, by id of their line
+_position_indices = {}
+
+
+def _geometry_elements(line) -> list:
+    """Return all distinct elements whose geometry fields determine the positions in a line."""
+    elements = {}
+    stack = [line]
+    while stack:
+        element = stack.pop()
+        if id(element) in elements:
+            continue
+        elements[id(element)] = element
+        if isinstance(element, RepeatedLine):
+            stack.append(element.line)
+        elif isinstance(element, BeamLine):
+            stack.extend(element.line)
+        elif isinstance(element, UnionEle):
+            stack.extend(element.elements)
+    return list(elements.values())
+
+
+class PositionIndex:
+    """Positions of the element boundaries of a line, for binary searches
+
+    In-place changes of element lists (e.g. line.line.append(...)) are not
+    detected. Assign a new list instead, or call invalidate_position_index().
+    """
+
+    def __init__(self, line):
+        self.valid = True
+        # A shallow copy shares the elements, but lets the line be garbage collected
+        self.expanded = ExpandedLine(line.model_copy())
+        row_index, lengths, elements = flatten_line(line, element_length)
+        self.elements = elements[row_index]
+        lengths = np.array(lengths, dtype=np.float64)[row_index]
+        self.positions = np.concatenate(([0.0], np.cumsum(lengths)))
+        watch_geometry(_geometry_elements(line), self)
+
+    def invalidate(self):
+        """Mark the index as outdated, after the geometry of one of its elements changed"""
+        self.valid = False
+
+    def index_at(self, s: float) -> int:
+        """Return the index of the element at a position s in meters (m)
+
+        At the boundary between two elements, the downstream element is returned.
+        """
+        return self.expanded.index_at(s)
+
+    def element_at(self, s: float):
+        """Return the element at a position s in meters (m)"""
+        return self.expanded.element_at(s)
+
+    def slice(self, s0: float, s1: float) -> list:
+        """Return all elements between the positions s0 and s1 in meters (m)
+
+        These are the elements that overlap with the interval from s0 to s1, plus
+        the zero-length elements within it, in the order of the line.
+        """
+        if s1 < s0:
+            raise ValueError(f"End position {s1} is before start position {s0}")
+        starts = self.positions[:-1]
+        ends = self.positions[1:]
+        # Binary search for the candidates, then filter the few at the boundaries
+        first = int(np.searchsorted(ends, s0, side="left"))
+        last = int(np.searchsorted(starts, s1, side="right"))
+        starts, ends = starts[first:last], ends[first:last]
+        thin = starts == ends
+        overlaps = (starts < s1) & (ends > s0)
+        overlaps |= thin & (starts >= s0) & (starts <= s1)
+        return list(self.elements[first:last][overlaps])
+
+
+def get_position_index(line) -> PositionIndex:
+    """Return the cached position index of a line, rebuilding it if outdated."""
+    key = id(line)
+    cached = _position_indices.get(key)
+    if cached is not None:
+        index, ref = cached
+        if ref() is line and index.valid:
+            return index
+
+    def forget(ref):
+        # Drop the cached index when its line is garbage collected
+        if _position_indices.get(key, (None, None))[1] is ref:
+            del _position_indices[key]
+
+    index = PositionIndex(line)
+    _position_indices[key] = (index, weakref.ref(line, forget))
+    return index
+
+
+def invalidate_position_index(line):
+    """Drop the cached position index of a line, e.g. after in-place list changes."""
+    _position_indices.pop(id(line), None)
@@ -0,0 +1,19 @@
+"""Views and computations on the elements of a lattice.
+
+Re-export commonly used classes from submodules so callers can use
+simpler import statements like `from pals.lattice import FlatLattice`.
+"""
+
+from .ExpandedLine import ExpandedLine, element_length  # noqa: F401
+from .FlatLattice import (  # noqa: F401
+    SHIFT_COLUMNS,
+    FlatLattice,
+    element_row,
+    get_table,
+)
+from .PositionIndex import (  # noqa: F401
+    PositionIndex,
+    get_position_index,
+    invalidate_position_index,
+)
+from .scan import cumulative_product  # noqa: F401
@@ -0,0 +1,55 @@
+"""Cumulative products of stacks of matrices.
+
+Products along a line are computed with a blocked (two-level) parallel scan:
+the stack is split into about sqrt(n) blocks, all blocks are multiplied out
+at once, and the block totals are scanned recursively. This needs only
+O(sqrt(n)) vectorized NumPy calls instead of one call per matrix.
+"""
+
+import numpy as np
+
+# Below this size, the products are accumulated one matrix at a time
+_SEQUENTIAL_SIZE = 32
+
+
+def _sequential_product(matrices):
+    result = matrices.copy()
+    for i in range(1, len(result)):
+        np.matmul(matrices[i], result[i - 1], out=result[i])
+    return result
+
+
+def cumulative_product(matrices):
+    """Return the cumulative products of a stack of square matrices.
+
+    Args:
+        matrices: Array of shape (n, d, d) of the matrices M_0, ..., M_{n-1}
+
+    Returns:
+        Array of shape (n, d, d) with the products M_i @ ... @ M_1 @ M_0, i.e.
+        the maps from the start of the line to the exit of each element
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    n, d = len(matrices), matrices.shape[-1]
+    if n <= _SEQUENTIAL_SIZE:
+        return _sequential_product(matrices)
+
+    # Pad with identities to a whole number of blocks
+    size = int(np.ceil(np.sqrt(n)))
+    n_blocks = -(-n // size)
+    blocks = np.empty((n_blocks * size, d, d))
+    blocks[:n] = matrices
+    blocks[n:] = np.eye(d)
+    blocks = blocks.reshape(n_blocks, size, d, d)
+
+    # Products within each block, for all blocks at once
+    local = blocks.copy()
+    for j in range(1, size):
+        np.matmul(blocks[:, j], local[:, j - 1], out=local[:, j])
+
+    # Products of all blocks before each block
+    carry = np.empty((n_blocks, d, d))
+    carry[0] = np.eye(d)
+    carry[1:] = cumulative_product(local[:-1, -1])
+
+    return (local @ carry[:, None]).reshape(-1, d, d)[:n]
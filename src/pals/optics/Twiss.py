@@ -0,0 +1,254 @@
+"""Twiss functions and dispersion of a lattice, from batched linear maps.
+
+The cumulative linear maps from the start of the line to every element (or
+slice) boundary are computed once with a parallel scan. The Twiss functions
+then follow from closed-form expressions evaluated for all boundaries at once.
+After a change of a single element, only the maps downstream of it are
+recomputed from the element matrices, again with a parallel scan, so that
+rounding errors do not build up over many changes.
+
+The transverse planes are treated as uncoupled, i.e. coupling terms of
+solenoids and tilted elements are ignored for the Twiss functions (but not
+for the dispersion).
+"""
+
+import numpy as np
+
+from pals.lattice import cumulative_product, get_table
+
+from .linear import element_strengths, linear_matrices
+
+# Twiss functions at the start of an open line that are zero if not given
+_INITIAL_DEFAULTS = {
+    "alpha_x": 0.0,
+    "alpha_y": 0.0,
+    "eta_x": 0.0,
+    "etap_x": 0.0,
+    "eta_y": 0.0,
+    "etap_y": 0.0,
+}
+
+
+def _slice_strengths(strengths: dict, slices: int):
+    """Split each thick element into slices of equal length.
+
+    Returns the strengths per slice and the element index of each slice.
+    """
+    length = strengths["length"]
+    counts = np.where(length > 0.0, slices, 1)
+    element_index = np.repeat(np.arange(len(length)), counts)
+    if slices == 1:
+        return {key: value.copy() for key, value in strengths.items()}, element_index
+
+    sliced = {key: np.repeat(value, counts) for key, value in strengths.items()}
+    for key in ("length", "k1l"):
+        sliced[key] /= counts[element_index]
+    # The pole faces are at the first and the last slice only
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    last = first + counts - 1
+    for key, keep in (("e1", first), ("e2", last)):
+        values = np.zeros_like(sliced[key])
+        values[keep] = strengths[key]
+        sliced[key] = values
+    return sliced, element_index
+
+
+def _periodic_plane(M, p: int):
+    """Return beta and alpha of the periodic solution of a plane of a one-turn map."""
+    m11, m12, m22 = M[p, p], M[p, p + 1], M[p + 1, p + 1]
+    cos_mu = (m11 + m22) / 2
+    if abs(cos_mu) >= 1.0:
+        plane = "xy"[p // 2]
+        raise ValueError(f"No periodic solution in {plane} (cos(mu) = {cos_mu})")
+    sin_mu = np.sign(m12) * np.sqrt(1.0 - cos_mu**2)
+    return m12 / sin_mu, (m11 - m22) / (2 * sin_mu)
+
+
+class Twiss:
+    """Twiss functions and dispersion at all element (or slice) boundaries of a line
+
+    The arrays s, beta_x, alpha_x, mu_x, beta_y, alpha_y, mu_y, eta_x, etap_x,
+    eta_y and etap_y have one entry per boundary, starting with the entrance of
+    the line. Phase advances mu are in radian and start at 0.
+
+    Args:
+        line: A BeamLine (or any line), or its FlatLattice
+        periodic: Compute the periodic solution, otherwise propagate the
+            Twiss functions in initial through the line
+        initial: Twiss functions at the entrance of an open line, as a dict
+            with beta_x and beta_y and optionally alpha_*, eta_* and etap_*
+        slices: Number of slices of equal length of thick elements
+        brho: Magnetic rigidity in T*m, see transfer_matrices()
+        beta_gamma: Relativistic beta * gamma, see transfer_matrices()
+    """
+
+    def __init__(
+        self,
+        line,
+        *,
+        periodic: bool = True,
+        initial: dict = None,
+        slices: int = 1,
+        brho: float = None,
+        beta_gamma: float = None,
+    ):
+        if slices < 1:
+            raise ValueError(f"Number of slices must be at least 1, not {slices}")
+        if not periodic and initial is None:
+            raise ValueError("Initial Twiss functions are required for an open line")
+        self.table = get_table(line)
+        self.periodic = periodic
+        self.initial = None if initial is None else {**_INITIAL_DEFAULTS, **initial}
+        self.slices = slices
+        self.beta_gamma = beta_gamma
+
+        strengths = element_strengths(self.table, brho)
+        self._strengths, self.element_index = _slice_strengths(strengths, slices)
+        # First slice of each element, plus the total number of slices
+        self._rows = np.searchsorted(self.element_index, np.arange(len(self.table) + 1))
+
+        self.matrices = linear_matrices(self._strengths, beta_gamma)
+        self.maps = cumulative_product(self.matrices)
+        self._compute(0)
+
+    def __len__(self) -> int:
+        """Number of boundaries"""
+        return len(self.s)
+
+    @property
+    def tune_x(self) -> float:
+        """Horizontal phase advance of the whole line, in units of 2 pi"""
+        return self.mu_x[-1] / (2 * np.pi)
+
+    @property
+    def tune_y(self) -> float:
+        """Vertical phase advance of the whole line, in units of 2 pi"""
+        return self.mu_y[-1] / (2 * np.pi)
+
+    def one_turn_map(self):
+        """Return the linear map of the whole line"""
+        if len(self.maps) == 0:
+            return np.eye(6)
+        return self.maps[-1]
+
+    def set_strength(self, index: int, **values):
+        """Change the strengths of the element at an index and update the Twiss functions.
+
+        Only the maps downstream of the element are recomputed. For an open
+        line, the Twiss functions upstream of the element are kept, too.
+
+        Args:
+            index: Index of the element in the expanded line
+            values: New values of the element's length, g, k1l, ksol, e1, e2
+                and/or tilt, as in element_strengths()
+        """
+        first, end = self._rows[index], self._rows[index + 1]
+        count = end - first
+        for key, value in values.items():
+            if key not in self._strengths:
+                raise KeyError(f"Unknown strength {key!r}")
+            column = self._strengths[key]
+            if key in ("length", "k1l"):
+                column[first:end] = value / count
+            elif key == "e1":
+                column[first] = value
+            elif key == "e2":
+                column[end - 1] = value
+            else:
+                column[first:end] = value
+
+        rows = slice(first, end)
+        self.matrices[rows] = linear_matrices(
+            {key: value[rows] for key, value in self._strengths.items()},
+            self.beta_gamma,
+        )
+        # Maps from the element on: the products of the matrices of the rows
+        # from the element to each boundary, applied to the map before it
+        previous = self.maps[first - 1] if first > 0 else np.eye(6)
+        self.maps[first:] = cumulative_product(self.matrices[first:]) @ previous
+
+        self._compute(0 if self.periodic else first)
+
+    def _compute(self, first: int):
+        """Compute the Twiss functions at all boundaries after the row first."""
+        n_rows = len(self.matrices)
+        if first == 0:
+            lengths = self._strengths["length"]
+            self.s = np.concatenate(([0.0], np.cumsum(lengths)))
+            self._initialize(n_rows + 1)
+        else:
+            self.s[first + 1 :] = self.s[first] + np.cumsum(
+                self._strengths["length"][first:]
+            )
+
+        initial = self._initial_values()
+        maps = self.maps[first:]
+        matrices = self.matrices[first:]
+        boundaries = slice(first + 1, None)
+
+        for plane, p in (("x", 0), ("y", 2)):
+            beta0, alpha0 = initial[f"beta_{plane}"], initial[f"alpha_{plane}"]
+            gamma0 = (1.0 + alpha0**2) / beta0
+            m11, m12 = maps[:, p, p], maps[:, p, p + 1]
+            m21, m22 = maps[:, p + 1, p], maps[:, p + 1, p + 1]
+            beta = getattr(self, f"beta_{plane}")
+            alpha = getattr(self, f"alpha_{plane}")
+            mu = getattr(self, f"mu_{plane}")
+            beta[0], alpha[0] = beta0, alpha0
+            beta[boundaries] = m11**2 * beta0 - 2 * m11 * m12 * alpha0 + m12**2 * gamma0
+            alpha[boundaries] = (
+                -m11 * m21 * beta0
+                + (m11 * m22 + m12 * m21) * alpha0
+                - m12 * m22 * gamma0
+            )
+            # Phase advance of each row, from the Twiss functions at its entrance
+            beta_in, alpha_in = beta[first:-1], alpha[first:-1]
+            e11, e12 = matrices[:, p, p], matrices[:, p, p + 1]
+            advance = np.arctan2(e12, e11 * beta_in - e12 * alpha_in)
+            mu[boundaries] = mu[first] + np.cumsum(advance)
+
+        # Dispersion (eta_x, etap_x, eta_y, etap_y) for dp/p = 1
+        eta0 = np.array(
+            [initial[key] for key in ("eta_x", "etap_x", "eta_y", "etap_y")]
+        )
+        eta = maps[:, :4, :4] @ eta0 + maps[:, :4, 5]
+        for column, key in enumerate(("eta_x", "etap_x", "eta_y", "etap_y")):
+            values = getattr(self, key)
+            values[0] = eta0[column]
+            values[boundaries] = eta[:, column]
+
+    def _initialize(self, size: int):
+        for key in (
+            "beta_x",
+            "alpha_x",
+            "mu_x",
+            "beta_y",
+            "alpha_y",
+            "mu_y",
+            "eta_x",
+            "etap_x",
+            "eta_y",
+            "etap_y",
+        ):
+            setattr(self, key, np.zeros(size))
+
+    def _initial_values(self) -> dict:
+        """Return the Twiss functions at the entrance of the line."""
+        if not self.periodic:
+            return self.initial
+        M = self.one_turn_map()
+        initial = {}
+        for plane, p in (("x", 0), ("y", 2)):
+            beta, alpha = _periodic_plane(M, p)
+            initial[f"beta_{plane}"] = beta
+            initial[f"alpha_{plane}"] = alpha
+        # Periodic dispersion: (1 - M) eta = M[:, 5] in the transverse block
+        eta = np.linalg.solve(np.eye(4) - M[:4, :4], M[:4, 5])
+        for column, key in enumerate(("eta_x", "etap_x", "eta_y", "etap_y")):
+            initial[key] = eta[column]
+        return initial
+
+
+def twiss(line, periodic: bool = True, **kwargs) -> Twiss:
+    """Return the Twiss functions and dispersion of a line, see Twiss."""
+    return Twiss(line, periodic=periodic, **kwargs)
@@ -0,0 +1,8 @@
+"""Beam optics computations on the elements of a lattice.
+
+Re-export commonly used functions from submodules so callers can use
+simpler import statements like `from pals.optics import transfer_matrices`.
+"""
+
+from .linear import transfer_matrices  # noqa: F401
+from .Twiss import Twiss, twiss  # noqa: F401
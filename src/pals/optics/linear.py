@@ -0,0 +1,246 @@
+"""Linear (first order) transfer matrices of the elements of a lattice.
+
+The matrices act on the phase space coordinates (x, px, y, py, z, pz), with
+px and py normalized to the reference momentum and pz = dp/p. All matrices of
+a lattice are computed in one batched NumPy pass over the columns of its
+FlatLattice, in three groups:
+
+- thick elements with dipole and/or quadrupole fields: drifts, quadrupoles,
+  sector and rectangular bends (combined function, with edge focusing), and
+  all other thick elements, whose linear part is that of a drift
+- solenoids (thick elements with a solenoid strength)
+- thin elements (zero length), as thin quadrupole kicks
+
+Quadrupole tilts (tilt1) and bend tilts (tilt_ref) rotate the element
+matrices around the reference orbit. Skew quadrupole coefficients, fringe
+field integrals and higher orders are ignored.
+"""
+
+import numpy as np
+
+from pals.lattice import FlatLattice, cumulative_product, get_table
+
+# Below this |k L^2|, the focusing functions are evaluated as power series
+_SERIES_LIMIT = 1e-3
+
+
+def _focusing_functions(k, length):
+    """Return the functions C, S, D = (1 - C) / k and F = (L - S) / k of a plane.
+
+    Here C and S are the cosine- and sine-like solutions of x'' = -k x.
+    """
+    kl2 = k * length**2
+    series = np.abs(kl2) < _SERIES_LIMIT
+    root = np.sqrt(np.abs(np.where(series, 1.0, k)))
+    phase = root * length
+    focusing = k > 0
+    C = np.where(focusing, np.cos(phase), np.cosh(phase))
+    S = np.where(focusing, np.sin(phase), np.sinh(phase)) / root
+    k_safe = np.where(series, 1.0, k)
+    D = (1.0 - C) / k_safe
+    F = (length - S) / k_safe
+    # Power series for weak focusing, including drifts (k = 0)
+    L, L2 = length, length**2
+    C = np.where(series, 1.0 - kl2 / 2 + kl2**2 / 24, C)
+    S = np.where(series, L * (1.0 - kl2 / 6 + kl2**2 / 120), S)
+    D = np.where(series, L2 * (0.5 - kl2 / 24 + kl2**2 / 720), D)
+    F = np.where(series, L2 * L * (1.0 / 6 - kl2 / 120 + kl2**2 / 5040), F)
+    return C, S, D, F
+
+
+def _rotation(angle):
+    """Return the matrices that rotate the transverse coordinates by an angle."""
+    c, s = np.cos(angle), np.sin(angle)
+    R = np.zeros(np.shape(angle) + (6, 6))
+    for i in (0, 1):
+        R[..., i, i] = c
+        R[..., i, i + 2] = s
+        R[..., i + 2, i] = -s
+        R[..., i + 2, i + 2] = c
+    R[..., 4, 4] = R[..., 5, 5] = 1.0
+    return R
+
+
+def bend_matrices(length, g, k1, e1, e2, z_slip):
+    """Return the matrices of thick combined function sector bends.
+
+    With g = 0 these are quadrupoles, and with g = k1 = 0 drifts.
+
+    Args:
+        length: Lengths in meters (m)
+        g: Reference bend strengths 1/rho in 1/m
+        k1: Normalized quadrupole strengths in 1/m^2
+        e1, e2: Entrance and exit pole face angles, relative to a sector bend
+        z_slip: Path length slippage factor 1 / (beta gamma)^2 of the particles
+    """
+    kx = k1 + g**2
+    Cx, Sx, Dx, Fx = _focusing_functions(kx, length)
+    Cy, Sy, _, _ = _focusing_functions(-k1, length)
+
+    M = np.zeros(np.shape(length) + (6, 6))
+    M[..., 0, 0] = Cx
+    M[..., 0, 1] = Sx
+    M[..., 0, 5] = g * Dx
+    M[..., 1, 0] = -kx * Sx
+    M[..., 1, 1] = Cx
+    M[..., 1, 5] = g * Sx
+    M[..., 2, 2] = Cy
+    M[..., 2, 3] = Sy
+    M[..., 3, 2] = k1 * Sy
+    M[..., 3, 3] = Cy
+    M[..., 4, 0] = -g * Sx
+    M[..., 4, 1] = -g * Dx
+    M[..., 4, 4] = 1.0
+    M[..., 4, 5] = -(g**2) * Fx + length * z_slip
+    M[..., 5, 5] = 1.0
+
+    # Edge focusing of the pole faces, as thin kicks at both ends
+    for edge, at_exit in ((e1, False), (e2, True)):
+        h = g * np.tan(edge)
+        if not np.any(h):
+            continue
+        if at_exit:
+            M[..., 1, :] += h[..., None] * M[..., 0, :]
+            M[..., 3, :] -= h[..., None] * M[..., 2, :]
+        else:
+            M[..., :, 0] += M[..., :, 1] * h[..., None]
+            M[..., :, 2] -= M[..., :, 3] * h[..., None]
+    return M
+
+
+def solenoid_matrices(length, ksol, z_slip):
+    """Return the matrices of thick solenoids.
+
+    Args:
+        length: Lengths in meters (m)
+        ksol: Normalized solenoid strengths in 1/m
+        z_slip: Path length slippage factor 1 / (beta gamma)^2 of the particles
+    """
+    k = ksol / 2
+    phase = k * length
+    C, S = np.cos(phase), np.sin(phase)
+    # sin(k L) / k, also for k = 0
+    SK = length * np.sinc(phase / np.pi)
+    CS = C * S
+
+    M = np.zeros(np.shape(length) + (6, 6))
+    M[..., 0, 0] = M[..., 1, 1] = M[..., 2, 2] = M[..., 3, 3] = C**2
+    M[..., 0, 1] = M[..., 2, 3] = C * SK
+    M[..., 0, 2] = M[..., 1, 3] = CS
+    M[..., 0, 3] = S * SK
+    M[..., 1, 0] = M[..., 3, 2] = -k * CS
+    M[..., 1, 2] = -k * S**2
+    M[..., 2, 0] = M[..., 3, 1] = -CS
+    M[..., 2, 1] = -S * SK
+    M[..., 3, 0] = k * S**2
+    M[..., 4, 4] = M[..., 5, 5] = 1.0
+    M[..., 4, 5] = length * z_slip
+    return M
+
+
+def thin_matrices(k1l):
+    """Return the matrices of thin quadrupole kicks with integrated strengths k1l."""
+    M = np.zeros(np.shape(k1l) + (6, 6))
+    M[..., range(6), range(6)] = 1.0
+    M[..., 1, 0] = -k1l
+    M[..., 3, 2] = k1l
+    return M
+
+
+def element_strengths(table: FlatLattice, brho: float = None) -> dict:
+    """Return the per-element arrays that define the linear transfer matrices.
+
+    Args:
+        table: The flattened lattice
+        brho: Magnetic rigidity in T*m, to also include the magnetic field
+            coefficients (e.g. Bn1) in the normalized strengths
+
+    Returns:
+        A dict of arrays with the length, the reference bend strength g, the
+        integrated quadrupole strength k1l, the solenoid strength ksol, the
+        effective pole face angles e1 and e2, and the tilt of each element
+    """
+    k1l = table.KnL[:, 1].copy() if table.n_orders > 1 else np.zeros(len(table))
+    ksol = table.Ksol.copy()
+    if brho is not None:
+        if table.n_orders > 1:
+            k1l += table.BnL[:, 1] / brho
+        ksol += table.Bsol / brho
+
+    # Pole face angles of rectangular bends are relative to the rectangle
+    rectangular = table.kind_mask("RBend")
+    e1 = table.e1 + table.e1_rect + np.where(rectangular, table.angle / 2, 0.0)
+    e2 = table.e2 + table.e2_rect + np.where(rectangular, table.angle / 2, 0.0)
+
+    quad_tilt = table.tilt[:, 1] if table.n_orders > 1 else np.zeros(len(table))
+    tilt = np.where(table.g_ref != 0.0, table.tilt_ref, quad_tilt)
+
+    return {
+        "length": table.length,
+        "g": table.g_ref,
+        "k1l": k1l,
+        "ksol": ksol,
+        "e1": e1,
+        "e2": e2,
+        "tilt": tilt,
+    }
+
+
+def linear_matrices(strengths: dict, beta_gamma: float = None):
+    """Return the transfer matrices for the element arrays of element_strengths()."""
+    length = strengths["length"]
+    z_slip = 0.0 if beta_gamma is None else 1.0 / beta_gamma**2
+
+    M = np.empty(np.shape(length) + (6, 6))
+    thin = length == 0.0
+    solenoid = ~thin & (strengths["ksol"] != 0.0)
+    thick = ~thin & ~solenoid
+
+    if np.any(thick):
+        L = length[thick]
+        M[thick] = bend_matrices(
+            L,
+            strengths["g"][thick],
+            strengths["k1l"][thick] / L,
+            strengths["e1"][thick],
+            strengths["e2"][thick],
+            z_slip,
+        )
+    if np.any(solenoid):
+        M[solenoid] = solenoid_matrices(
+            length[solenoid], strengths["ksol"][solenoid], z_slip
+        )
+    if np.any(thin):
+        M[thin] = thin_matrices(strengths["k1l"][thin])
+
+    tilt = strengths["tilt"]
+    tilted = tilt != 0.0
+    if np.any(tilted):
+        R = _rotation(tilt[tilted])
+        M[tilted] = R.swapaxes(-1, -2) @ M[tilted] @ R
+    return M
+
+
+def transfer_matrices(
+    line, *, cumulative: bool = False, brho: float = None, beta_gamma: float = None
+):
+    """Return the linear transfer matrices of all elements of a line.
+
+    Args:
+        line: A BeamLine (or any line), or its FlatLattice
+        cumulative: Return the maps from the start of the line to the exit of
+            each element instead of the maps of the single elements
+        brho: Magnetic rigidity in T*m, to also include magnetic field
+            coefficients like Bn1 and Bsol in the element strengths
+        beta_gamma: Relativistic beta * gamma of the reference particle, for
+            the path length slippage; ultra-relativistic if not given
+
+    Returns:
+        An array of shape (number of elements, 6, 6), with one row per element
+        of the expanded line
+    """
+    table = get_table(line)
+    M = linear_matrices(element_strengths(table, brho), beta_gamma)
+    if cumulative:
+        M = cumulative_product(M)
+    return M
@@ -10,6 +10,8 @@ class ApertureParameters(BaseModel):
     @classmethod
     def validate_limits(cls, v):
         """Validate that limits are None or that min < max"""
+        if len(v) != 2:
+            raise ValueError("Limits must be a list of a lower and an upper limit")
         if v[0] is not None and v[1] is not None and v[0] >= v[1]:
             raise ValueError("Lower limit must be less than upper limit")
         return v
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict, model_validator
 from typing import Any
 
+from .MultipoleParameters import MultipoleParameters, decode_multipole_key
+
 # Valid parameter prefixes, their expected format and description
 _PARAMETER_PREFIXES = {
     "tilt": ("tiltN", "Tilt"),
@@ -13,15 +14,37 @@ def _validate_order(
     key_num: str, parameter_name: str, prefix: str, expected_format: str
 ) -> None:
     """Validate that the order number is a non-negative integer without leading zeros."""
-    error_msg = (
-        f"Invalid {parameter_name}: '{prefix}{key_num}'. "
-        f"Parameter must be of the form '{expected_format}', where 'N' is a non-negative integer without leading zeros."
-    )
     if not key_num.isdigit() or (key_num.startswith("0") and key_num != "0"):
-        raise ValueError(error_msg)
+        raise ValueError(
+            f"Invalid {parameter_name}: '{prefix}{key_num}'. "
+            f"Parameter must be of the form '{expected_format}', where 'N' is a non-negative integer without leading zeros."
+        )
+
+
+def _raise_invalid_key(key: str) -> None:
+    """Raise a ValueError that explains why a parameter name is invalid."""
+    # Check if key ends with 'L' for length-integrated values
+    is_length_integrated = key.endswith("L")
+    base_key = key[:-1] if is_length_integrated else key
+
+    # No length-integrated values allowed for tilt parameter
+    if is_length_integrated and base_key.startswith("tilt"):
+        raise ValueError(f"Invalid electric multipole parameter: '{key}'. ")
+
+    # Find matching prefix
+    for prefix, (expected_format, description) in _PARAMETER_PREFIXES.items():
+        if base_key.startswith(prefix):
+            key_num = base_key[len(prefix) :]
+            _validate_order(key_num, description, prefix, expected_format)
+            break
+    raise ValueError(
+        f"Invalid electric multipole parameter: '{key}'. "
+        f"Parameters must be of the form 'tiltN', 'EnN', or 'EsN' "
+        f"(with optional 'L' suffix for length-integrated), where 'N' is a non-negative integer."
+    )
 
 
-class ElectricMultipoleParameters(BaseModel):
+class ElectricMultipoleParameters(MultipoleParameters):
     """Electric multipole parameters
 
     Valid parameter formats:
@@ -33,31 +56,15 @@ class ElectricMultipoleParameters(BaseModel):
     Where N is a positive integer without leading zeros (except "0" itself).
     """
 
-    model_config = ConfigDict(extra="allow")
+    _PARAMETER_PREFIXES = _PARAMETER_PREFIXES
+    _NORMAL = "En"
+    _SKEW = "Es"
 
-    @model_validator(mode="before")
     @classmethod
     def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
         """Validate all parameter names match the expected multipole format."""
         for key in values:
-            # Check if key ends with 'L' for length-integrated values
-            is_length_integrated = key.endswith("L")
-            base_key = key[:-1] if is_length_integrated else key
-
-            # No length-integrated values allowed for tilt parameter
-            if is_length_integrated and base_key.startswith("tilt"):
-                raise ValueError(f"Invalid electric multipole parameter: '{key}'. ")
-
-            # Find matching prefix
-            for prefix, (expected_format, description) in _PARAMETER_PREFIXES.items():
-                if base_key.startswith(prefix):
-                    key_num = base_key[len(prefix) :]
-                    _validate_order(key_num, description, prefix, expected_format)
-                    break
-            else:
-                raise ValueError(
-                    f"Invalid electric multipole parameter: '{key}'. "
-                    f"Parameters must be of the form 'tiltN', 'EnN', or 'EsN' "
-                    f"(with optional 'L' suffix for length-integrated), where 'N' is a non-negative integer."
-                )
+            term = decode_multipole_key(key)
+            if term is None or term.component not in _PARAMETER_PREFIXES:
+                _raise_invalid_key(key)
         return values
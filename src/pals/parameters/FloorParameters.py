@@ -4,4 +4,9 @@ from pydantic import BaseModel
 class FloorParameters(BaseModel):
     """Floor position and orientation parameters"""
 
-    # Under construction
+    x: float = 0.0  # [m] Floor X position
+    y: float = 0.0  # [m] Floor Y position
+    z: float = 0.0  # [m] Floor Z position
+    theta: float = 0.0  # [radian] Azimuth angle, rotation around the floor Y axis
+    phi: float = 0.0  # [radian] Pitch angle, elevation above the floor X-Z plane
+    psi: float = 0.0  # [radian] Roll angle, rotation around the local z axis
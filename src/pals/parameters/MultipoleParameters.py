@@ -0,0 +1,289 @@
+"""Compact storage of multipole coefficients.
+
+Multipole parameter groups have keys like "Kn1", "Bs2L" or "tilt3" instead
+of fixed fields. Instead of a dict of extra fields per magnet, the
+coefficients of a group are stored as one array of floats in a private
+attribute of the pydantic model, together with a layout that is shared by
+all groups with the same keys. The layout holds the keys, which of the
+coefficients were given as integers, and their decoded (component, order,
+integrated) terms, so that consumers can read the coefficients by order
+without parsing the keys again.
+
+The groups still accept and emit the keys: they are constructed from
+keyword arguments like MagneticMultipoleParameters(Kn1=0.3), serialized to
+dicts like {"Kn1": 0.3} and their coefficients are read and assigned as
+attributes, e.g. params.Kn1.
+"""
+
+import numbers
+import re
+from array import array
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from pydantic import (
+    BaseModel,
+    PrivateAttr,
+    SerializationInfo,
+    model_serializer,
+    model_validator,
+)
+
+
+class MultipoleKey(NamedTuple):
+    """A decoded multipole key, e.g. "Kn1L" is MultipoleKey("Kn", 1, True)"""
+
+    component: str
+    order: int
+    integrated: bool
+
+
+# Multipole keys of all multipole parameter groups, like "Kn1", "Bs2L" or "tilt3"
+_MULTIPOLE_KEY = re.compile(r"(tilt|Bn|Bs|Kn|Ks|En|Es)(0|[1-9][0-9]*)(L?)")
+
+
+@lru_cache(maxsize=1024)
+def decode_multipole_key(key: str) -> Optional[MultipoleKey]:
+    """Decode a multipole key into its component, order and whether it is length-integrated.
+
+    Returns:
+        The decoded key, or None if the key is not a valid multipole key of
+        any multipole parameter group
+    """
+    match = _MULTIPOLE_KEY.fullmatch(key)
+    if match is None:
+        return None
+    component, order, integrated = match.groups()
+    # Tilts are not length-integrated
+    if integrated and component == "tilt":
+        return None
+    return MultipoleKey(component, int(order), integrated == "L")
+
+
+class _Layout:
+    """The keys of a multipole parameter group, which of them are integers, and their decoded terms"""
+
+    __slots__ = ("keys", "integers", "terms", "index")
+
+    def __init__(self, keys: tuple, integers: frozenset):
+        self.keys = keys
+        self.integers = integers
+        self.terms = tuple(decode_multipole_key(key) for key in keys)
+        self.index = {key: position for position, key in enumerate(keys)}
+
+    def __reduce__(self):
+        # Unpickled groups share their layouts, too
+        return _get_layout, (self.keys, self.integers)
+
+
+@lru_cache(maxsize=None)
+def _get_layout(keys: tuple, integers: frozenset = frozenset()) -> _Layout:
+    """Return the shared layout of the (valid) keys of multipole parameter groups."""
+    return _Layout(keys, integers)
+
+
+def _pack(values: dict) -> tuple:
+    """Return the layout and the array of the coefficients of a dict."""
+    # Integers are restored when they are read, all other reals are floats
+    integers = frozenset(
+        position
+        for position, value in enumerate(values.values())
+        if isinstance(value, numbers.Integral) and not isinstance(value, bool)
+    )
+    return _get_layout(tuple(values), integers), array("d", values.values())
+
+
+class MultipoleParameters(BaseModel):
+    """Base class of the multipole parameter groups, with compact storage
+
+    Subclasses define the valid key prefixes in _PARAMETER_PREFIXES, the
+    normal and skew components and a validate classmethod that checks keys.
+    """
+
+    # Valid parameter prefixes, their expected format and description
+    _PARAMETER_PREFIXES = {}
+
+    # Components returned by normal() and skew()
+    _NORMAL = None
+    _SKEW = None
+
+    # The keys of the coefficients and their values
+    _layout: Optional[_Layout] = PrivateAttr(default=None)
+    _values: Optional[array] = PrivateAttr(default=None)
+
+    @classmethod
+    def validate(cls, values: dict) -> dict:
+        """Validate all parameter names match the expected multipole format."""
+        return values
+
+    @classmethod
+    def _parse(cls, values) -> tuple:
+        """Validate a dict of coefficients into a layout and an array of values."""
+        if not isinstance(values, dict):
+            raise ValueError(
+                f"Multipole parameters must be a dict, but we got {values!r}"
+            )
+        for key, value in values.items():
+            if not isinstance(key, str):
+                raise ValueError(f"Invalid multipole parameter: {key!r}")
+            if isinstance(value, bool) or not isinstance(value, numbers.Real):
+                raise ValueError(
+                    f"Multipole parameter '{key}' must be a number, but we got {value!r}"
+                )
+        cls.validate(values)
+        return _pack(values)
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _validate_coefficients(cls, values, handler):
+        """Validate the coefficients, e.g. MagneticMultipoleParameters(Kn1=0.3)"""
+        if isinstance(values, cls):
+            return values
+        layout, data = cls._parse(values)
+        params = handler({})
+        params._layout = layout
+        params._values = data
+        return params
+
+    @model_serializer(mode="plain")
+    def _serialize(self, info: SerializationInfo) -> dict:
+        coefficients = dict(self)
+        if info.include is not None:
+            coefficients = {
+                key: value for key, value in coefficients.items() if key in info.include
+            }
+        if info.exclude is not None:
+            coefficients = {
+                key: value
+                for key, value in coefficients.items()
+                if key not in info.exclude
+            }
+        return coefficients
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, core_schema, handler):
+        return {
+            "title": cls.__name__,
+            "type": "object",
+            "additionalProperties": {"type": "number"},
+        }
+
+    @classmethod
+    def model_construct(cls, _fields_set: set = None, **values):
+        """Construct from trusted coefficients, without validation"""
+        params = super().model_construct(_fields_set)
+        params._layout, params._values = _pack(values)
+        return params
+
+    def _value(self, position: int):
+        value = self._values[position]
+        return int(value) if position in self._layout.integers else value
+
+    def __getattr__(self, name: str):
+        # Only called for names that are not regular attributes
+        if not name.startswith("_"):
+            layout = self._layout
+            position = None if layout is None else layout.index.get(name)
+            if position is not None:
+                return self._value(position)
+        return super().__getattr__(name)
+
+    def __setattr__(self, name: str, value):
+        """Assign (and validate) a coefficient, e.g. params.Kn1 = 0.3"""
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+            return
+        coefficients = dict(self)
+        coefficients[name] = value
+        # Copies share the array, so it is replaced instead of changed
+        params = type(self).model_validate(coefficients)
+        self._layout, self._values = params._layout, params._values
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        if self._layout is other._layout:
+            return self._values == other._values
+        return dict(self) == dict(other)
+
+    def __iter__(self):
+        """Iterate over the (key, value) pairs of the coefficients"""
+        layout = self._layout
+        if layout is None:
+            return iter(())
+        if not layout.integers:
+            return zip(layout.keys, self._values)
+        return zip(layout.keys, map(self._value, range(len(layout.keys))))
+
+    def __repr_args__(self):
+        return list(self)
+
+    @property
+    def model_extra(self) -> dict:
+        """The coefficients by key, like the extra fields of pydantic models"""
+        return dict(self)
+
+    def model_copy(self, *, update: dict = None, deep: bool = False):
+        """Return a copy, optionally with some coefficients updated (and validated)"""
+        if update:
+            return type(self).model_validate({**dict(self), **update})
+        return super().model_copy(deep=deep)
+
+    def terms(self):
+        """Iterate over the decoded coefficients as (component, order, integrated, value)
+
+        For example, Kn1L = 0.3 is returned as ("Kn", 1, True, 0.3). The
+        decoded keys are also available as MultipoleKey tuples via decoded_keys().
+        """
+        for (component, order, integrated), (_, value) in zip(self._layout.terms, self):
+            yield component, order, integrated, value
+
+    def decoded_keys(self) -> dict:
+        """Return the decoded keys, as {key: MultipoleKey}"""
+        return dict(zip(self._layout.keys, self._layout.terms))
+
+    def coefficient(
+        self, component: str, order: int, integrated: bool = False, default=0.0
+    ) -> float:
+        """Return one coefficient, e.g. coefficient("Kn", 1) for Kn1, or a default"""
+        key = f"{component}{order}{'L' if integrated else ''}"
+        position = self._layout.index.get(key)
+        return default if position is None else self._value(position)
+
+    def normal(self, order: int, integrated: bool = False) -> float:
+        """Return the normal component of an order, or 0 if it is not set"""
+        return self.coefficient(self._NORMAL, order, integrated)
+
+    def skew(self, order: int, integrated: bool = False) -> float:
+        """Return the skew component of an order, or 0 if it is not set"""
+        return self.coefficient(self._SKEW, order, integrated)
+
+    def tilt(self, order: int) -> float:
+        """Return the tilt of an order, or 0 if it is not set"""
+        return self.coefficient("tilt", order)
+
+    @property
+    def max_order(self) -> int:
+        """The highest order of all coefficients, or -1 without coefficients"""
+        return max((order for _, order, _ in self._layout.terms), default=-1)
+
+    def as_arrays(self) -> dict:
+        """Return the coefficients as dense arrays indexed by order, by component
+
+        The components are the prefixes (like "Kn") and their length-integrated
+        variants (like "KnL"). All arrays have max_order + 1 entries, which are
+        0 for coefficients that are not set.
+        """
+        import numpy as np
+
+        size = self.max_order + 1
+        arrays = {}
+        for prefix in self._PARAMETER_PREFIXES:
+            arrays[prefix] = np.zeros(size)
+            if prefix != "tilt":
+                arrays[prefix + "L"] = np.zeros(size)
+        for (component, order, integrated), value in zip(
+            self._layout.terms, self._values
+        ):
+            arrays[component + "L" if integrated else component][order] = value
+        return arrays
@@ -12,6 +12,11 @@ from .FloorShiftParameters import FloorShiftParameters  # noqa: F401
 from .ForkParameters import ForkParameters  # noqa: F401
 from .MagneticMultipoleParameters import MagneticMultipoleParameters  # noqa: F401
 from .MetaParameters import MetaParameters  # noqa: F401
+from .MultipoleParameters import (  # noqa: F401
+    MultipoleKey,
+    MultipoleParameters,
+    decode_multipole_key,
+)
 from .PatchParameters import PatchParameters  # noqa: F401
 from .ReferenceChangeParameters import ReferenceChangeParameters  # noqa: F401
 from .ReferenceParameters import ReferenceParameters  # noqa: F401
@@ -0,0 +1,278 @@
+"""Validation reports, which collect all problems of a lattice in one pass.
+
+BeamLine(**data) stops at the first invalid element of a lattice. validate
+instead checks every element definition of the raw data, including the
+elements of nested lines and unions, and collects all problems into a
+ValidationReport:
+
+- the schema errors of each element, as raised by its pydantic model
+- invalid list entries and references to undefined elements
+- elements whose name is already used by an earlier definition
+- aperture limits whose lower limit is not below the upper limit
+- quadrupoles without magnetic or electric multipole parameters
+- elements of kinds that are under construction in the PALS standard
+
+Each problem is reported with the JSON path of its location in the raw
+data, e.g. $.ring.line[3].quad.MagneticMultipoleP.Kn1.
+"""
+
+import json
+import os
+import re
+from typing import NamedTuple
+
+from pydantic import ValidationError
+
+from pals.kinds import BeamLine
+from pals.kinds.mixin import BaseElement
+from pals.kinds.mixin.all_element_mixin import ELEMENT_LIST_FIELDS, is_repetition
+from pals.kinds.utils import is_under_construction, paused_gc
+
+# Names that are re-exported by the pals package
+__all__ = ["ValidationIssue", "ValidationReport", "json_path", "validate"]
+
+# Path components that are written as .key in JSON paths
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# Parameter group fields whose limits must be ordered
+_APERTURE_LIMITS = {("ApertureP", "x_limits"), ("ApertureP", "y_limits")}
+
+# Kinds that need magnetic or electric multipole parameters
+_MULTIPOLE_KINDS = {"Quadrupole"}
+
+
+def json_path(path: tuple) -> str:
+    """Return the JSON path of a location in the raw data, e.g. $.ring.line[3].quad"""
+    parts = ["$"]
+    for key in path:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        elif _IDENTIFIER.fullmatch(key):
+            parts.append(f".{key}")
+        else:
+            parts.append(f"[{json.dumps(key)}]")
+    return "".join(parts)
+
+
+class ValidationIssue(NamedTuple):
+    """A problem of a lattice, at the JSON path of its location"""
+
+    path: str
+    code: str
+    message: str
+    severity: str = "error"
+
+
+class ValidationReport:
+    """All problems of a lattice, as found by validate"""
+
+    def __init__(self, issues: list = None):
+        self.issues = [] if issues is None else issues
+
+    @property
+    def errors(self) -> list:
+        """The issues that make the lattice invalid"""
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    @property
+    def warnings(self) -> list:
+        """The issues that do not prevent loading the lattice"""
+        return [issue for issue in self.issues if issue.severity == "warning"]
+
+    @property
+    def ok(self) -> bool:
+        """Whether the lattice has no errors"""
+        return not self.errors
+
+    def __len__(self) -> int:
+        return len(self.issues)
+
+    def __iter__(self):
+        return iter(self.issues)
+
+    def to_dicts(self) -> list:
+        """Return the issues as dicts, e.g. for json.dumps"""
+        return [issue._asdict() for issue in self.issues]
+
+    def __str__(self) -> str:
+        if not self.issues:
+            return "No issues found"
+        return "\n".join(
+            f"{issue.severity}: {issue.path}: {issue.message} [{issue.code}]"
+            for issue in self.issues
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"ValidationReport({len(self.errors)} errors, "
+            f"{len(self.warnings)} warnings)"
+        )
+
+
+class _Checker:
+    """Walks the raw data of a lattice once, collecting its issues"""
+
+    def __init__(self):
+        from pals.kinds.all_elements import get_element_classes
+
+        self.classes = get_element_classes()
+        self.issues = []
+        # The elements defined so far (None if invalid) and their paths, by name
+        self.registry = {}
+
+    def add(self, path: tuple, code: str, message: str, severity: str = "error"):
+        self.issues.append(ValidationIssue(json_path(path), code, message, severity))
+
+    def check_entry(self, item, path: tuple):
+        """Check a list entry, returning its element or None if it is invalid."""
+        try:
+            return self._check_entry(item, path)
+        except Exception as error:
+            # Any other problem of the entry, e.g. a kind that is not a string
+            self.add(path, "invalid_entry", f"{type(error).__name__}: {error}")
+            return None
+
+    def _check_entry(self, item, path: tuple):
+        if isinstance(item, str):
+            if item not in self.registry:
+                self.add(
+                    path,
+                    "undefined_reference",
+                    f"Reference to undefined element {item!r}",
+                )
+                return None
+            return self.registry[item][1]
+
+        if isinstance(item, BaseElement):
+            self.define(item.name, path, item)
+            return item
+
+        if is_repetition(item):
+            fields = dict(item)
+            line = self.check_entry(fields.pop("line"), path + ("line",))
+            if line is None:
+                return None
+            return self.validate({"kind": "RepeatedLine", **fields, "line": line}, path)
+
+        if not isinstance(item, dict) or len(item) != 1:
+            self.add(
+                path,
+                "invalid_entry",
+                "Each element must be a dict with exactly one key (the element's name)",
+            )
+            return None
+        ((name, fields),) = item.items()
+        path = path + (name,)
+        if not isinstance(fields, dict):
+            self.add(
+                path,
+                "invalid_entry",
+                "The value of an element must be a dict (the element's properties)",
+            )
+            return None
+
+        kind = fields.get("kind")
+        fields = {**fields, "name": name}
+        list_field = ELEMENT_LIST_FIELDS.get(kind)
+        if list_field is not None and isinstance(fields.get(list_field), list):
+            for index, entry in enumerate(fields[list_field]):
+                self.check_entry(entry, path + (list_field, index))
+            # The container is checked without its entries
+            fields[list_field] = []
+        self.check_kind(kind, fields, path)
+        element = self.validate(fields, path)
+        # Containers are defined after their entries
+        self.define(name, path, element)
+        return element
+
+    def check_kind(self, kind, fields: dict, path: tuple):
+        """Check the lattice-level rules of a kind, which do not depend on the other fields."""
+        cls = self.classes.get(kind)
+        if cls is not None and is_under_construction(cls):
+            self.add(
+                path,
+                "under_construction",
+                f"The {kind} element is marked as 'Under Construction' in the PALS standard",
+                "warning",
+            )
+        if (
+            kind in _MULTIPOLE_KINDS
+            and fields.get("MagneticMultipoleP") is None
+            and fields.get("ElectricMultipoleP") is None
+        ):
+            self.add(
+                path,
+                "missing_multipoles",
+                "At least one of 'MagneticMultipoleP' or 'ElectricMultipoleP' must be specified",
+            )
+
+    def validate(self, fields: dict, path: tuple):
+        """Validate the fields of an element, returning the element or None if it is invalid."""
+        from pals.kinds.all_elements import validate_element_fields
+
+        try:
+            return validate_element_fields(fields)
+        except ValidationError as error:
+            self.add_validation_error(error, fields.get("kind"), path)
+        except Exception as error:
+            # E.g. an element list that is not a list
+            self.add(path, "invalid_entry", f"{type(error).__name__}: {error}")
+        return None
+
+    def add_validation_error(self, error: ValidationError, kind, path: tuple):
+        """Add the issues of the validation error of an element."""
+        for details in error.errors(include_url=False):
+            loc = details["loc"]
+            if loc[:1] == (kind,):
+                loc = loc[1:]
+            code, message = details["type"], details["msg"]
+            if code == "union_tag_invalid":
+                message = f"Unknown element kind {kind!r}"
+            elif code == "value_error" and loc[:2] in _APERTURE_LIMITS:
+                code = "aperture_limits"
+            elif code == "value_error" and not loc and kind in _MULTIPOLE_KINDS:
+                # Reported by check_kind
+                continue
+            self.add(path + loc, code, message)
+
+    def define(self, name: str, path: tuple, element):
+        """Register an element definition, checking that its name is new."""
+        previous = self.registry.get(name)
+        if previous is not None and (element is None or previous[1] is not element):
+            self.add(
+                path,
+                "duplicate_name",
+                f"Element name {name!r} is already defined at {json_path(previous[0])}",
+                "warning",
+            )
+        self.registry[name] = (path, element)
+
+
+def validate(path_or_data, fmt: str = None) -> ValidationReport:
+    """Check a whole lattice in one pass, collecting all problems instead of stopping at the first.
+
+    Args:
+        path_or_data: Path of a YAML or JSON file, or the data of a BeamLine
+            like for BeamLine(**data)
+        fmt: File format, "yaml" or "json", by default from the file extension
+
+    Returns:
+        The report of all problems, whose ok is True if the lattice is valid
+    """
+    if isinstance(path_or_data, (str, os.PathLike)):
+        from pals.io import load_data
+
+        data = load_data(path_or_data, fmt)
+    else:
+        data = path_or_data
+
+    checker = _Checker()
+    try:
+        entry = BeamLine._line_entry(data)
+    except ValueError as error:
+        checker.add((), "invalid_entry", str(error))
+        return ValidationReport(checker.issues)
+
+    with paused_gc():
+        checker.check_entry(entry, ())
+    return ValidationReport(checker.issues)
@@ -1,3 +1,5 @@
+import subprocess
+import sys
 import pytest
 from pydantic import ValidationError
 
@@ -511,3 +513,70 @@ def test_UnionEle():
     assert len(element_with_children.elements) == 2
     assert element_with_children.elements[0].name == "m1"
     assert element_with_children.elements[1].name == "d1"
+
+
+def test_lazy_import():
+    """Test that importing pals does not build the element models"""
+    code = (
+        "import sys, pals; "
+        "assert 'pydantic' not in sys.modules; "
+        "assert 'pals.kinds' not in sys.modules; "
+        "assert pals.Drift.__name__ == 'Drift'; "
+        "assert 'pals.kinds' in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+    # The re-exported names and subpackages are resolved on first access
+    assert pals.BeamLine is pals.kinds.BeamLine
+    assert pals.ApertureParameters is pals.parameters.ApertureParameters
+    assert "Drift" in dir(pals) and "Drift" in pals.__all__
+    with pytest.raises(AttributeError):
+        pals.NoSuchElement
+
+
+def test_register_kind():
+    """Test registering a custom element kind"""
+    from typing import Literal
+
+    from pals.io.cache import schema_fingerprint
+    from pals.kinds.mixin import ThickElement
+
+    fingerprint = schema_fingerprint()
+
+    class Septum(ThickElement):
+        """A custom septum element"""
+
+        kind: Literal["Septum"] = "Septum"
+
+    pals.register_kind(Septum)
+    try:
+        # Registering the same class again is a no-op
+        assert pals.register_kind(Septum) is Septum
+        line = pals.BeamLine(
+            name="line",
+            line=[
+                {"septum1": {"kind": "Septum", "length": 0.5}},
+                pals.Drift(name="drift", length=1.0),
+                "septum1",
+            ],
+        )
+        assert isinstance(line.line[0], Septum)
+        assert line.line[2] is line.line[0]
+        assert pals.BeamLine(**line.model_dump()) == line
+        # Other classes cannot reuse a registered kind
+        with pytest.raises(ValueError):
+
+            class OtherSeptum(ThickElement):
+                kind: Literal["Septum"] = "Septum"
+
+            pals.register_kind(OtherSeptum)
+    finally:
+        # Do not change the schema for the other tests
+        pals.unregister_kind(Septum)
+    assert schema_fingerprint() == fingerprint
+    with pytest.raises(ValidationError):
+        pals.BeamLine(name="line", line=[{"septum1": {"kind": "Septum"}}])
+    with pytest.raises(ValueError):
+        pals.unregister_kind(pals.Drift)
+    with pytest.raises(ValidationError) as error:
+        pals.BeamLine(name="line", line=[{"kicker": {"kind": "Septum2"}}])
+    assert error.value.errors()[0]["type"] == "union_tag_invalid"
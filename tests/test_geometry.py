@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import pals
+from pals.geometry import survey
+
+
+def make_ring(n_cells):
+    # Ring of FODO cells with two bends per cell, closing after n_cells
+    angle = np.pi / n_cells
+    bend = pals.SBend(
+        name="bend", length=2.0, BendP=pals.BendParameters(g_ref=angle / 2.0)
+    )
+    quad = pals.Quadrupole(
+        name="quad",
+        length=0.5,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=0.3),
+    )
+    drift = pals.Drift(name="drift", length=1.0)
+    cell = pals.BeamLine(name="cell", line=[quad, drift, bend, drift, quad, bend])
+    return pals.BeamLine(
+        name="ring", line=[pals.RepeatedLine(line=cell, repeat=n_cells)]
+    )
+
+
+def test_survey():
+    ring = make_ring(100)
+    floor = survey(ring)
+    assert len(floor) == 601
+    # The ring closes, with the orientation turned once
+    assert floor.X[-1] == pytest.approx(0.0, abs=1e-9)
+    assert floor.Z[-1] == pytest.approx(0.0, abs=1e-9)
+    assert np.allclose(floor.W[-1], np.eye(3))
+    # Bends with positive g_ref bend towards -x
+    assert floor.X[4] < 0.0
+    assert floor.theta[3] == pytest.approx(-np.pi / 100)
+    # Straight elements move along z
+    assert floor.Z[1] == pytest.approx(0.5)
+    assert np.allclose(np.linalg.norm(floor.quaternions(), axis=1), 1.0)
+    # Start position and orientation
+    start = pals.FloorParameters(x=1.0, y=2.0, theta=np.pi / 2)
+    shifted = survey(ring, start)
+    assert shifted.X[1] == pytest.approx(1.5)
+    assert shifted.Y[-1] == pytest.approx(2.0)
+
+
+def test_survey_patch():
+    patch = pals.Patch(
+        name="patch",
+        length=0.0,
+        PatchP=pals.PatchParameters(x_offset=0.1, y_rot=0.01),
+    )
+    drift = pals.Drift(name="drift", length=1.0)
+    line = pals.BeamLine(name="line", line=[drift, patch, drift])
+    floor = survey(line)
+    assert floor.X[2] == pytest.approx(0.1)
+    assert floor.X[3] == pytest.approx(0.1 + np.sin(0.01))
+    assert floor.theta[-1] == pytest.approx(0.01)
+    # Move the patch, updating only the downstream frames
+    patch.PatchP.x_offset = 0.2
+    floor.update(1)
+    assert floor.X[3] == pytest.approx(0.2 + np.sin(0.01))
+    assert np.allclose(floor.frames, survey(line).frames)
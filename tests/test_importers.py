@@ -0,0 +1,153 @@
+import math
+import os
+import pytest
+
+import pals
+import pals.importers
+
+
+def test_madx_sequence():
+    strengths_file = "madx_strengths.madx"
+    with open(strengths_file, "w") as file:
+        file.write("kqf := 0.3 * scale; ! deferred\nreturn;\nkqf = 1;\n")
+    lattice_file = "madx_lattice.madx"
+    with open(lattice_file, "w") as file:
+        file.write(
+            f"""
+            call, file="{strengths_file}";
+            scale = 1;
+            QF: QUADRUPOLE, L=0.5, K1:=kqf;
+            qd: qf, k1:=-kqf;
+            mb: sbend, l=2, angle=twopi/8;
+            m: marker;
+            /* Elements are placed at their centres by default */
+            ring: sequence, l=10;
+              m, at=0;
+              qf, at=1;
+              mb, at=2.5, from=qf;
+              qd.1: qd, at=6;
+            endsequence;
+            scale = 2;
+            use, sequence=ring;
+            """
+        )
+    ring = pals.importers.madx.load(lattice_file)
+    os.remove(lattice_file)
+    os.remove(strengths_file)
+    assert ring.name == "ring"
+    assert [element.kind for element in ring.line] == [
+        "Marker",
+        "Drift",
+        "Quadrupole",
+        "Drift",
+        "SBend",
+        "Drift",
+        "Quadrupole",
+        "Drift",
+    ]
+    assert [element.length for element in ring.line[1::2]] == [0.75, 1.25, 1.25, 3.75]
+    # Deferred expressions use the values at the end of the file
+    assert ring.line[2].MagneticMultipoleP.Kn1 == pytest.approx(0.6)
+    assert ring.line[6].name == "qd.1"
+    assert ring.line[6].MagneticMultipoleP.Kn1 == pytest.approx(-0.6)
+    assert ring.line[4].BendP.g_ref == pytest.approx(math.pi / 8)
+    # Drifts of equal lengths are shared
+    assert ring.line[3] is ring.line[5]
+
+
+def test_madx_line():
+    line = pals.importers.madx.loads(
+        """
+        qf: quadrupole, l=0.5, k1=0.3;
+        qd: quadrupole, l=0.5, k1=-0.3, tilt=0.1;
+        d: drift, l=1;
+        mult: multipole, knl={0, 0.01}, ksl={0, 0, 0.1};
+        hk: hkicker, kick=1e-4;
+        cav: rfcavity, l=1, volt=2, freq=500, lag=0.25;
+        cell: line=(qf, d, qd, d);
+        ring: line=(mult, 3*cell, -cell, 2*(hk, d), cav);
+        """
+    )
+    assert line.name == "ring"
+    mult, repeated, reflected, group, cav = line.line
+    assert mult.MagneticMultipoleP.model_dump() == {"Kn1L": 0.01, "Ks2L": 0.1}
+    assert repeated.repeat == 3 and not repeated.reverse
+    assert reflected.reverse
+    # Repeated definitions share one element
+    cell = repeated.line
+    assert reflected.line is cell
+    assert cell.line[1] is cell.line[3]
+    assert cell.line[2].MagneticMultipoleP.tilt1 == 0.1
+    assert group.repeat == 2
+    assert group.line.line[0].MagneticMultipoleP.Kn0L == -1e-4
+    assert cav.RFP.voltage == 2e6
+    assert cav.RFP.phase == pytest.approx(math.pi / 2)
+    # The lines can be written and read again
+    assert pals.BeamLine(**line.model_dump()) == line
+    # Errors refer to the line of the statement
+    with pytest.raises(ValueError, match=r"<string>:3: Invalid expression"):
+        pals.importers.madx.loads("a = 1;\n\nb = a +* 2;")
+    # Commands that do not change the lattice are ignored, sequence editing is an error
+    line = pals.importers.madx.loads(
+        "option, -echo;\nbeam, particle=proton;\nd: drift, l=1;\nl: line=(d);"
+    )
+    assert len(line.line) == 1
+    with pytest.raises(ValueError, match=r"<string>:2: Sequence editing"):
+        pals.importers.madx.loads("d: drift, l=1;\nseqedit, sequence=ring;")
+    with pytest.raises(ValueError, match=r"Unknown command MAKETHIN"):
+        pals.importers.madx.loads("makethin, sequence=ring;")
+
+
+def test_elegant_line():
+    included_file = "elegant_strengths.lte"
+    with open(included_file, "w") as file:
+        file.write("% 1.2 sto kq\n")
+    lattice_file = "elegant_lattice.lte"
+    with open(lattice_file, "w") as file:
+        file.write(
+            f"""
+            #include: {included_file}
+            ! Quadrupoles of the FODO cell
+            QF: KQUAD, L=0.5, K1="kq", TILT=0.1
+            qd: QUADRUPOLE, L=0.5, K1="kq chs"
+            D: DRIF, L=1.0
+            B: CSBEND, L=2.0, ANGLE="pi 8 /", &
+                E1=0.1, E2=0.2
+            RF: RFCA, L=0.3, VOLT=1e6, FREQ=500e6, PHASE=90
+            W: WATCH, FILENAME="%s.w1"
+            CELL: LINE=(QF, D, B, D, QD, D, B, D)
+            RING: LINE=(W, 5000*CELL, -CELL, 2*(RF, D), CELL)
+            USE,RING
+            RETURN
+            """
+        )
+    ring = pals.importers.elegant.load(lattice_file)
+    os.remove(lattice_file)
+    os.remove(included_file)
+    assert ring.name == "RING"
+    marker, repeated, reflected, group, cell = ring.line
+    assert marker.kind == "Marker"
+    # The cells are shared, not copied
+    assert repeated.repeat == 5000 and not repeated.reverse
+    assert reflected.reverse
+    assert repeated.line is cell and reflected.line is cell
+    assert cell.line[1] is cell.line[3]
+    qf, qd, bend = cell.line[0], cell.line[4], cell.line[2]
+    assert qf.MagneticMultipoleP.model_dump() == {"Kn1": 1.2, "tilt1": 0.1}
+    assert qd.MagneticMultipoleP.Kn1 == -1.2
+    assert bend.kind == "SBend"
+    assert bend.BendP.g_ref == pytest.approx(math.pi / 16)
+    assert bend.BendP.e2 == 0.2
+    rf = group.line.line[0]
+    assert rf.RFP.phase == pytest.approx(math.pi / 2)
+    assert pals.BeamLine(**ring.model_dump()) == ring
+    # Unknown element types are imported with a warning
+    with pytest.warns(UserWarning, match="SPECIAL"):
+        line = pals.importers.elegant.loads("S: SPECIAL, L=1\nL1: LINE=(S)")
+    assert line.line[0].kind == "Drift"
+    # Rectangular bends also have their chord length
+    line = pals.importers.elegant.loads("B: RBEN, L=1.0, ANGLE=0.1\nL1: LINE=(B)")
+    assert line.line[0].BendP.L_chord == pytest.approx(20 * math.sin(0.05))
+    # Invalid RPN expressions are errors, with the line of the definition
+    with pytest.raises(ValueError, match=r"<string>:2: Unknown name 'kq'"):
+        pals.importers.elegant.loads('D: DRIF, L=1\nQ: QUAD, L=0.5, K1="kq 2 *"')
@@ -0,0 +1,473 @@
+import json
+import numpy as np
+import os
+import pytest
+import yaml
+from pydantic import ValidationError
+
+import pals
+import pals.io
+import pals.io.cache
+
+
+def make_fodo_line():
+    # Create a FODO line with a nested line and line-level parameters
+    drift1 = pals.Drift(name="drift1", length=0.25)
+    quad1 = pals.Quadrupole(
+        name="quad1",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=1.2e-3),
+    )
+    drift2 = pals.Drift(name="drift2", length=0.5)
+    quad2 = pals.Quadrupole(
+        name="quad2",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=-1.2e-3),
+    )
+    markers = pals.BeamLine(name="markers", line=[pals.Marker(name="marker1")])
+    return pals.BeamLine(
+        name="fodo_cell",
+        line=[drift1, quad1, drift2, quad2, markers],
+        MetaP=pals.MetaParameters(label="fodo"),
+    )
+
+
+def test_load_streaming_yaml():
+    line = make_fodo_line()
+    # Write the YAML data to a test file
+    test_file = "streaming_line.yaml"
+    with open(test_file, "w") as file:
+        file.write(yaml.dump(line.model_dump(), default_flow_style=False))
+    # Iterate over the elements without materializing the BeamLine
+    names = [elem.name for elem in pals.io.iter_elements(test_file)]
+    assert names == ["drift1", "quad1", "drift2", "quad2", "markers"]
+    # Load the whole BeamLine
+    loaded_line = pals.io.load_streaming(test_file)
+    # Remove the test file
+    os.remove(test_file)
+    # Validate loaded BeamLine object
+    assert line == loaded_line
+
+
+def test_load_streaming_json():
+    line = make_fodo_line()
+    # Write the JSON data to a test file
+    test_file = "streaming_line.json"
+    with open(test_file, "w") as file:
+        file.write(json.dumps(line.model_dump(), sort_keys=True, indent=2))
+    # Iterate over the elements without materializing the BeamLine
+    elements = list(pals.io.iter_elements(test_file))
+    assert [elem.kind for elem in elements] == [
+        "Drift",
+        "Quadrupole",
+        "Drift",
+        "Quadrupole",
+        "BeamLine",
+    ]
+    assert elements[1].MagneticMultipoleP.Kn1 == 1.2e-3
+    # Load the whole BeamLine
+    loaded_line = pals.io.load_streaming(test_file)
+    # Remove the test file
+    os.remove(test_file)
+    # Validate loaded BeamLine object
+    assert line == loaded_line
+
+
+def test_load_trusted():
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[pals.RepeatedLine(line=line, repeat=10), line.line[1]],
+    )
+    # Construct without validation, with the same result as with validation
+    data = ring.model_dump()
+    trusted_ring = pals.BeamLine.from_trusted(data)
+    assert trusted_ring == ring
+    assert isinstance(trusted_ring.line[0].line.line[1], pals.Quadrupole)
+    assert isinstance(
+        trusted_ring.line[0].line.line[1].MagneticMultipoleP,
+        pals.MagneticMultipoleParameters,
+    )
+    assert trusted_ring.line[1] is trusted_ring.line[0].line.line[1]
+    # Write the YAML data to a test file
+    test_file = "trusted_ring.yaml"
+    with open(test_file, "w") as file:
+        file.write(yaml.dump(data, default_flow_style=False))
+    # Without a checksum, the file is validated
+    assert not pals.io.has_valid_checksum(test_file)
+    assert pals.io.load(test_file, trusted=True) == ring
+    # With a matching checksum, the fast path is used
+    pals.io.write_checksum(test_file)
+    assert pals.io.has_valid_checksum(test_file)
+    assert pals.io.load(test_file, trusted=True) == ring
+    # Changed files are validated again
+    with open(test_file, "a") as file:
+        file.write("\n")
+    assert not pals.io.has_valid_checksum(test_file)
+    assert pals.io.load(test_file, trusted=True) == ring
+    # Remove the test files
+    os.remove(test_file)
+    os.remove(test_file + ".sha256")
+
+
+def test_load_lazy():
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[pals.RepeatedLine(line=line, repeat=10), line.line[1]],
+    )
+    data = ring.model_dump()
+    lazy_ring = pals.BeamLine.lazy(data)
+    # Entries are validated on first access through the view
+    elements = lazy_ring.lazy_elements()
+    assert len(elements) == 2
+    assert not elements.is_validated()
+    cell = elements[0].line
+    cell_elements = cell.lazy_elements()
+    assert isinstance(cell_elements[1], pals.Quadrupole)
+    assert not cell_elements.is_validated()
+    # References still share the same element
+    assert elements[1] is cell_elements[1]
+    # Using the element lists validates all entries
+    assert lazy_ring.model_dump() == data
+    assert cell_elements.is_validated()
+    assert cell.line[1] is elements[1]
+    assert lazy_ring.lazy_elements() is lazy_ring.line
+    assert lazy_ring.validate_all() is lazy_ring
+    assert pals.BeamLine.lazy(data) == ring
+    assert pals.BeamLine.lazy(data).to_json_bytes() == ring.to_json_bytes()
+    assert list(pals.BeamLine.lazy(data).s_positions) == list(ring.s_positions)
+    # Invalid entries fail on access
+    lazy_line = pals.BeamLine.lazy(
+        {
+            "line": {
+                "line": [
+                    {"drift": {"kind": "Drift", "length": 1.0}},
+                    {"quad": {"kind": "Quadrupole"}},
+                ]
+            }
+        }
+    )
+    assert lazy_line.lazy_elements()[0].length == 1.0
+    with pytest.raises(ValidationError) as error:
+        lazy_line.lazy_elements()[1]
+    assert error.value.errors()[0]["loc"] == ("line", 1, "Quadrupole", "length")
+    # Load a file lazily
+    test_file = "lazy_ring.yaml"
+    pals.io.dump(ring, test_file)
+    lazy_ring = pals.io.load(test_file, lazy=True)
+    pals.io.dump(lazy_ring, test_file)
+    assert pals.io.load(test_file) == ring
+    with pytest.raises(ValueError):
+        pals.io.load(test_file, lazy=True, intern=True)
+    os.remove(test_file)
+
+
+def test_load_parallel(monkeypatch):
+    import pals.kinds.mixin.parallel
+
+    # Use a worker pool even for small lines
+    monkeypatch.setattr(pals.kinds.mixin.parallel, "MIN_CHUNK_SIZE", 1)
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[pals.RepeatedLine(line=line, repeat=10), line.line[1]],
+    )
+    data = ring.model_dump()
+    parallel_ring = pals.BeamLine.validate_parallel(data, workers=2)
+    assert parallel_ring == ring
+    # References still share the same element
+    assert parallel_ring.line[1] is parallel_ring.line[0].line.line[1]
+    # Errors are reported like in the serial validation
+    data = {
+        "line": {
+            "line": [
+                {"drift": {"kind": "Drift", "length": 1.0}},
+                {"quad": {"kind": "Quadrupole"}},
+            ]
+        }
+    }
+    with pytest.raises(ValidationError) as serial_error:
+        pals.BeamLine(**data)
+    with pytest.raises(ValidationError) as parallel_error:
+        pals.BeamLine.validate_parallel(data, workers=2)
+    assert parallel_error.value.errors() == serial_error.value.errors()
+    assert parallel_error.value.errors()[0]["loc"] == (
+        "line",
+        1,
+        "Quadrupole",
+        "length",
+    )
+    # Invalid fields of lines are reported before the invalid elements after them
+    data = {
+        "line": {
+            "line": [
+                {
+                    "cell": {
+                        "kind": "BeamLine",
+                        "ApertureP": {"x_limits": [1.0, -1.0]},
+                        "line": [{"drift": {"kind": "Drift", "length": 1.0}}],
+                    }
+                },
+                {"quad": {"kind": "Quadrupole"}},
+            ]
+        }
+    }
+    with pytest.raises(ValidationError) as parallel_error:
+        pals.BeamLine.validate_parallel(data, workers=2)
+    assert parallel_error.value.errors()[0]["loc"][:4] == (
+        "line",
+        0,
+        "BeamLine",
+        "ApertureP",
+    )
+    # Undefined references are validation errors at the same location too
+    data = {
+        "line": {
+            "line": [
+                {"drift": {"kind": "Drift", "length": 1.0}},
+                {"cell": {"kind": "BeamLine", "line": ["drift", "undefined"]}},
+            ]
+        }
+    }
+    with pytest.raises(ValidationError) as serial_error:
+        pals.BeamLine(**data)
+    with pytest.raises(ValidationError) as parallel_error:
+        pals.BeamLine.validate_parallel(data, workers=2)
+    assert parallel_error.value.errors()[0]["loc"] == ("line", 1, "BeamLine")
+    assert parallel_error.value.errors(include_context=False) == (
+        serial_error.value.errors(include_context=False)
+    )
+    # Load a file in parallel
+    test_file = "parallel_ring.json"
+    pals.io.dump(ring, test_file)
+    assert pals.io.load(test_file, workers=2) == ring
+    os.remove(test_file)
+
+
+def test_dump():
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[
+            pals.RepeatedLine(line=line, repeat=10),
+            pals.RepeatedLine(line=line, reverse=True),
+            line.line[1],
+        ],
+    )
+    # The dump is the same as with yaml.dump and json.dumps
+    data = ring.model_dump()
+    assert data["ring"]["line"][1] == {
+        "repeat": 1,
+        "line": "fodo_cell",
+        "reverse": True,
+    }
+    assert data["ring"]["line"][2] == "quad1"
+    yaml_data = yaml.dump(data, default_flow_style=False)
+    json_data = json.dumps(data, sort_keys=True, indent=2)
+    assert pals.io.dumps(ring) == yaml_data
+    assert pals.io.dumps(ring, "json") == json_data
+    # Write the files, with a checksum for the JSON file
+    for test_file, content in (("ring.yaml", yaml_data), ("ring.json", json_data)):
+        pals.io.dump(ring, test_file, checksum=test_file.endswith(".json"))
+        with open(test_file) as file:
+            assert file.read() == content
+        assert pals.io.load(test_file, trusted=True) == ring
+        os.remove(test_file)
+    assert pals.io.has_valid_checksum("ring.json", json_data.encode())
+    os.remove("ring.json.sha256")
+
+
+def test_write_json():
+    line = make_fodo_line()
+    # Write to a path and to a binary file object
+    test_file = "line.json"
+    pals.io.write_json(line, test_file)
+    assert pals.io.load(test_file) == line
+    with open(test_file, "wb") as file:
+        pals.io.write_json(line, file)
+    with open(test_file, "rb") as file:
+        assert file.read() == line.to_json_bytes()
+    # Remove the test file
+    os.remove(test_file)
+
+
+def test_stream_writer():
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[line, pals.RepeatedLine(line=line, repeat=10), line.line[1]],
+        MetaP=pals.MetaParameters(label="ring"),
+    )
+    for test_file in ("ring.yaml", "ring.json"):
+        # Write a BeamLine, with the same content as the regular dump
+        pals.io.dump_streaming(ring, test_file, chunk_size=100)
+        with open(test_file) as file:
+            assert file.read() == pals.io.dumps(ring, test_file.split(".")[1])
+        assert pals.io.load(test_file) == ring
+        # Write the elements of a generator
+        with pals.io.StreamWriter(test_file, "drifts") as writer:
+            writer.write_elements(
+                pals.Drift(name=f"drift{index}", length=1.0) for index in range(5)
+            )
+        assert writer.count == 5
+        assert len(pals.io.load_streaming(test_file).line) == 5
+        # Write a line without elements
+        with pals.io.StreamWriter(test_file, "empty"):
+            pass
+        assert pals.io.load(test_file).line == []
+        # Remove the test file
+        os.remove(test_file)
+        # Errors while writing leave no truncated file behind
+        with pytest.raises(RuntimeError):
+            with pals.io.StreamWriter(test_file, "drifts") as writer:
+                writer.write(pals.Drift(name="drift", length=1.0))
+                raise RuntimeError("Interrupted")
+        assert not os.path.exists(test_file)
+        with pytest.raises(ValueError):
+            pals.io.StreamWriter(test_file, "drifts", MetaP=1.0)
+        assert not os.path.exists(test_file)
+
+
+def test_columnar():
+    line = make_fodo_line()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[
+            pals.RepeatedLine(line=line, repeat=10, reverse=True),
+            pals.UnionEle(name="union", elements=[line.line[1], pals.Marker(name="m")]),
+            pals.SBend(
+                name="bend",
+                length=2.0,
+                BendP=pals.BendParameters(g_ref=0.01),
+                MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=0.1, Ks2L=1),
+            ),
+        ],
+        MetaP=pals.MetaParameters(label="ring"),
+    )
+    test_dir = "ring_columnar"
+    pals.io.write_columnar(ring, test_dir)
+    # The columns are memory-mapped, with one row per element definition
+    lattice = pals.io.ColumnarLattice(test_dir)
+    assert lattice.n_rows == 12
+    assert lattice.names()[:3] == ["ring", "", "fodo_cell"]
+    assert list(lattice.kinds()[:3]) == ["BeamLine", "RepeatedLine", "BeamLine"]
+    assert isinstance(lattice["length"], np.memmap)
+    assert lattice["multipole_value"].tolist() == [1.2e-3, -1.2e-3, 0.1]
+    # Same BeamLine as from the YAML file, with shared elements
+    yaml_ring = pals.BeamLine(**yaml.safe_load(pals.io.dumps(ring)))
+    for loaded_ring in (
+        pals.io.read_columnar(test_dir),
+        pals.io.read_columnar(test_dir, trusted=True),
+    ):
+        assert loaded_ring == ring
+        assert loaded_ring == yaml_ring
+        assert loaded_ring.line[1].elements[0] is loaded_ring.line[0].line.line[1]
+    # Remove the test directory
+    for name in os.listdir(test_dir):
+        os.remove(os.path.join(test_dir, name))
+    os.rmdir(test_dir)
+
+
+def test_load_cache(monkeypatch):
+    cache_dir = os.path.abspath("pals_cache")
+    monkeypatch.setenv("PALS_CACHE_DIR", cache_dir)
+    pals.io.clear_cache()
+    line = make_fodo_line()
+    ring = pals.BeamLine(name="ring", line=[line, line.line[1]])
+    test_file = "cached_ring.yaml"
+    pals.io.dump(ring, test_file)
+    # The first load validates the file and fills the cache
+    assert pals.io.load(test_file, cache=True) == ring
+    assert len(os.listdir(cache_dir)) == 1
+    # Cache hits are neither parsed nor validated again
+    monkeypatch.setattr(pals.io.files, "parse", None)
+    loaded_ring = pals.io.load(test_file, cache=True)
+    assert loaded_ring == ring
+    assert loaded_ring.line[1] is loaded_ring.line[0].line[1]
+    monkeypatch.undo()
+    monkeypatch.setenv("PALS_CACHE_DIR", cache_dir)
+    # Changed files are cached separately
+    pals.io.dump(line, test_file)
+    assert pals.io.load(test_file, cache=True) == line
+    entries = sorted(
+        os.listdir(cache_dir),
+        key=lambda name: os.path.getmtime(os.path.join(cache_dir, name)),
+    )
+    assert len(entries) == 2
+    # Trusted files are not validated, so they are not cached
+    with open(test_file, "w") as file:
+        file.write(
+            "invalid:\n  kind: BeamLine\n  line:\n  - drift:\n      kind: Drift\n"
+        )
+    pals.io.write_checksum(test_file)
+    assert pals.io.load(test_file, trusted=True, cache=True).name == "invalid"
+    assert len(os.listdir(cache_dir)) == 2
+    with pytest.raises(ValidationError):
+        pals.io.load(test_file, cache=True)
+    os.remove(test_file + ".sha256")
+    # The least recently used entries are evicted first
+    newest_size = os.path.getsize(os.path.join(cache_dir, entries[1]))
+    pals.io.cache.evict(max_size=newest_size)
+    assert os.listdir(cache_dir) == entries[1:]
+    # Remove the test file and the cache
+    os.remove(test_file)
+    pals.io.clear_cache()
+    assert os.listdir(cache_dir) == []
+    os.rmdir(cache_dir)
+
+
+def test_validate_report():
+    data = {
+        "ring": {
+            "line": [
+                {"drift": {"kind": "Drift", "length": "long"}},
+                {"quad": {"kind": "Quadrupole", "length": 1.0}},
+                {
+                    "drift": {
+                        "kind": "Drift",
+                        "length": 1.0,
+                        "ApertureP": {"x_limits": [1.0, -1.0]},
+                    }
+                },
+                {"sext": {"kind": "Sextupole", "length": 1.0}},
+                {"union": {"kind": "UnionEle", "elements": ["missing"]}},
+                {"repeat": 0, "line": "sext"},
+            ]
+        }
+    }
+    # All problems are collected in one pass
+    report = pals.validate(data)
+    assert not report.ok
+    assert [(issue.path, issue.code) for issue in report.errors] == [
+        ("$.ring.line[0].drift.length", "float_parsing"),
+        ("$.ring.line[1].quad", "missing_multipoles"),
+        ("$.ring.line[2].drift.ApertureP.x_limits", "aperture_limits"),
+        ("$.ring.line[4].union.elements[0]", "undefined_reference"),
+        ("$.ring.line[5].repeat", "greater_than_equal"),
+    ]
+    assert [(issue.path, issue.code) for issue in report.warnings] == [
+        ("$.ring.line[2].drift", "duplicate_name"),
+        ("$.ring.line[3].sext", "under_construction"),
+    ]
+    assert json.loads(json.dumps(report.to_dicts()))[0]["code"] == "float_parsing"
+    # Other problems of an element are reported at its location, too
+    report = pals.validate({"ring": {"line": "notalist"}})
+    assert [(issue.path, issue.code) for issue in report] == [
+        ("$.ring", "invalid_entry")
+    ]
+    report = pals.validate(
+        {
+            "ring": {
+                "line": [{"drift": {"kind": "Drift", "ApertureP": {"x_limits": [1.0]}}}]
+            }
+        }
+    )
+    assert report.errors[0].path == "$.ring.line[0].drift.ApertureP.x_limits"
+    # Valid files have no issues
+    test_file = "validate_fodo.yaml"
+    pals.io.dump(make_fodo_line(), test_file)
+    report = pals.validate(test_file)
+    assert report.ok
+    assert len(report) == 0
+    os.remove(test_file)
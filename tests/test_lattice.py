@@ -0,0 +1,164 @@
+import gc
+import pytest
+import weakref
+import yaml
+
+import pals
+from pals.lattice import get_position_index
+
+
+def make_fodo_cell():
+    # Create a FODO cell with a marker at the entrance
+    marker = pals.Marker(name="marker")
+    quad_f = pals.Quadrupole(
+        name="quad_f",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=1.2),
+    )
+    drift = pals.Drift(name="drift", length=2.0)
+    quad_d = pals.Quadrupole(
+        name="quad_d",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=-1.2),
+    )
+    return pals.BeamLine(name="fodo_cell", line=[marker, quad_f, drift, quad_d, drift])
+
+
+def test_RepeatedLine():
+    cell = make_fodo_cell()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[
+            pals.RepeatedLine(line=cell, repeat=200),
+            pals.RepeatedLine(line=cell, reverse=True),
+        ],
+    )
+    # The repeated line is shared, not copied
+    assert ring.line[0].line is cell
+    assert ring.line[1].line is cell
+    # Serialize the BeamLine object to YAML
+    ring_dict = ring.model_dump()
+    yaml_data = yaml.dump(ring_dict, default_flow_style=False)
+    print(f"\n{yaml_data}")
+    assert ring_dict["ring"]["line"][1] == {
+        "repeat": 1,
+        "line": "fodo_cell",
+        "reverse": True,
+    }
+    # Parse the YAML data back into a BeamLine object
+    loaded_ring = pals.BeamLine(**yaml.safe_load(yaml_data))
+    assert ring == loaded_ring
+    assert loaded_ring.line[1].line is loaded_ring.line[0].line
+    # Repetitions must be at least one
+    with pytest.raises(ValueError):
+        pals.BeamLine(name="line", line=[{"repeat": 0, "line": cell}])
+
+
+def test_ExpandedLine():
+    cell = make_fodo_cell()
+    ring = pals.BeamLine(
+        name="ring",
+        line=[
+            pals.RepeatedLine(line=cell, repeat=10000),
+            pals.RepeatedLine(line=cell, reverse=True),
+        ],
+    )
+    expanded = ring.expand()
+    # Lengths are computed without expanding the repetitions
+    assert len(expanded) == 10001 * 5
+    assert expanded.length == pytest.approx(10001 * 6.0)
+    # Indexing, also into the reversed cell at the end
+    assert expanded[0].name == "marker"
+    assert expanded[6].name == "quad_f"
+    assert expanded[-1].name == "marker"
+    assert expanded[-2].name == "quad_f"
+    assert [elem.name for elem in expanded[-5:]] == [
+        "drift",
+        "quad_d",
+        "drift",
+        "quad_f",
+        "marker",
+    ]
+    # s-positions of the elements
+    assert expanded.s_position(7) == pytest.approx(7.0)
+    assert expanded.s_position(-2) == pytest.approx(10001 * 6.0 - 1.0)
+    # Elements at positions s, with the downstream element at boundaries
+    assert expanded.element_at(6.0 * 500 + 0.5).name == "quad_f"
+    assert expanded.element_at(6.0 * 500 + 1.0).name == "drift"
+    assert expanded.index_at(10001 * 6.0) == len(expanded) - 1
+    with pytest.raises(ValueError):
+        expanded.index_at(-1.0)
+    # Iteration matches indexing
+    short_ring = pals.BeamLine(
+        name="short_ring",
+        line=[pals.RepeatedLine(line=cell, repeat=3, reverse=True), cell],
+    )
+    expanded = short_ring.expand()
+    assert list(expanded) == [expanded[i] for i in range(len(expanded))]
+    assert list(reversed(expanded)) == list(expanded)[::-1]
+
+
+def test_FlatLattice():
+    cell = make_fodo_cell()
+    cell.line[1].ApertureP = pals.ApertureParameters(x_limits=[-0.05, 0.05])
+    bend = pals.SBend(name="bend", length=2.0, BendP=pals.BendParameters(g_ref=0.1))
+    ring = pals.BeamLine(
+        name="ring",
+        line=[pals.RepeatedLine(line=cell, repeat=1000), bend],
+    )
+    table = ring.to_table()
+    assert len(table) == 5001
+    # Kinds and names
+    assert table.kind_names[table.kind[1]] == "Quadrupole"
+    assert table.kind_mask("Quadrupole").sum() == 2000
+    assert table.kind_mask("Wiggler").sum() == 0
+    assert list(table.element_names()[:3]) == ["marker", "quad_f", "drift"]
+    # Lengths and positions
+    assert table.s[5] == pytest.approx(6.0)
+    assert table.s_end[-1] == pytest.approx(6002.0)
+    # Multipole coefficients are length-integrated
+    assert table.KnL[1, 1] == pytest.approx(1.2)
+    assert table.KnL[3, 1] == pytest.approx(-1.2)
+    assert table.KnL[2, 1] == 0.0
+    # Bend and aperture parameters
+    assert table.angle[-1] == pytest.approx(0.2)
+    assert table.x_max[1] == pytest.approx(0.05)
+    assert table.x_max[0] == float("inf")
+    # Back-references to the elements
+    assert table.elements[1] is cell.line[1]
+    assert table.elements[-1] is bend
+
+
+def test_s_positions():
+    cell = make_fodo_cell()
+    ring = pals.BeamLine(name="ring", line=[pals.RepeatedLine(line=cell, repeat=100)])
+    # Prefix sum over the element lengths of the expanded line
+    assert len(ring.s_positions) == 501
+    assert ring.s_positions[-1] == pytest.approx(600.0)
+    # Elements at positions s, with the downstream element at boundaries
+    assert ring.element_at(6.0 * 50 + 0.5).name == "quad_f"
+    assert ring.element_at(6.0 * 50 + 1.0).name == "drift"
+    assert ring.element_at(600.0).name == "drift"
+    with pytest.raises(ValueError):
+        ring.element_at(600.5)
+    # Elements between two positions
+    assert [elem.name for elem in ring.slice(5.5, 7.0)] == [
+        "drift",
+        "marker",
+        "quad_f",
+    ]
+    assert [elem.name for elem in ring.slice(6.0, 6.0)] == ["marker"]
+    # Changing an element length invalidates the cached positions
+    cell.line[2].length = 3.0
+    assert ring.s_positions[-1] == pytest.approx(800.0)
+    assert ring.element_at(8.5).name == "quad_f"
+    # Changes of elements of other lines keep the cached positions
+    index = get_position_index(ring)
+    other = make_fodo_cell()
+    other.line[2].length = 5.0
+    assert get_position_index(ring) is index
+    # Lines with cached positions are garbage collected
+    ref = weakref.ref(ring)
+    del ring, index
+    gc.collect()
+    assert ref() is None
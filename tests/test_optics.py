@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+import pals
+from pals.optics import transfer_matrices
+
+
+def make_fodo_ring(n_cells):
+    quad_f = pals.Quadrupole(
+        name="quad_f",
+        length=0.5,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=0.3),
+    )
+    quad_d = pals.Quadrupole(
+        name="quad_d",
+        length=0.5,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=-0.3),
+    )
+    drift = pals.Drift(name="drift", length=1.5)
+    bend = pals.SBend(name="bend", length=2.0, BendP=pals.BendParameters(g_ref=0.05))
+    cell = pals.BeamLine(
+        name="fodo_cell",
+        line=[quad_f, drift, bend, drift, quad_d, drift, bend, drift],
+    )
+    return pals.BeamLine(
+        name="ring", line=[pals.RepeatedLine(line=cell, repeat=n_cells)]
+    )
+
+
+def test_transfer_matrices():
+    ring = make_fodo_ring(1000)
+    matrices = transfer_matrices(ring)
+    assert matrices.shape == (8000, 6, 6)
+    # Drift
+    assert matrices[1, 0, 1] == pytest.approx(1.5)
+    # Focusing quadrupole
+    k = np.sqrt(0.3)
+    assert matrices[0, 0, 0] == pytest.approx(np.cos(0.5 * k))
+    assert matrices[0, 1, 0] == pytest.approx(-k * np.sin(0.5 * k))
+    assert matrices[0, 2, 2] == pytest.approx(np.cosh(0.5 * k))
+    # Sector bend, with dispersion
+    angle, rho = 0.1, 20.0
+    assert matrices[2, 0, 0] == pytest.approx(np.cos(angle))
+    assert matrices[2, 0, 5] == pytest.approx(rho * (1 - np.cos(angle)))
+    # All matrices are symplectic
+    J = np.kron(np.eye(3), [[0.0, 1.0], [-1.0, 0.0]])
+    assert np.allclose(matrices.swapaxes(1, 2) @ J @ matrices, J)
+    # The cumulative product matches the sequential one
+    total = transfer_matrices(ring, cumulative=True)
+    expected = np.eye(6)
+    for matrix in matrices[:8]:
+        expected = matrix @ expected
+    assert np.allclose(total[7], expected)
+    assert np.allclose(total[-1], np.linalg.matrix_power(expected, 1000))
+
+
+def test_transfer_matrices_thin_and_solenoid():
+    line = pals.BeamLine(
+        name="line",
+        line=[
+            pals.Multipole(
+                name="thin_quad",
+                length=0.0,
+                MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1L=0.1),
+            ),
+            pals.Solenoid(
+                name="solenoid", length=1.0, SolenoidP=pals.SolenoidParameters(Bsol=2.0)
+            ),
+        ],
+    )
+    matrices = transfer_matrices(line, brho=4.0)
+    assert matrices[0, 1, 0] == pytest.approx(-0.1)
+    assert matrices[0, 3, 2] == pytest.approx(0.1)
+    # Solenoid with Ksol = Bsol / brho, coupling the planes
+    k = 0.25
+    assert matrices[1, 0, 0] == pytest.approx(np.cos(k) ** 2)
+    assert matrices[1, 0, 2] == pytest.approx(np.sin(k) * np.cos(k))
+    # Without brho, the field is ignored
+    assert np.allclose(
+        transfer_matrices(line)[1, :4, :4],
+        [[1, 1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 1], [0, 0, 0, 1]],
+    )
+
+
+def test_twiss():
+    ring = make_fodo_ring(100)
+    twiss = pals.optics.twiss(ring)
+    assert len(twiss) == 801
+    # The solution is periodic, also per cell
+    assert twiss.beta_x[-1] == pytest.approx(twiss.beta_x[0])
+    assert twiss.beta_x[8] == pytest.approx(twiss.beta_x[0])
+    assert twiss.eta_x[8] == pytest.approx(twiss.eta_x[0])
+    assert twiss.tune_x == pytest.approx(100 * twiss.mu_x[8] / (2 * np.pi))
+    # Thin lens approximation of the phase advance per cell
+    half_cell, focal_length = 6.0, 1.0 / (0.3 * 0.5)
+    thin_lens = 1.0 - half_cell**2 / (2 * focal_length**2)
+    assert np.cos(twiss.mu_x[8]) == pytest.approx(thin_lens, abs=0.05)
+    # Slices inside thick elements agree at the element boundaries
+    sliced = pals.optics.twiss(ring, slices=4)
+    assert len(sliced) == 3201
+    assert np.allclose(sliced.beta_y[::4], twiss.beta_y)
+    assert sliced.s[-1] == pytest.approx(twiss.s[-1])
+    # An open line starting with the periodic solution reproduces it
+    initial = {
+        key: getattr(twiss, key)[0]
+        for key in ("beta_x", "alpha_x", "beta_y", "alpha_y", "eta_x", "etap_x")
+    }
+    open_line = pals.optics.twiss(ring, periodic=False, initial=initial)
+    assert np.allclose(open_line.beta_x, twiss.beta_x)
+    assert np.allclose(open_line.eta_x, twiss.eta_x)
+
+
+def test_twiss_set_strength():
+    ring = make_fodo_ring(100)
+    twiss = pals.optics.Twiss(ring, slices=2)
+    tune_x = twiss.tune_x
+    twiss.set_strength(400, k1l=0.16)
+    assert twiss.tune_x != pytest.approx(tune_x)
+    # Same result as a recomputation from scratch
+    table = ring.to_table()
+    table.KnL[400, 1] = 0.16
+    expected = pals.optics.Twiss(table, slices=2)
+    assert np.allclose(twiss.beta_x, expected.beta_x)
+    assert np.allclose(twiss.mu_y, expected.mu_y)
+    # Open lines keep the Twiss functions upstream of the change
+    initial = {"beta_x": 10.0, "beta_y": 5.0}
+    open_line = pals.optics.Twiss(ring, periodic=False, initial=initial)
+    upstream = open_line.beta_x[:101].copy()
+    open_line.set_strength(100, length=0.6)
+    assert np.array_equal(open_line.beta_x[:101], upstream)
+    assert open_line.s[-1] == pytest.approx(expected.s[-1] + 0.1)
+    # Many changes, like in a matching loop, do not accumulate rounding errors
+    rng = np.random.default_rng(1)
+    quads = np.flatnonzero(table.kind_mask("Quadrupole"))
+    for index in rng.choice(quads, 2000):
+        k1l = 0.15 * np.sign(table.KnL[index, 1]) * rng.uniform(0.99, 1.01)
+        twiss.set_strength(index, k1l=k1l)
+        table.KnL[index, 1] = k1l
+    expected = pals.optics.Twiss(table, slices=2)
+    assert np.allclose(twiss.maps, expected.maps, rtol=0, atol=1e-12)
+    assert np.allclose(twiss.beta_x, expected.beta_x)
@@ -1,5 +1,9 @@
+import math
+import os
+
+import numpy as np
 import pytest
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
 from pals import (
     ApertureParameters,
@@ -18,6 +22,8 @@ from pals import (
     SolenoidParameters,
     # TrackingParameters,  # not yet tested
 )
+import pals.io
+from pals.parameters import MultipoleKey, decode_multipole_key
 
 
 def test_ParameterClasses():
@@ -134,3 +140,148 @@ def test_ParameterClasses():
     # Test BeamBeamParameters
     beambeam = BeamBeamParameters()
     assert beambeam is not None
+
+
+def test_multipole_storage():
+    """Test the compact storage of the multipole parameter groups"""
+    mmp = MagneticMultipoleParameters(Kn1=0.3, tilt1=0.1, Ks2L=2)
+    # Coefficients are read by key or by order, and integers stay integers
+    assert mmp.Ks2L == 2 and isinstance(mmp.Ks2L, int)
+    assert isinstance(mmp, BaseModel)
+    assert mmp.normal(1) == 0.3
+    assert mmp.skew(2, integrated=True) == 2.0
+    assert mmp.tilt(1) == 0.1
+    assert mmp.normal(5) == 0.0
+    assert mmp.coefficient("Bn", 1, default=None) is None
+    assert list(mmp.terms()) == [
+        ("Kn", 1, False, 0.3),
+        ("tilt", 1, False, 0.1),
+        ("Ks", 2, True, 2.0),
+    ]
+    assert mmp.max_order == 2
+    arrays = mmp.as_arrays()
+    assert arrays["Kn"].tolist() == [0.0, 0.3, 0.0]
+    assert arrays["KsL"].tolist() == [0.0, 0.0, 2.0]
+    # Groups with the same keys share their layout
+    assert MagneticMultipoleParameters(Kn1=0.3)._layout is (
+        MagneticMultipoleParameters(Kn1=-0.3)._layout
+    )
+    # Keys are emitted as before, and the order of the keys does not matter
+    assert mmp.model_dump() == {"Kn1": 0.3, "tilt1": 0.1, "Ks2L": 2}
+    assert mmp.model_dump(include={"Kn1"}, mode="json") == {"Kn1": 0.3}
+    assert mmp == MagneticMultipoleParameters(Ks2L=2, Kn1=0.3, tilt1=0.1)
+    assert MagneticMultipoleParameters.model_validate(mmp.model_dump()) == mmp
+    assert MagneticMultipoleParameters.model_json_schema()["additionalProperties"] == {
+        "type": "number"
+    }
+    assert mmp != MagneticMultipoleParameters(Kn1=0.3)
+    # Assignments are validated
+    mmp.Kn1 = 0.4
+    mmp.Bn3 = 1.0
+    assert mmp.model_dump() == {"Kn1": 0.4, "tilt1": 0.1, "Ks2L": 2, "Bn3": 1.0}
+    with pytest.raises(ValidationError):
+        mmp.Kn01 = 1.0
+    with pytest.raises(ValidationError):
+        mmp.Kn1 = "strong"
+    # Copies with other coefficients are validated too
+    assert mmp.model_copy(update={"Kn1": 0.5}).Kn1 == 0.5
+    with pytest.raises(ValidationError):
+        mmp.model_copy(update={"Kn01": 1.0})
+    # Only integers are read back as integers
+    mmp = MagneticMultipoleParameters(
+        Kn1=np.float64(1.0), Kn2=np.int64(2), Kn3=np.float64("nan")
+    )
+    assert type(mmp.Kn1) is float and type(mmp.Kn2) is int
+    assert math.isnan(mmp.Kn3)
+    with pytest.raises(ValidationError):
+        MagneticMultipoleParameters(Kn1=np.float64("inf")).model_copy(
+            update={"foo": 2.0}
+        )
+    # Electric multipoles
+    emp = ElectricMultipoleParameters(En2=1.5, Es1L=0.5)
+    assert emp.normal(2) == 1.5
+    assert emp.skew(1, integrated=True) == 0.5
+    assert set(emp.as_arrays()) == {"tilt", "En", "EnL", "Es", "EsL"}
+
+
+def test_decode_multipole_key():
+    """Test the decoding of multipole keys"""
+    assert decode_multipole_key("Kn1L") == MultipoleKey("Kn", 1, True)
+    assert decode_multipole_key("tilt10") == ("tilt", 10, False)
+    assert decode_multipole_key("Es0") == ("Es", 0, False)
+    for key in ("Kn01", "KnL", "tilt1L", "Kx1", "Kn1LL", "kn1"):
+        assert decode_multipole_key(key) is None
+    mmp = MagneticMultipoleParameters(Kn1=0.3, Bs2L=0.1)
+    assert mmp.decoded_keys() == {
+        "Kn1": MultipoleKey("Kn", 1, False),
+        "Bs2L": MultipoleKey("Bs", 2, True),
+    }
+    # Keys of the other multipole parameter groups are invalid
+    with pytest.raises(ValidationError, match="Invalid magnetic multipole parameter"):
+        MagneticMultipoleParameters(En1=0.3)
+    with pytest.raises(ValidationError, match="Invalid electric multipole parameter"):
+        ElectricMultipoleParameters(Kn1=0.3)
+
+
+def test_intern_parameters():
+    """Test the sharing of equal parameter groups between elements"""
+    drifts = [
+        pals.Drift(
+            name=f"drift{index}",
+            length=1.0,
+            ApertureP=ApertureParameters(x_limits=[-0.1, 0.1]),
+        )
+        for index in range(3)
+    ]
+    quads = [
+        pals.Quadrupole(
+            name=f"quad{index}",
+            length=0.5,
+            MagneticMultipoleP=MagneticMultipoleParameters(Kn1=0.3),
+        )
+        for index in range(2)
+    ]
+    line = pals.BeamLine(name="line", line=drifts + quads)
+    dumped = line.model_dump()
+    assert pals.intern_parameters(line) is line
+    # Equal groups are shared, which does not change the line
+    shared = pals.shared_group(drifts[0].ApertureP)
+    assert shared is not None
+    assert pals.shared_group(drifts[2].ApertureP) is shared
+    assert pals.shared_group(quads[0].MagneticMultipoleP) is (
+        pals.shared_group(quads[1].MagneticMultipoleP)
+    )
+    assert line.model_dump() == dumped
+    assert isinstance(drifts[1].ApertureP, ApertureParameters)
+    assert drifts[1].ApertureP == ApertureParameters(x_limits=[-0.1, 0.1])
+    # Assignments copy the shared group of the element first
+    drifts[0].ApertureP.x_limits = [-0.2, 0.2]
+    quads[0].MagneticMultipoleP.Kn1 = 0.4
+    assert drifts[0].ApertureP.x_limits == [-0.2, 0.2]
+    assert drifts[1].ApertureP.x_limits == [-0.1, 0.1]
+    assert quads[0].MagneticMultipoleP.Kn1 == 0.4
+    assert quads[1].MagneticMultipoleP.Kn1 == 0.3
+    assert pals.shared_group(drifts[0].ApertureP) is None
+    assert pals.shared_group(drifts[1].ApertureP) is shared
+    # The shared groups themselves cannot be changed
+    with pytest.raises(TypeError):
+        drifts[1].ApertureP.x_limits[0] = -0.2
+    with pytest.raises(TypeError):
+        shared.thickness = 0.01
+    # Groups that are read through other elements are not shared with them
+    drift = pals.Drift(name="drift", length=1.0, ApertureP=drifts[1].ApertureP)
+    drift.ApertureP.thickness = 0.01
+    assert drifts[2].ApertureP.thickness == 0.0
+    copied = drifts[2].model_copy()
+    copied.ApertureP.thickness = 0.01
+    assert drifts[2].ApertureP.thickness == 0.0
+    # Loading files with interned parameter groups
+    test_file = "interned_line.yaml"
+    pals.io.dump(line, test_file)
+    loaded_line = pals.io.load(test_file, intern=True)
+    assert loaded_line == line
+    assert pals.shared_group(loaded_line.line[1].ApertureP) is not None
+    assert pals.shared_group(loaded_line.line[1].ApertureP) is (
+        pals.shared_group(loaded_line.line[2].ApertureP)
+    )
+    os.remove(test_file)
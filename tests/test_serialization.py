@@ -1,5 +1,7 @@
+import importlib.util
 import json
 import os
+import pytest
 import yaml
 
 import pals
@@ -347,3 +349,68 @@ def test_comprehensive_lattice():
     # Clean up temporary files
     os.remove(yaml_file)
     os.remove(json_file)
+
+
+def test_references():
+    """Test that repeated elements are shared and serialized as name references"""
+    quad = pals.Quadrupole(
+        name="quad",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=1.0),
+    )
+    drift = pals.Drift(name="drift", length=2.0)
+    cell = pals.BeamLine(name="cell", line=[quad, drift, quad])
+    ring = pals.BeamLine(name="ring", line=[cell, cell])
+    # Serialize the BeamLine object to YAML
+    ring_dict = ring.model_dump()
+    yaml_data = yaml.dump(ring_dict, default_flow_style=False)
+    print(f"\n{yaml_data}")
+    # Repeated elements are written as references to their first definition
+    assert ring_dict["ring"]["line"][0]["cell"]["line"][2] == "quad"
+    assert ring_dict["ring"]["line"][1] == "cell"
+    # Parse the YAML data back into a BeamLine object
+    loaded_ring = pals.BeamLine(**yaml.safe_load(yaml_data))
+    assert ring == loaded_ring
+    # References resolve to the same shared element instance
+    loaded_cell = loaded_ring.line[0]
+    assert loaded_ring.line[1] is loaded_cell
+    assert loaded_cell.line[2] is loaded_cell.line[0]
+    # References to elements defined in nested lines
+    line = pals.BeamLine(
+        **{"line": {"line": [{"cell": cell.model_dump()["cell"]}, "drift"]}}
+    )
+    assert line.line[1] is line.line[0].line[1]
+    # References must be defined before they are used
+    with pytest.raises(ValueError):
+        pals.BeamLine(name="line", line=["quad", quad])
+
+
+def test_json_bytes():
+    """Test the serialization straight to JSON bytes and back"""
+    quad = pals.Quadrupole(
+        name="quad",
+        length=1.0,
+        MagneticMultipoleP=pals.MagneticMultipoleParameters(Kn1=1.0),
+    )
+    drift = pals.Drift(name="drift", length=2.0)
+    cell = pals.BeamLine(
+        name="cell",
+        line=[quad, drift, pals.UnionEle(name="union", elements=[quad])],
+    )
+    ring = pals.BeamLine(
+        name="ring",
+        line=[cell, pals.RepeatedLine(line=cell, repeat=3, reverse=True)],
+    )
+    # Same document as the (compact) JSON encoding of model_dump
+    json_bytes = ring.to_json_bytes()
+    print(f"\n{json_bytes.decode()}")
+    assert json_bytes == json.dumps(ring.model_dump(), separators=(",", ":")).encode()
+    # Parse the JSON bytes back into a BeamLine object
+    loaded_ring = pals.BeamLine.from_json_bytes(json_bytes)
+    assert ring == loaded_ring
+    assert loaded_ring.line[1].line is loaded_ring.line[0]
+    # Optional orjson backend
+    if importlib.util.find_spec("orjson") is not None:
+        assert ring.to_json_bytes(backend="orjson") == json_bytes
+    with pytest.raises(ValueError):
+        ring.to_json_bytes(backend="unknown")